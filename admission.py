@@ -0,0 +1,108 @@
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# 准入控制默认配置，可通过 feishu_config.json 的 "admission" 覆盖
+DEFAULT_ADMISSION_OPTIONS = {
+    "enabled": True,
+    "max_in_flight": 100,        # 同时处理（读取、校验、解析请求体）的 webhook 请求数，超出返回 503
+    "max_pending": 1000,         # 已接受但尚未投递完成的任务数（含聚合窗口中的推送），超出返回 503；0 表示不限制
+    "max_per_repo": 100,         # 单个仓库已接受但尚未投递完成的任务数，超出返回 429；0 表示不限制
+    "retry_after": 5,            # 拒绝时 Retry-After 响应头的秒数
+    "bypass_events": ["ping"],   # 不受限制的 GitHub 事件类型
+}
+
+
+class AdmissionRejected(Exception):
+    """服务饱和，请求未被接受；status_code 为 503（整体过载）或 429（单个仓库超出配额）"""
+
+    def __init__(self, status_code, message, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(math.ceil(self.retry_after))}
+
+
+class AdmissionController:
+    """webhook 的准入控制：限制同时处理的请求数、尚未投递完成的任务总数和每个仓库的任务数。
+
+    所有检查都不等待，饱和时立即拒绝并给出 Retry-After，过载期间内存中的请求体、负载与卡片数量有上限。
+    任务数在接受时计入，在投递管道处理完成（或未能入队）时归还；enabled 为 False 时只计数不拒绝。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_ADMISSION_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.in_flight = 0
+        self.pending = 0
+        self._pending_by_repo = {}
+        self.rejected = {"in_flight": 0, "pending": 0, "per_repo": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.options["enabled"])
+
+    def bypasses(self, event_type):
+        return event_type in self.options["bypass_events"]
+
+    @property
+    def saturated(self):
+        """同时处理的请求数已达上限"""
+        return self.enabled and self.in_flight >= self.options["max_in_flight"]
+
+    def _reject(self, kind, status_code, message):
+        self.rejected[kind] += 1
+        logger.warning(f"准入控制拒绝请求: {message}")
+        return AdmissionRejected(status_code, message, self.options["retry_after"])
+
+    def reject_saturated(self):
+        return self._reject("in_flight", 503, f"同时处理的请求数已达上限 {self.options['max_in_flight']}")
+
+    def enter(self):
+        """开始处理一个请求，饱和时抛出 AdmissionRejected"""
+        if self.saturated:
+            raise self.reject_saturated()
+        self.in_flight += 1
+
+    def leave(self):
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def admit(self, repo):
+        """接受 repo 的一个投递任务，总数或该仓库的任务数达到上限时抛出 AdmissionRejected"""
+        if self.enabled:
+            max_pending = self.options["max_pending"]
+            if max_pending and self.pending >= max_pending:
+                raise self._reject("pending", 503, f"尚未投递完成的任务数已达上限 {max_pending}")
+            max_per_repo = self.options["max_per_repo"]
+            if max_per_repo and self._pending_by_repo.get(repo, 0) >= max_per_repo:
+                raise self._reject("per_repo", 429, f"项目 {repo} 尚未投递完成的任务数已达上限 {max_per_repo}")
+        self.pending += 1
+        self._pending_by_repo[repo] = self._pending_by_repo.get(repo, 0) + 1
+
+    def release(self, repo):
+        """归还 admit() 占用的名额"""
+        self.pending = max(0, self.pending - 1)
+        count = self._pending_by_repo.get(repo, 0) - 1
+        if count > 0:
+            self._pending_by_repo[repo] = count
+        else:
+            self._pending_by_repo.pop(repo, None)
+
+    def stats(self):
+        busiest = max(self._pending_by_repo.items(), key=lambda item: item[1], default=(None, 0))
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.options["max_in_flight"],
+            "pending": self.pending,
+            "max_pending": self.options["max_pending"],
+            "max_per_repo": self.options["max_per_repo"],
+            "repos_pending": len(self._pending_by_repo),
+            "busiest_repo": {"repo": busiest[0], "pending": busiest[1]} if busiest[0] else None,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,69 @@
+"""卡片渲染微基准：对比旧的序列化路径（构建完整卡片字典，json.dumps 卡片，
+再由 httpx 以 json= 对整个请求体 json.dumps 一次）与 CardRenderer 的模板拼接 + 单次序列化。
+
+    python benchmarks/bench_card_renderer.py [--number 20000] [--commits 5]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import card_renderer  # noqa: E402
+from card_renderer import CardRenderer, dumps  # noqa: E402
+from commit_classifier import CommitClassifier  # noqa: E402
+
+
+def sample_payload(commit_count):
+    commits = [
+        {
+            "message": f"feat(api): 第 {i} 个提交，添加分页支持\n\n详细说明 " * 2,
+            "author": {"name": f"dev{i % 3}"},
+            "url": f"https://github.com/org/repo/commit/{i:040x}",
+        }
+        for i in range(commit_count)
+    ]
+    return {
+        "ref": "refs/heads/main",
+        "pusher": {"name": "dev0"},
+        "compare": "https://github.com/org/repo/compare/aaa...bbb",
+        "commits": commits,
+    }
+
+
+def per_card_us(func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="每轮渲染次数")
+    parser.add_argument("--commits", type=int, default=5, help="每次推送的提交数")
+    args = parser.parse_args()
+
+    renderer = CardRenderer(CommitClassifier())
+    payload = sample_payload(args.commits)
+    assert json.loads(renderer.render_push(payload, "org/repo")) == renderer.build_push_card(payload, "org/repo")
+
+    def legacy():
+        content = json.dumps(renderer.build_push_card(payload, "org/repo"))
+        return json.dumps({"receive_id": "oc_x", "msg_type": "interactive", "content": content}).encode("utf-8")
+
+    def current():
+        content = renderer.render_push(payload, "org/repo")
+        return dumps({"receive_id": "oc_x", "msg_type": "interactive", "content": content})
+
+    legacy_us = per_card_us(legacy, args.number)
+    current_us = per_card_us(current, args.number)
+    encoder = "orjson" if card_renderer.orjson is not None else "json"
+    print(f"commits per push: {args.commits}, encoder: {encoder}")
+    print(f"legacy (dict + json.dumps x2): {legacy_us:7.2f} us/card, body {len(legacy())} bytes")
+    print(f"CardRenderer:                  {current_us:7.2f} us/card, body {len(current())} bytes")
+    print(f"speedup: {legacy_us / current_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""提交分类微基准：对比旧版 format_commit_message（每次调用 import re 并编译正则、if/elif 链）
+与 CommitClassifier 的单条提交耗时。
+
+    python benchmarks/bench_commit_classifier.py [--number 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commit_classifier import CommitClassifier  # noqa: E402
+
+SAMPLE_COMMITS = [
+    {"message": "feat(api): add pagination to list endpoints\n\nlong body " * 3, "author": {"name": "alice"}},
+    {"message": "fix: handle empty payload", "author": {"name": "bob"}},
+    {"message": "Merge pull request #42 from org/branch", "author": {"name": "carol"}},
+    {"message": "update readme", "author": {"name": "dave"}},
+    {"message": "chore(deps): bump httpx", "author": {"name": "dependabot[bot]"}},
+    {"message": "revert: undo broken migration", "author": {}},
+]
+
+
+def legacy_format_commit_message(commit):
+    """改造前 main.py 中的实现，保留用于对比"""
+    import re
+
+    message = commit.get("message", "无提交信息").split('\n')[0]
+    author = commit.get("author", {}).get("name", "未知作者")
+    author_display = f"**@{author}**" if author != "未知作者" else author
+    commit_type_match = re.match(r'^(\w+)(\([^)]*\))?:\s', message.lower())
+    if commit_type_match:
+        commit_type = commit_type_match.group(1)
+        if commit_type == 'feat':
+            icon, type_label = "✨", "特性"
+        elif commit_type == 'fix':
+            icon, type_label = "🐛", "修复"
+        elif commit_type == 'docs':
+            icon, type_label = "📚", "文档"
+        elif commit_type == 'style':
+            icon, type_label = "💅", "样式"
+        elif commit_type == 'refactor':
+            icon, type_label = "♻️", "重构"
+        elif commit_type == 'test':
+            icon, type_label = "🧪", "测试"
+        elif commit_type == 'chore':
+            icon, type_label = "🔧", "杂项"
+        elif commit_type == 'perf':
+            icon, type_label = "⚡", "性能"
+        elif commit_type == 'ci':
+            icon, type_label = "🚀", "CI"
+        elif commit_type == 'build':
+            icon, type_label = "📦", "构建"
+        elif commit_type == 'revert':
+            icon, type_label = "⏪", "回滚"
+        else:
+            icon, type_label = "📝", "其他"
+    elif message.lower().startswith('merge'):
+        icon, type_label = "🔀", "合并"
+    else:
+        icon, type_label = "📝", "其他"
+    return f"{icon} **{type_label}** {message}", author_display
+
+
+def per_commit_ns(func, number):
+    def run():
+        for commit in SAMPLE_COMMITS:
+            func(commit)
+    best = min(timeit.repeat(run, number=number, repeat=5))
+    return best / (number * len(SAMPLE_COMMITS)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=50000, help="每轮重复次数")
+    args = parser.parse_args()
+
+    classifier = CommitClassifier()
+    for commit in SAMPLE_COMMITS:
+        assert legacy_format_commit_message(commit) == classifier.format(commit), commit
+
+    legacy = per_commit_ns(legacy_format_commit_message, args.number)
+    current = per_commit_ns(classifier.format, args.number)
+    # 旧版多提交推送中每个提交会被格式化两次
+    print(f"legacy (per call):           {legacy:8.0f} ns/commit")
+    print(f"legacy (2 calls per commit): {legacy * 2:8.0f} ns/commit")
+    print(f"CommitClassifier:            {current:8.0f} ns/commit")
+    print(f"speedup vs multi-commit path: {legacy * 2 / current:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""启动耗时报告：用 python -X importtime 统计导入 main 与 create_app() 各自导入的模块耗时，
+并启动本地模拟飞书服务与本服务，测量从启动进程到 GET / 可用的时间（含 token 预取等预热）。
+
+    python benchmarks/bench_startup.py [--top 15] [--runs 3] [--json]
+
+导入耗时在冷启动的临时目录中测量，不读写仓库中的 feishu_config.json；全程不访问外网。
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_webhook_load import free_port, spawn, wait_ready
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中导入 main 并创建应用，把各阶段耗时打印到 stdout
+IMPORT_PROBE = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app("feishu_config.json")
+created = time.perf_counter()
+print(json.dumps({"import_main": imported - started, "create_app": created - imported}))
+"""
+
+
+def startup_config(mock_url, port):
+    return {
+        "feishu_app_id": "cli_bench",
+        "feishu_app_secret": "bench-secret",
+        "default_chat_id": "oc_bench_default",
+        "project_chat_mapping": {"bench/repo-0": "oc_bench_0"},
+        "feishu_http": {"base_url": f"{mock_url}/open-apis"},
+        "server": {"host": "127.0.0.1", "port": port, "workers": 1},
+        "logging": {"level": "WARNING", "console": False},
+        "config_store": {"hot_reload": False},
+    }
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 [(模块, 自身微秒, 累计微秒, 嵌套深度)]，按导入完成的顺序"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            entries.append((name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2))
+        except ValueError:
+            continue
+    return entries
+
+
+def measure_imports(workdir, top):
+    """冷启动一个解释器导入 main 并调用 create_app()，返回两阶段的耗时与导入最慢的模块"""
+    env = {**os.environ, "PYTHONPATH": ROOT, "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_PROBE],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 main 失败:\n{result.stderr[-4000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(result.stderr)
+    # main 之后完成的导入属于 create_app()；main 之前的顶层导入（site 等解释器启动导入）不计入 import main
+    split = next(i for i, entry in enumerate(entries) if entry[0] == "main")
+    start = max((i + 1 for i, entry in enumerate(entries[:split]) if entry[3] == 0), default=0)
+    phases = {"import_main": (entries[start:split + 1], 1), "create_app": (entries[split + 1:], 0)}
+    report = {"seconds": {key: round(value, 4) for key, value in timings.items()}, "phases": {}}
+    for phase, (phase_entries, depth) in phases.items():
+        # 直接导入的模块：import main 中是 main 导入的模块，create_app() 中是它自己导入的模块
+        top_level = [entry for entry in phase_entries if entry[3] == depth]
+        report["phases"][phase] = {
+            "modules": len(phase_entries),
+            "direct_imports_ms": round(sum(entry[2] for entry in top_level) / 1000, 1),
+            "slowest_cumulative": [
+                {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                for name, _, cumulative, _ in sorted(top_level, key=lambda entry: -entry[2])[:top]
+            ],
+            "slowest_self": [
+                {"module": name, "self_ms": round(self_us / 1000, 1)}
+                for name, self_us, _, _ in sorted(phase_entries, key=lambda entry: -entry[1])[:top]
+            ],
+        }
+    return report
+
+
+async def measure_ready(workdir, mock_url, service_port, procs):
+    """启动 main.py，返回从启动进程到 GET / 返回 200 的秒数与服务报告的各阶段耗时"""
+    env = {**os.environ, "FEISHU_API_BASE": f"{mock_url}/open-apis"}
+    started = time.perf_counter()
+    proc = spawn([sys.executable, os.path.join(ROOT, "main.py")], workdir, os.path.join(workdir, "service.log"), env=env)
+    procs.append(proc)
+    try:
+        async with httpx.AsyncClient(timeout=2) as client:
+            await wait_ready(client, f"http://127.0.0.1:{service_port}/", proc)
+            ready = time.perf_counter() - started
+            status = (await client.get(f"http://127.0.0.1:{service_port}/")).json()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        procs.remove(proc)
+    return ready, status.get("startup") or {}, status.get("token") or {}
+
+
+def print_report(report):
+    seconds = report["imports"]["seconds"]
+    print(f"import main: {seconds['import_main'] * 1000:.1f} ms, create_app(): {seconds['create_app'] * 1000:.1f} ms")
+    for phase, data in report["imports"]["phases"].items():
+        print(f"\n[{phase}] {data['modules']} modules, direct imports {data['direct_imports_ms']} ms")
+        print("  slowest (cumulative):")
+        for item in data["slowest_cumulative"]:
+            print(f"    {item['cumulative_ms']:>8.1f} ms  {item['module']}")
+        print("  slowest (self):")
+        for item in data["slowest_self"]:
+            print(f"    {item['self_ms']:>8.1f} ms  {item['module']}")
+    ready = report["ready"]
+    print(f"\ntime to ready (spawn -> GET / 200): median {ready['median_ms']} ms over {ready['runs']} runs "
+          f"(min {ready['min_ms']} ms, max {ready['max_ms']} ms)")
+    print(f"service startup timings (s): {ready['startup']}")
+    print(f"token valid after warm-up: {ready['token_valid']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="列出导入最慢的模块数")
+    parser.add_argument("--runs", type=int, default=3, help="测量启动到就绪时间的次数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    procs = []
+    workdir = tempfile.TemporaryDirectory(prefix="bench-startup-")
+    try:
+        mock_port, service_port = free_port(), free_port()
+        mock_url = f"http://127.0.0.1:{mock_port}"
+        with open(os.path.join(workdir.name, "feishu_config.json"), "w", encoding="utf-8") as f:
+            json.dump(startup_config(mock_url, service_port), f, ensure_ascii=False, indent=2)
+        report = {"imports": measure_imports(workdir.name, args.top)}
+
+        procs.append(spawn(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "mock_feishu.py"), "--port", str(mock_port), "--latency", "0"],
+            workdir.name, os.path.join(workdir.name, "mock.log"),
+        ))
+
+        async def measure():
+            async with httpx.AsyncClient(timeout=2) as client:
+                await wait_ready(client, f"{mock_url}/_mock/stats", procs[0])
+            return [await measure_ready(workdir.name, mock_url, service_port, procs) for _ in range(args.runs)]
+
+        runs = asyncio.run(measure())
+        durations = [ready * 1000 for ready, _, _ in runs]
+        report["ready"] = {
+            "runs": len(runs),
+            "median_ms": round(statistics.median(durations), 1),
+            "min_ms": round(min(durations), 1),
+            "max_ms": round(max(durations), 1),
+            "startup": runs[-1][1],
+            "token_valid": runs[-1][2].get("valid"),
+        }
+    except RuntimeError as e:
+        log_path = os.path.join(workdir.name, "service.log")
+        if os.path.exists(log_path):
+            with open(log_path, encoding="utf-8", errors="replace") as f:
+                sys.stderr.write(f.read()[-4000:])
+        sys.exit(f"测量失败: {e}")
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        workdir.cleanup()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""端到端压测：启动本地模拟飞书服务与本服务，按指定并发向 /webhook/github 重放合成的 push 负载，
+统计吞吐量、p50/p99 延迟和投递成功率。全程不访问外网。
+
+    python benchmarks/bench_webhook_load.py [--requests 2000] [--concurrency 50] [--repos 20]
+    python benchmarks/bench_webhook_load.py --latency 0.05 --error-rate 0.02 --chat-qps 5
+    python benchmarks/bench_webhook_load.py --target http://127.0.0.1:8002 --mock-url http://127.0.0.1:9000
+
+默认在临时目录中生成配置并启动 main.py；指定 --target 时压测已经在运行的服务
+（服务需要以 FEISHU_API_BASE 指向 --mock-url 的模拟服务，否则只统计入站指标）。
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMIT_TYPES = ["feat", "fix", "docs", "refactor", "perf", "test", "chore"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_push_payload(index, repo_count, commit_count):
+    """第 index 个合成推送，均匀分布在 repo_count 个仓库上"""
+    repo = f"bench/repo-{index % repo_count}"
+    commits = [
+        {
+            "id": f"{index:020x}{i:020x}",
+            "message": f"{COMMIT_TYPES[(index + i) % len(COMMIT_TYPES)]}(core): 合成提交 {index}-{i}\n\n压测用的提交说明",
+            "author": {"name": f"dev{i % 4}"},
+            "url": f"https://github.com/{repo}/commit/{index:020x}{i:020x}",
+        }
+        for i in range(commit_count)
+    ]
+    return {
+        "ref": "refs/heads/main",
+        "before": "0" * 40,
+        "after": f"{index:040x}",
+        "repository": {"full_name": repo, "html_url": f"https://github.com/{repo}"},
+        "pusher": {"name": "dev0"},
+        "compare": f"https://github.com/{repo}/compare/{index}",
+        "commits": commits,
+        "head_commit": commits[-1] if commits else None,
+    }
+
+
+def bench_config(args, mock_url, port):
+    mapping = {f"bench/repo-{i}": f"oc_bench_{i % args.chats}" for i in range(args.repos)}
+    config = {
+        "feishu_app_id": "cli_bench",
+        "feishu_app_secret": "bench-secret",
+        "default_chat_id": "oc_bench_default",
+        "project_chat_mapping": mapping,
+        "feishu_http": {"base_url": f"{mock_url}/open-apis", "max_connections": max(20, args.concurrency)},
+        "rate_limit": {"per_chat_rate": args.per_chat_rate, "per_chat_burst": args.per_chat_rate,
+                       "per_app_rate": args.per_app_rate, "per_app_burst": args.per_app_rate},
+        "outbox": {"base_delay": 0.2},
+        "server": {"host": "127.0.0.1", "port": port, "workers": 1},
+        "logging": {"level": "WARNING", "console": False},
+        "config_store": {"hot_reload": False},
+    }
+    if args.secret:
+        config["github_webhook_secrets"] = args.secret
+    return config
+
+
+def spawn(argv, cwd, log_path, env=None):
+    log = open(log_path, "wb")
+    return subprocess.Popen(argv, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, env=env)
+
+
+async def wait_ready(client, url, proc=None, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{url} 的进程已退出，返回码 {proc.returncode}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"等待 {url} 就绪超时")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def fire(client, target, args):
+    """以固定并发发送 args.requests 个推送，返回 (每个请求的耗时, 状态码计数, 总耗时)"""
+    bodies = [
+        json.dumps(make_push_payload(i, args.repos, args.commits), ensure_ascii=False).encode("utf-8")
+        for i in range(args.requests)
+    ]
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    latencies = []
+    statuses = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(bodies):
+            index = next_index
+            next_index += 1
+            body = bodies[index]
+            headers = {
+                "Content-Type": "application/json",
+                "X-GitHub-Event": "push",
+                "X-GitHub-Delivery": f"bench-{run_id}-{index}",
+            }
+            if args.secret:
+                digest = hmac.new(args.secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+                headers["X-Hub-Signature-256"] = f"sha256={digest}"
+            started = time.perf_counter()
+            try:
+                status = (await client.post(f"{target}/webhook/github", content=body, headers=headers)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def wait_delivered(client, mock_url, expected, timeout):
+    """等待模拟服务收到 expected 条消息，返回 (已送达数, 耗时)"""
+    started = time.perf_counter()
+    delivered = 0
+    while time.perf_counter() - started < timeout:
+        delivered = (await client.get(f"{mock_url}/_mock/stats")).json().get("messages", 0)
+        if delivered >= expected:
+            break
+        await asyncio.sleep(0.1)
+    return delivered, time.perf_counter() - started
+
+
+async def settled_status(client, target, timeout=5):
+    """等待服务的发件箱写操作全部提交、没有正在发送的条目后返回 GET / 的状态，
+    此时发件箱的 pending/dead 计数是提交之后重新统计的，不会把已送达的消息算作积压"""
+    started = time.perf_counter()
+    while True:
+        status = (await client.get(f"{target}/")).json()
+        outbox = status.get("outbox") or {}
+        if (not outbox.get("buffered_writes") and not outbox.get("inflight")) or time.perf_counter() - started > timeout:
+            return status
+        await asyncio.sleep(0.05)
+
+
+async def run(args, target, mock_url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        if mock_url:
+            await client.post(f"{mock_url}/_mock/reset")
+        latencies, statuses, elapsed = await fire(client, target, args)
+        accepted = statuses.get(202, 0)
+        delivered, drain = (None, None)
+        mock_stats = {}
+        if mock_url:
+            delivered, drain = await wait_delivered(client, mock_url, accepted, args.drain_timeout)
+            mock_stats = (await client.get(f"{mock_url}/_mock/stats")).json()
+        service = await settled_status(client, target)
+
+    latencies.sort()
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p90": round(percentile(latencies, 90) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "accepted": accepted,
+        "delivered": delivered,
+        "delivery_success": round(delivered / accepted, 4) if delivered is not None and accepted else None,
+        "drain_seconds": round(drain, 2) if drain is not None else None,
+        "mock": mock_stats,
+        "outbox": service.get("outbox"),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"requests: {report['requests']}, concurrency: {report['concurrency']}, statuses: {report['statuses']}")
+    print(f"throughput: {report['throughput_rps']} req/s")
+    latency = report["latency_ms"]
+    print(f"latency: p50 {latency['p50']} ms, p90 {latency['p90']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+    if report["delivered"] is not None:
+        print(f"delivery: {report['delivered']}/{report['accepted']} ({report['delivery_success']:.2%}) "
+              f"in {report['drain_seconds']} s after the last request")
+        print(f"mock feishu: {report['mock']}")
+    outbox = report["outbox"] or {}
+    print(f"outbox: pending {outbox.get('pending')}, dead {outbox.get('dead')}, retried {outbox.get('retried')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="发送的推送数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发连接数")
+    parser.add_argument("--repos", type=int, default=20, help="合成仓库数")
+    parser.add_argument("--chats", type=int, default=20, help="仓库映射到的群组数")
+    parser.add_argument("--commits", type=int, default=3, help="每次推送的提交数")
+    parser.add_argument("--secret", default=None, help="配置 GitHub Webhook 密钥并为每个请求签名")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟飞书接口的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟飞书返回 HTTP 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模拟飞书返回应用级限流的比例")
+    parser.add_argument("--chat-qps", type=int, default=0, help="模拟飞书单群组的 QPS 限制，0 表示不限制")
+    parser.add_argument("--per-chat-rate", type=float, default=1000, help="服务端每个群组的发送速率（默认不构成瓶颈）")
+    parser.add_argument("--per-app-rate", type=float, default=1000, help="服务端整个应用的发送速率")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="等待全部消息送达的最长秒数")
+    parser.add_argument("--target", default=None, help="压测已运行的服务，例如 http://127.0.0.1:8002")
+    parser.add_argument("--mock-url", default=None, help="与 --target 配合使用的模拟飞书服务地址")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    procs = []
+    workdir = tempfile.TemporaryDirectory(prefix="bench-webhook-")
+    try:
+        target, mock_url = args.target, args.mock_url
+        if target is None:
+            mock_port, service_port = free_port(), free_port()
+            mock_url = f"http://127.0.0.1:{mock_port}"
+            target = f"http://127.0.0.1:{service_port}"
+            procs.append(spawn(
+                [sys.executable, os.path.join(ROOT, "benchmarks", "mock_feishu.py"), "--port", str(mock_port),
+                 "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+                 "--rate-limit-rate", str(args.rate_limit_rate), "--chat-qps", str(args.chat_qps)],
+                workdir.name, os.path.join(workdir.name, "mock.log"),
+            ))
+            with open(os.path.join(workdir.name, "feishu_config.json"), "w", encoding="utf-8") as f:
+                json.dump(bench_config(args, mock_url, service_port), f, ensure_ascii=False, indent=2)
+            env = {**os.environ, "FEISHU_API_BASE": f"{mock_url}/open-apis"}
+            procs.append(spawn([sys.executable, os.path.join(ROOT, "main.py")], workdir.name,
+                               os.path.join(workdir.name, "service.log"), env=env))
+
+        async def prepare_and_run():
+            async with httpx.AsyncClient(timeout=2) as client:
+                if mock_url:
+                    await wait_ready(client, f"{mock_url}/_mock/stats", procs[0] if procs else None)
+                await wait_ready(client, f"{target}/", procs[-1] if procs else None)
+            return await run(args, target, mock_url)
+
+        report = asyncio.run(prepare_and_run())
+    except RuntimeError as e:
+        log_path = os.path.join(workdir.name, "service.log")
+        if os.path.exists(log_path):
+            with open(log_path, encoding="utf-8", errors="replace") as f:
+                sys.stderr.write(f.read()[-4000:])
+        sys.exit(f"压测失败: {e}")
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        workdir.cleanup()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""本地模拟的飞书开放接口：实现 tenant_access_token 与发送/更新消息接口，可配置延迟、错误率和限流响应。
+
+    python benchmarks/mock_feishu.py [--port 9000] [--latency 0.02] [--error-rate 0.01] [--chat-qps 5]
+
+服务通过环境变量 FEISHU_API_BASE=http://127.0.0.1:9000/open-apis（或 feishu_http.base_url）指向它；
+GET /_mock/stats 返回收到的请求统计，POST /_mock/reset 清零。
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+MOCK_TOKEN = "t-mock-tenant-access-token"
+
+
+class MockState:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, chat_qps=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chat_qps = chat_qps
+        self.random = random.Random(seed)
+        self.message_ids = itertools.count(1)
+        self.reset()
+
+    def reset(self):
+        self.counts = collections.Counter()
+        self.delivered_chats = collections.Counter()
+        self._chat_windows = {}
+
+    async def delay(self):
+        latency = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def chat_over_quota(self, chat_id):
+        """按 1 秒窗口模拟飞书单群组的发送频率限制"""
+        if not self.chat_qps:
+            return False
+        now = int(time.monotonic())
+        window = self._chat_windows.get(chat_id)
+        if window is None or window[0] != now:
+            window = self._chat_windows[chat_id] = [now, 0]
+        window[1] += 1
+        return window[1] > self.chat_qps
+
+    def fault(self, chat_id=None):
+        """按配置返回注入的错误响应，不需要时返回 None"""
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.counts["app_rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"code": 99991400, "msg": "request trigger frequency limit"},
+                headers={"x-ogw-ratelimit-reset": "1"},
+            )
+        if chat_id is not None and self.chat_over_quota(chat_id):
+            self.counts["chat_rate_limited"] += 1
+            return JSONResponse(
+                status_code=400,
+                content={"code": 230020, "msg": "This operation triggers the frequency limit."},
+                headers={"x-ogw-ratelimit-reset": "1"},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.counts["errors"] += 1
+            return JSONResponse(status_code=500, content={"code": 1500, "msg": "mock internal error"})
+        return None
+
+    def stats(self):
+        return {
+            **self.counts,
+            "chats": len(self.delivered_chats),
+        }
+
+
+def _authorized(request):
+    return request.headers.get("authorization") == f"Bearer {MOCK_TOKEN}"
+
+
+def create_mock_app(state):
+    app = FastAPI()
+
+    @app.post("/open-apis/auth/v3/tenant_access_token/internal")
+    async def tenant_access_token(request: Request):
+        state.counts["token_requests"] += 1
+        await state.delay()
+        body = await request.json()
+        if not body.get("app_id") or not body.get("app_secret"):
+            return {"code": 10003, "msg": "invalid param"}
+        return {"code": 0, "msg": "ok", "tenant_access_token": MOCK_TOKEN, "expire": 7200}
+
+    @app.post("/open-apis/im/v1/messages")
+    async def send_message(request: Request):
+        state.counts["send_requests"] += 1
+        if not _authorized(request):
+            return JSONResponse(status_code=400, content={"code": 99991663, "msg": "Invalid access token"})
+        body = await request.json()
+        chat_id = body.get("receive_id")
+        await state.delay()
+        response = state.fault(chat_id)
+        if response is not None:
+            return response
+        state.counts["messages"] += 1
+        state.delivered_chats[chat_id] += 1
+        return {"code": 0, "msg": "success", "data": {"message_id": f"om_mock_{next(state.message_ids)}", "chat_id": chat_id}}
+
+    @app.patch("/open-apis/im/v1/messages/{message_id}")
+    async def update_message(message_id: str, request: Request):
+        state.counts["update_requests"] += 1
+        if not _authorized(request):
+            return JSONResponse(status_code=400, content={"code": 99991663, "msg": "Invalid access token"})
+        await state.delay()
+        response = state.fault()
+        if response is not None:
+            return response
+        state.counts["updates"] += 1
+        return {"code": 0, "msg": "success", "data": {}}
+
+    @app.get("/_mock/stats")
+    async def mock_stats():
+        return state.stats()
+
+    @app.post("/_mock/reset")
+    async def mock_reset():
+        state.reset()
+        return {"status": "ok"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="在固定延迟上随机增加 0~jitter 秒")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回应用级限流 (HTTP 429, 99991400) 的比例")
+    parser.add_argument("--chat-qps", type=int, default=0, help="单个群组每秒允许的消息数，超出返回 230020；0 表示不限制")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    state = MockState(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.chat_qps, args.seed)
+    uvicorn.run(create_mock_app(state), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
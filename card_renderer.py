@@ -0,0 +1,145 @@
+import functools
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时退回标准库
+    orjson = None
+
+
+def dumps(obj):
+    """序列化为紧凑的 UTF-8 JSON 字节串，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def lark_md(content):
+    return {"tag": "div", "text": {"tag": "lark_md", "content": content}}
+
+
+def link_button(text, url):
+    return {
+        "tag": "action",
+        "actions": [
+            {"tag": "button", "text": {"tag": "plain_text", "content": text}, "type": "default", "url": url}
+        ],
+    }
+
+
+# 静态片段：卡片配置、推送卡片底部的提示，只构建并序列化一次
+CARD_CONFIG = {"wide_screen_mode": True}
+UPDATABLE_CARD_CONFIG = {"wide_screen_mode": True, "update_multi": True}
+PULL_REMINDER = lark_md("💾 请及时拉取最新数据 git pull origin main")
+_CONFIG_JSON = dumps(CARD_CONFIG)
+_UPDATABLE_CONFIG_JSON = dumps(UPDATABLE_CARD_CONFIG)
+_PULL_REMINDER_JSON = dumps(PULL_REMINDER)
+
+
+def card_header(title, template="blue"):
+    return {"title": {"tag": "plain_text", "content": title}, "template": template}
+
+
+@functools.lru_cache(maxsize=64)
+def _card_prefix(title, template, update_multi):
+    """卡片 JSON 中 elements 之前的部分，按标题/颜色缓存"""
+    config_json = _UPDATABLE_CONFIG_JSON if update_multi else _CONFIG_JSON
+    return b'{"config":' + config_json + b',"header":' + dumps(card_header(title, template)) + b',"elements":['
+
+
+def render_card(elements, title, template="blue", footer=None, update_multi=False):
+    """把动态元素拼接到缓存的卡片模板中，返回卡片 JSON 字符串。
+
+    footer 为预先序列化好的静态元素字节串；动态元素只经过一次序列化。
+    update_multi 为 True 时卡片是共享卡片，发出后可以通过 message_id 更新内容。
+    """
+    parts = [_card_prefix(title, template, bool(update_multi))]
+    if elements:
+        parts.append(dumps(elements)[1:-1])
+    if footer:
+        if elements:
+            parts.append(b",")
+        parts.append(footer)
+    parts.append(b"]}")
+    return b"".join(parts).decode("utf-8")
+
+
+class CardRenderer:
+    """GitHub 事件卡片渲染器，不依赖服务的运行状态，可以离线调用和基准测试"""
+
+    PUSH_TITLE = "GitHub 项目更新通知"
+
+    def __init__(self, classifier, max_display_commits=10):
+        self.classifier = classifier
+        self.max_display_commits = max_display_commits
+
+    def push_elements(self, payload, repo_name):
+        """构建 push 卡片的动态元素（不含静态的底部提示）"""
+        ref = payload.get("ref", "未知分支")
+        branch_name = ref.split("/")[-1] if ref else "未知分支"
+        pusher_name = (payload.get("pusher") or {}).get("name", "未知推送者")
+        commits = payload.get("commits") or []
+
+        elements = [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"🌿 **分支**: {branch_name}"),
+        ]
+
+        if len(commits) > 1:
+            # 多个提交：提交者为去重后的列表，只格式化需要展示的提交
+            unique_authors = {}
+            for commit in commits:
+                author = (commit.get("author") or {}).get("name", "未知作者")
+                if author and author != "未知作者":
+                    unique_authors[author] = None
+            if unique_authors:
+                commit_author = ", ".join(f"**@{author}**" for author in unique_authors)
+            else:
+                commit_author = "未知提交者"
+            elements.append(lark_md(f"👤 **提交者**: {commit_author}"))
+            elements.append(lark_md(f"✨ **总提交数**: {len(commits)}"))
+
+            # 限制显示的提交数量，避免卡片过长
+            displayed_commits = commits[:self.max_display_commits]
+            for i, commit in enumerate(displayed_commits, 1):
+                formatted_message, author_display = self.classifier.format(commit)
+                elements.append(lark_md(f"  {i}. {author_display}: {formatted_message}"))
+            if len(commits) > self.max_display_commits:
+                remaining = len(commits) - self.max_display_commits
+                elements.append(lark_md(f"  ... 还有{remaining}个提交"))
+
+            compare_url = payload.get("compare")
+            if compare_url:
+                elements.append(link_button("🔍 查看所有变更", compare_url))
+            return elements
+
+        if commits:
+            commit_message, commit_author = self.classifier.format(commits[0])
+            commit_url = commits[0].get("url", "#")
+        else:
+            head_commit = payload.get("head_commit")
+            if head_commit:
+                commit_message = head_commit.get("message", "无提交信息 (可能为创建/删除分支)")
+                commit_url = head_commit.get("url", "#")
+                commit_author = (head_commit.get("author") or {}).get("name", pusher_name)
+            else:
+                commit_message = "无具体代码变更 (例如：分支创建/删除)"
+                commit_url = payload.get("compare", "#")
+                commit_author = pusher_name
+
+        elements.append(lark_md(f"👤 **提交者**: {commit_author}"))
+        elements.append(lark_md(f"💬 **信息**: {commit_message}"))
+        elements.append(link_button("🔗 查看提交详情", commit_url))
+        return elements
+
+    def render_push(self, payload, repo_name):
+        """渲染 push 卡片，返回卡片 JSON 字符串（即消息的 content）"""
+        return render_card(self.push_elements(payload, repo_name), self.PUSH_TITLE, footer=_PULL_REMINDER_JSON)
+
+    def build_push_card(self, payload, repo_name):
+        """以字典形式返回 push 卡片，便于查看与对比"""
+        return {
+            "config": CARD_CONFIG,
+            "header": card_header(self.PUSH_TITLE),
+            "elements": self.push_elements(payload, repo_name) + [PULL_REMINDER],
+        }
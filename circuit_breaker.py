@@ -0,0 +1,159 @@
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 熔断器默认配置，可通过 feishu_config.json 的 "circuit_breaker" 覆盖
+DEFAULT_CIRCUIT_BREAKER_OPTIONS = {
+    "enabled": True,
+    "window": 30,                # 统计最近多少秒内的调用
+    "min_requests": 10,          # 窗口内调用数达到后才判断是否熔断
+    "error_rate": 0.5,           # 失败（网络错误、超时、HTTP 5xx）比例达到后熔断
+    "slow_call_threshold": 3,    # 耗时超过该秒数的调用视为慢调用
+    "slow_call_rate": 0.8,       # 慢调用比例达到后熔断
+    "open_duration": 30,         # 熔断后经过多少秒进入半开状态
+    "half_open_probes": 1,       # 半开状态下同时允许的试探请求数
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """飞书接口的熔断器。
+
+    关闭状态下按秒分桶统计最近 window 秒的失败率与慢调用比例，超过阈值后断开；断开期间的调用直接失败，
+    不占用连接与 worker；open_duration 秒后进入半开状态，只放行少量试探请求，成功则恢复，失败则重新断开。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_CIRCUIT_BREAKER_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.state = CLOSED
+        self.opened_at = 0
+        self._buckets = collections.deque()  # [秒, 调用数, 失败数, 慢调用数]
+        self._totals = [0, 0, 0]
+        self._probes = 0
+        self.opened = 0
+        self.rejected = 0
+        self.last_reason = None
+
+    @property
+    def enabled(self):
+        return bool(self.options["enabled"])
+
+    def _maybe_half_open(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.options["open_duration"]:
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info("飞书接口熔断器进入半开状态，开始试探")
+
+    def allow(self):
+        """申请发出一次调用：拒绝时返回 None，放行时返回许可（放行时的状态），调用结束后交给 record()"""
+        if not self.enabled or self.state == CLOSED:
+            return CLOSED
+        self._maybe_half_open(time.monotonic())
+        if self.state == HALF_OPEN and self._probes < self.options["half_open_probes"]:
+            self._probes += 1
+            return HALF_OPEN
+        self.rejected += 1
+        return None
+
+    @property
+    def is_open(self):
+        """处于断开状态且还没到试探时间"""
+        if not self.enabled or self.state == CLOSED:
+            return False
+        self._maybe_half_open(time.monotonic())
+        return self.state == OPEN
+
+    def retry_after(self):
+        """距离下一次允许试探的秒数"""
+        if self.state == OPEN:
+            return max(0.0, self.opened_at + self.options["open_duration"] - time.monotonic())
+        return 0.0
+
+    def record(self, permit, success, duration):
+        """记录一次调用的结果；success 为 None 表示调用被取消，只归还试探名额"""
+        if not self.enabled:
+            return
+        if permit == HALF_OPEN:
+            if self.state != HALF_OPEN:
+                return
+            self._probes = max(0, self._probes - 1)
+            if success is None:
+                return
+            if success and duration < self.options["slow_call_threshold"]:
+                self._close()
+            else:
+                self._open("半开状态下的试探请求失败" if not success else f"试探请求耗时 {duration:.1f} 秒")
+            return
+        if success is None or self.state != CLOSED:
+            return
+
+        now = time.monotonic()
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0, 0])
+        bucket = self._buckets[-1]
+        failed = 0 if success else 1
+        slow = 1 if duration >= self.options["slow_call_threshold"] else 0
+        bucket[1] += 1
+        bucket[2] += failed
+        bucket[3] += slow
+        self._totals[0] += 1
+        self._totals[1] += failed
+        self._totals[2] += slow
+        self._expire(second)
+        self._evaluate()
+
+    def _expire(self, second):
+        horizon = second - self.options["window"]
+        while self._buckets and self._buckets[0][0] <= horizon:
+            _, calls, failures, slow = self._buckets.popleft()
+            self._totals[0] -= calls
+            self._totals[1] -= failures
+            self._totals[2] -= slow
+
+    def _evaluate(self):
+        calls, failures, slow = self._totals
+        if calls < self.options["min_requests"]:
+            return
+        if failures / calls >= self.options["error_rate"]:
+            self._open(f"最近 {self.options['window']} 秒内 {failures}/{calls} 次调用失败")
+        elif slow / calls >= self.options["slow_call_rate"]:
+            self._open(f"最近 {self.options['window']} 秒内 {slow}/{calls} 次调用超过 {self.options['slow_call_threshold']} 秒")
+
+    def _open(self, reason):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        self.last_reason = reason
+        self._probes = 0
+        logger.error(f"飞书接口熔断器断开，{self.options['open_duration']} 秒后试探: {reason}")
+
+    def _close(self):
+        self.state = CLOSED
+        self._buckets.clear()
+        self._totals = [0, 0, 0]
+        logger.warning("飞书接口试探请求成功，熔断器恢复")
+
+    def stats(self):
+        now = time.monotonic()
+        self._maybe_half_open(now)
+        self._expire(int(now))
+        calls, failures, slow = self._totals
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "retry_after": round(self.retry_after(), 1),
+            "window_calls": calls,
+            "window_failures": failures,
+            "window_slow_calls": slow,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "last_reason": self.last_reason,
+        }
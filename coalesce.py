@@ -0,0 +1,118 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_ZERO_SHA = "0" * 40
+
+
+def _slim_commit(commit):
+    """只保留渲染卡片需要的字段，丢弃 added/modified/removed 等文件列表"""
+    return {
+        "id": commit.get("id"),
+        "message": commit.get("message", ""),
+        "author": {"name": (commit.get("author") or {}).get("name", "未知作者")},
+        "url": commit.get("url", "#"),
+    }
+
+
+class _PendingPush:
+    """聚合窗口内已合并的推送"""
+
+    def __init__(self, job):
+        payload = job["payload"]
+        self.job = job
+        self.first_before = payload.get("before")
+        self.last_after = payload.get("after")
+        self.last_compare = payload.get("compare")
+        self.head_commit = payload.get("head_commit")
+        self.pushers = []
+        self.commits = []
+        self.push_count = 0
+        self.timer = None
+        self.merge(payload)
+
+    def merge(self, payload):
+        self.push_count += 1
+        self.last_after = payload.get("after") or self.last_after
+        self.last_compare = payload.get("compare") or self.last_compare
+        self.head_commit = payload.get("head_commit") or self.head_commit
+        pusher = (payload.get("pusher") or {}).get("name")
+        if pusher and pusher not in self.pushers:
+            self.pushers.append(pusher)
+        self.commits.extend(_slim_commit(c) for c in payload.get("commits") or [])
+
+    def compare_url(self):
+        """从第一次推送的 before 到最后一次推送的 after 的 compare 链接"""
+        html_url = (self.job["payload"].get("repository") or {}).get("html_url")
+        if html_url and self.first_before and self.last_after and self.first_before != _ZERO_SHA:
+            return f"{html_url}/compare/{self.first_before[:12]}...{self.last_after[:12]}"
+        return self.last_compare
+
+    def build_job(self):
+        if self.push_count == 1:
+            return self.job
+        first = self.job["payload"]
+        payload = {
+            "ref": first.get("ref"),
+            "before": self.first_before,
+            "after": self.last_after,
+            "compare": self.compare_url(),
+            "repository": first.get("repository"),
+            "pusher": {"name": ", ".join(self.pushers) or "未知推送者"},
+            "head_commit": self.head_commit,
+            "commits": self.commits,
+            "coalesced_pushes": self.push_count,
+        }
+        return dict(self.job, payload=payload, delivery_id=f"{self.job.get('delivery_id')}+{self.push_count - 1}")
+
+
+class PushCoalescer:
+    """按 (仓库, 分支, 目标群组) 聚合推送：窗口内的多次推送合并为一张卡片，窗口从第一次推送开始计时"""
+
+    def __init__(self, emit):
+        self._emit = emit
+        self._pending = {}
+        self._merged = 0
+        self._emitted = 0
+
+    def add(self, key, window, job):
+        """把推送加入 key 对应的聚合窗口；窗口不存在时新建并在 window 秒后发出。合并到已有窗口时返回 True"""
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.merge(job["payload"])
+            self._merged += 1
+            return True
+        pending = _PendingPush(job)
+        pending.timer = asyncio.get_running_loop().call_later(window, self._flush, key)
+        self._pending[key] = pending
+        return False
+
+    def flush(self, key):
+        """立即发出 key 对应的聚合窗口（例如后续的分支删除事件需要保持顺序时）"""
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.timer.cancel()
+            self._flush(key)
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        job = pending.build_job()
+        self._emitted += 1
+        if pending.push_count > 1:
+            logger.info(f"聚合窗口结束: {key[0]} {key[1]} 合并了 {pending.push_count} 次推送、{len(pending.commits)} 个提交")
+        if not self._emit(job):
+            logger.error(f"聚合后的推送 {job.get('delivery_id')} 无法进入投递队列，已丢弃")
+
+    def flush_all(self):
+        for key in list(self._pending):
+            self.flush(key)
+
+    def stats(self):
+        return {
+            "open_windows": len(self._pending),
+            "merged_pushes": self._merged,
+            "emitted": self._emitted,
+        }
@@ -0,0 +1,52 @@
+import re
+
+# 约定式提交的类型前缀，例如 "feat: xxx"、"fix(scope): xxx"；模块加载时编译一次
+COMMIT_TYPE_PATTERN = re.compile(r"^(\w+)(?:\([^)]*\))?:\s")
+
+# 提交类型 -> (图标, 标签)，可通过 feishu_config.json 的 "commit_types" 扩展或覆盖
+DEFAULT_COMMIT_TYPES = {
+    "feat": ("✨", "特性"),
+    "fix": ("🐛", "修复"),
+    "docs": ("📚", "文档"),
+    "style": ("💅", "样式"),
+    "refactor": ("♻️", "重构"),
+    "test": ("🧪", "测试"),
+    "chore": ("🔧", "杂项"),
+    "perf": ("⚡", "性能"),
+    "ci": ("🚀", "CI"),
+    "build": ("📦", "构建"),
+    "revert": ("⏪", "回滚"),
+}
+MERGE_TYPE = ("🔀", "合并")
+OTHER_TYPE = ("📝", "其他")
+
+
+class CommitClassifier:
+    """根据提交信息的首行判断提交类型，返回图标与标签"""
+
+    def __init__(self, custom_types=None):
+        self.types = dict(DEFAULT_COMMIT_TYPES)
+        for name, spec in (custom_types or {}).items():
+            if isinstance(spec, dict):
+                spec = (spec.get("icon", OTHER_TYPE[0]), spec.get("label", name))
+            self.types[name.lower()] = tuple(spec)
+
+    def classify(self, message):
+        """message 为提交信息首行，返回 (图标, 标签)"""
+        match = COMMIT_TYPE_PATTERN.match(message)
+        if match:
+            return self.types.get(match.group(1).lower(), OTHER_TYPE)
+        if message[:5].lower() == "merge":
+            return MERGE_TYPE
+        return OTHER_TYPE
+
+    def format(self, commit):
+        """格式化提交信息，返回 (带图标的提交信息, 提交者显示名)"""
+        message = commit.get("message", "无提交信息").partition("\n")[0]
+        author = (commit.get("author") or {}).get("name", "未知作者")
+
+        # 为提交者添加@符号并加粗
+        author_display = f"**@{author}**" if author != "未知作者" else author
+
+        icon, type_label = self.classify(message)
+        return f"{icon} **{type_label}** {message}", author_display
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 配置存储默认配置，可通过 feishu_config.json 的 "config_store" 覆盖
+DEFAULT_CONFIG_STORE_OPTIONS = {
+    "write_delay": 0.5,      # 修改后等待多少秒再写回文件，期间的多次修改合并为一次写入
+    "hot_reload": True,      # 是否在配置文件被修改后自动重新加载
+    "reload_interval": 2,    # 检查配置文件修改时间的间隔秒数
+}
+
+
+class _FileChanged(Exception):
+    """写回过程中配置文件被其他进程或编辑器修改"""
+
+
+class ConfigStore:
+    """feishu_config.json 的内存副本。
+
+    读取只访问内存；修改先更新内存，再在事件循环之外以"写临时文件 + 重命名"的方式原子地写回，
+    短时间内的多次修改合并为一次写入。写回前文件已被外部修改（运维编辑、其他 worker 写回）时，
+    先重新读取文件，只把本进程的修改应用在其上，不会用过期的内存副本覆盖别人的修改。后台按修改时间轮询文件，被外部修改时重新加载并通知监听者。
+    path 为 None 时只保存在内存中（例如由调用方直接传入配置字典），不写回也不热加载。
+    """
+
+    def __init__(self, path, options=None):
+        self.path = path
+        self.options = dict(DEFAULT_CONFIG_STORE_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._data = {}
+        self._signature = None   # 最近一次读到或写出的文件的 (mtime_ns, size)
+        self._pending = {}       # 尚未写回文件的修改
+        self._writer = None
+        self._write_lock = None
+        self._poller = None
+        self._listeners = []
+        self.writes = 0
+        self.reloads = 0
+
+    @property
+    def data(self):
+        """当前配置；修改时整体替换，持有旧字典的调用方不会看到写了一半的状态"""
+        return self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def add_listener(self, callback):
+        """注册热加载回调 callback(config_data)"""
+        self._listeners.append(callback)
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        signature = self._file_signature()
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{self.path} 的顶层必须是 JSON 对象")
+        return data, signature
+
+    def load(self, data=None):
+        """同步读取配置文件（创建应用时调用），JSON 无效或读取失败时抛出异常；给出 data 时直接使用它"""
+        if data is not None:
+            self._data, self._signature = dict(data), None
+        else:
+            self._data, self._signature = self._read()
+        return self._data
+
+    def update(self, changes):
+        """修改配置并安排写回；没有运行中的事件循环时（例如创建应用时）等到 start() 之后再写"""
+        self._data = {**self._data, **changes}
+        self._pending.update(changes)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._schedule_write(loop)
+
+    def _schedule_write(self, loop):
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._debounced_write())
+
+    def _write_atomic(self, data, expected_signature):
+        """原子地写入 data；重命名之前文件的 (mtime, size) 已不是 expected_signature 时放弃并抛出 _FileChanged"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".feishu_config.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.path):
+                os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+            if self._file_signature() != expected_signature:
+                raise _FileChanged()
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.writes += 1
+        return self._file_signature()
+
+    def _write_merged(self, pending, attempts=3):
+        """把 pending 写回文件：文件自上次读写后未被修改时写出内存副本，否则重新读取文件并只应用 pending。
+        返回 (写出的配置, 写出后的文件签名, 是否合并了外部修改)"""
+        data, signature, merged = self._data, self._signature, False
+        for _ in range(attempts):
+            current = self._file_signature()
+            if current is not None and current != signature:
+                data, signature = self._read()
+                data, merged = {**data, **pending}, True
+            try:
+                return data, self._write_atomic(data, signature), merged
+            except _FileChanged:
+                signature = None  # 强制下一轮重新读取
+        raise OSError(f"{self.path} 在写回期间被反复修改")
+
+    async def _debounced_write(self):
+        await asyncio.sleep(self.options["write_delay"])
+        await self.flush()
+
+    async def flush(self):
+        """立即把未写回的修改写入文件"""
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            if not self._pending:
+                return
+            if self.path is None:
+                self._pending = {}
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                data, signature, merged = await asyncio.to_thread(self._write_merged, pending)
+            except (OSError, ValueError) as e:
+                self._pending = {**pending, **self._pending}
+                logger.error(f"写入配置文件 {self.path} 失败，将在下次修改时重试: {e}")
+                return
+            self._signature = signature
+            logger.info(f"配置已写回 {self.path}")
+            if merged:
+                # 文件中的外部修改已经合并写回，轮询不会再看到这次变化，在这里热加载
+                self._apply({**data, **self._pending})
+
+    async def start(self):
+        if self._pending:
+            self._schedule_write(asyncio.get_running_loop())
+        if self.path is not None and self.options["hot_reload"] and self._poller is None:
+            self._poller = asyncio.create_task(self._poll_loop(), name="config-reloader")
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+        await self.flush()
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.options["reload_interval"])
+            signature = await asyncio.to_thread(self._file_signature)
+            if signature is None or signature == self._signature:
+                continue
+            try:
+                data, signature = await asyncio.to_thread(self._read)
+            except (OSError, ValueError) as e:
+                # 编辑器可能正在写入，或者文件内容无效：保留当前配置，下次再试
+                logger.error(f"重新加载配置文件 {self.path} 失败，继续使用当前配置: {e}")
+                self._signature = signature
+                continue
+            if self._pending:
+                # 本进程还有未写回的修改，这些字段以内存中的修改为准
+                data = {**data, **self._pending}
+            self._signature = signature
+            self._apply(data)
+
+    def _apply(self, data):
+        """采用文件中被外部修改的配置并通知监听者"""
+        self._data = data
+        self.reloads += 1
+        logger.info(f"检测到配置文件 {self.path} 被修改，已重新加载")
+        for callback in self._listeners:
+            try:
+                callback(data)
+            except Exception as e:
+                logger.error(f"应用重新加载的配置失败: {e}")
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "hot_reload": self._poller is not None,
+            "pending_write": bool(self._pending),
+            "writes": self.writes,
+            "reloads": self.reloads,
+        }
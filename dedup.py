@@ -0,0 +1,138 @@
+import asyncio
+import collections
+import logging
+import sqlite3
+import time
+
+from state_backend import check_local_sqlite_path
+
+logger = logging.getLogger(__name__)
+
+# 去重索引默认配置，可通过 feishu_config.json 的 "dedup" 覆盖
+DEFAULT_DEDUP_OPTIONS = {
+    "max_entries": 100000,   # 内存中最多保留的投递ID数量，超出后淘汰最早的
+    "ttl": 86400,            # 投递ID的保留秒数，GitHub 与飞书的重试都在这个时间内
+    "persistent": False,     # 是否同时记录到 SQLite，重启后或多个 worker 进程之间也能去重
+    "path": "dedup.db",
+}
+
+
+class DedupIndex:
+    """按投递ID去重：内存中是一个按插入顺序淘汰的有界 TTL 索引，查找与插入都是 O(1)；
+    可选的 SQLite 持久层用于跨重启、跨进程去重。"""
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_DEDUP_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._entries = collections.OrderedDict()  # key -> 过期时间，TTL 固定所以插入顺序即过期顺序
+        self._conn = None
+        self._db_lock = None
+        self._inserts_since_purge = 0
+        self.checks = 0
+        self.duplicates = 0
+
+    async def start(self):
+        if self.options["persistent"] and self._conn is None:
+            self._db_lock = asyncio.Lock()
+            self._conn = await asyncio.to_thread(self._connect)
+            logger.info(f"去重索引持久层已打开: {self.options['path']}")
+
+    def _connect(self):
+        check_local_sqlite_path(self.options["path"], "去重索引")
+        conn = sqlite3.connect(self.options["path"], check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS dedup (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        conn.execute("DELETE FROM dedup WHERE expires_at <= ?", (time.time(),))
+        return conn
+
+    async def stop(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.to_thread(conn.close)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            key, expires_at = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.options["max_entries"]:
+                break
+            entries.popitem(last=False)
+
+    async def check_and_mark(self, key):
+        """记录 key；若 key 在有效期内已出现过则返回 True（重复投递）"""
+        self.checks += 1
+        now = time.time()
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            self.duplicates += 1
+            return True
+
+        if self._conn is not None:
+            try:
+                async with self._db_lock:
+                    inserted = await asyncio.to_thread(self._insert, key, now)
+            except sqlite3.Error as e:
+                logger.error(f"写入去重索引持久层失败，仅使用内存索引: {e}")
+                inserted = True
+            if not inserted:
+                self._entries.pop(key, None)
+                self._entries[key] = now + self.options["ttl"]
+                self.duplicates += 1
+                return True
+
+        self._entries.pop(key, None)
+        self._entries[key] = now + self.options["ttl"]
+        self._evict(now)
+        return False
+
+    async def seen(self, key):
+        """key 是否在有效期内出现过，只查询不记录（用于试运行）"""
+        now = time.time()
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            return True
+        if self._conn is None:
+            return False
+        try:
+            async with self._db_lock:
+                return await asyncio.to_thread(self._lookup, key, now)
+        except sqlite3.Error as e:
+            logger.error(f"查询去重索引持久层失败: {e}")
+            return False
+
+    def _lookup(self, key, now):
+        return self._conn.execute("SELECT 1 FROM dedup WHERE key = ? AND expires_at > ?", (key, now)).fetchone() is not None
+
+    def _insert(self, key, now):
+        """插入或续期已过期的记录，返回是否为新记录"""
+        cursor = self._conn.execute(
+            "INSERT INTO dedup (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE dedup.expires_at <= ?",
+            (key, now + self.options["ttl"], now),
+        )
+        self._inserts_since_purge += 1
+        if self._inserts_since_purge >= 1000:
+            self._inserts_since_purge = 0
+            self._conn.execute("DELETE FROM dedup WHERE expires_at <= ?", (now,))
+        return cursor.rowcount == 1
+
+    async def forget(self, key):
+        """撤销记录，用于请求最终未被接受（例如队列已满返回 503）时允许重新投递"""
+        self._entries.pop(key, None)
+        if self._conn is not None:
+            try:
+                async with self._db_lock:
+                    await asyncio.to_thread(self._conn.execute, "DELETE FROM dedup WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                logger.error(f"从去重索引持久层删除 {key} 失败: {e}")
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.options["max_entries"],
+            "persistent": self._conn is not None,
+            "checks": self.checks,
+            "duplicates": self.duplicates,
+        }
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 投递管道默认配置，可通过 feishu_config.json 的 "delivery" 覆盖
+DEFAULT_DELIVERY_OPTIONS = {
+    "workers": 4,            # 并发投递的 worker 数量
+    "max_queue_size": 1000,  # 队列上限，满了之后 webhook 返回 503
+    "drain_timeout": 30,     # 关闭时等待队列清空的最长秒数
+}
+
+
+class DeliveryError(Exception):
+    """发送失败；retryable 为 False 时表示重试也不会成功（例如机器人不在群内）。
+
+    retry_after 不为空时表示飞书暂时不可用（熔断中），消息没有真正发出，应搁置到 retry_after 秒之后再发，不计入尝试次数。
+    """
+
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class DeliveryPipeline:
+    """进程内投递管道：webhook 入队后立即返回，由后台 worker 渲染卡片并发送"""
+
+    def __init__(self, handler, options=None):
+        self.options = dict(DEFAULT_DELIVERY_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._handler = handler
+        self._queue = None
+        self._workers = []
+        self._busy = 0
+        self._accepted = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.options["max_queue_size"])
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"delivery-worker-{i}")
+            for i in range(self.options["workers"])
+        ]
+        logger.info(f"投递管道已启动: workers={self.options['workers']}, max_queue_size={self.options['max_queue_size']}")
+
+    def submit(self, job):
+        """将任务放入队列，队列已满或管道未启动时返回 False"""
+        if not self.running:
+            self._rejected += 1
+            return False
+        job.setdefault("enqueued_at", time.monotonic())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._rejected += 1
+            logger.warning(f"投递队列已满 ({self._queue.qsize()})，拒绝任务: {job.get('delivery_id')}")
+            return False
+        self._accepted += 1
+        return True
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            self._busy += 1
+            try:
+                await self._handler(job)
+                self._processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"投递任务 {job.get('delivery_id')} 处理失败: {e}", exc_info=True)
+            finally:
+                self._busy -= 1
+                self._queue.task_done()
+
+    async def stop(self):
+        """停止接收新任务，在 drain_timeout 内处理完队列中剩余的任务后关闭 worker"""
+        if not self.running:
+            return
+        workers, self._workers = self._workers, []
+        pending = self._queue.qsize()
+        if pending or self._busy:
+            logger.info(f"投递管道正在关闭，等待 {pending} 个排队任务和 {self._busy} 个进行中的任务完成")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.options["drain_timeout"])
+        except asyncio.TimeoutError:
+            logger.error(f"投递管道在 {self.options['drain_timeout']} 秒内未能清空，丢弃 {self._queue.qsize()} 个任务")
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        logger.info("投递管道已关闭")
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.options["max_queue_size"],
+            "workers": len(self._workers),
+            "busy_workers": self._busy,
+            "accepted": self._accepted,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
@@ -0,0 +1,433 @@
+import re
+
+from card_renderer import lark_md, link_button, render_card
+
+# GitHub 的事件负载通常以 "action" 开头，用它在解析整个请求体之前判断 action
+_LEADING_ACTION_PATTERN = re.compile(rb'^\s*\{\s*"action"\s*:\s*"([A-Za-z_]+)"')
+
+
+def peek_action(raw_body):
+    """不解析 JSON，从请求体开头读取 action；不在开头时返回 None"""
+    match = _LEADING_ACTION_PATTERN.match(raw_body[:64])
+    return match.group(1).decode("ascii") if match else None
+
+
+def _short_text(text, limit=200):
+    """取首行并截断，避免 PR/Issue 正文让卡片过长"""
+    line = (text or "").strip().partition("\n")[0]
+    return line if len(line) <= limit else line[:limit] + "…"
+
+
+def _login(user):
+    return (user or {}).get("login") or "未知用户"
+
+
+def _pick(value, spec):
+    """按字段声明裁剪一个值：spec 为元组时保留其中的键，为字典时逐键递归；列表逐项裁剪"""
+    if isinstance(value, list):
+        return [_pick(item, spec) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if isinstance(spec, dict):
+        return {key: value[key] if sub is None else _pick(value[key], sub)
+                for key, sub in spec.items() if key in value}
+    return {key: value[key] for key in spec if key in value}
+
+
+def extract_fields(payload, fields):
+    """只保留 fields 中声明的顶层字段（值为 None 的字段省略）"""
+    slim = {}
+    for name, spec in fields.items():
+        value = payload.get(name)
+        if value is None:
+            continue
+        slim[name] = value if spec is None else _pick(value, spec)
+    return slim
+
+
+# push 负载中每个提交只保留渲染与聚合需要的字段，不保留 added/modified/removed 文件列表
+_COMMIT_FIELDS = {"id": None, "message": None, "author": ("name",), "url": None}
+_USER_FIELDS = ("login",)
+_REPOSITORY_FIELDS = ("full_name", "html_url")
+
+
+class EventHandler:
+    """一种 GitHub 事件的处理器。
+
+    actions 为处理的 action 集合（None 表示全部），fields 声明渲染需要的顶层负载字段：
+    值为 None 时保留整个字段，为元组时只保留其中的子字段，为字典时按子字段的声明递归裁剪；
+    字段是对象列表时逐项裁剪。payload_parser 按同一份声明解码请求体，未声明的字段不会被构建成对象。
+    """
+
+    event = None
+    actions = None
+    fields = {}
+    title = "GitHub 通知"
+    updatable = False  # 为 True 时同一个 message_key 的后续事件更新已发出的卡片，而不是发送新卡片
+
+    def accepts(self, action):
+        return self.actions is None or action in self.actions
+
+    def extract(self, payload):
+        """只保留 fields 中声明的字段，减少排队与聚合期间占用的内存"""
+        return extract_fields(payload, self.fields)
+
+    def template(self, payload):
+        return "blue"
+
+    def branch(self, payload):
+        """事件所属的分支，用于路由规则的分支过滤；没有分支概念的事件返回 None，
+        有 ref 但不是分支（例如推送标签）时返回空字符串，不满足任何分支过滤条件"""
+        return None
+
+    def message_key(self, payload, repo_name):
+        """可更新卡片的 key，同一个 key 的事件共用一张卡片"""
+        return None
+
+    def update_rank(self, payload):
+        """事件的进度（可比较的值），晚到的更早进度的事件不会覆盖卡片"""
+        return 0
+
+    def elements(self, payload, repo_name):
+        raise NotImplementedError
+
+    def render(self, payload, repo_name):
+        """返回卡片 JSON 字符串"""
+        return render_card(
+            self.elements(payload, repo_name), self.title, self.template(payload), update_multi=self.updatable
+        )
+
+
+class PushHandler(EventHandler):
+    event = "push"
+    fields = {
+        "ref": None, "before": None, "after": None, "compare": None,
+        "created": None, "deleted": None, "forced": None,
+        "pusher": ("name",), "head_commit": _COMMIT_FIELDS, "commits": _COMMIT_FIELDS,
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    def branch(self, payload):
+        ref = payload.get("ref") or ""
+        return ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ""
+
+    def render(self, payload, repo_name):
+        return self.renderer.render_push(payload, repo_name)
+
+
+class PullRequestHandler(EventHandler):
+    event = "pull_request"
+    title = "GitHub Pull Request 通知"
+    # action -> (状态文字, 卡片颜色)；closed 需要再区分是否已合并
+    ACTIONS = {
+        "opened": ("🆕 已创建", "blue"),
+        "reopened": ("🔄 已重新打开", "blue"),
+        "ready_for_review": ("👀 待评审", "turquoise"),
+        "closed": ("🚫 已关闭", "grey"),
+    }
+    actions = frozenset(ACTIONS)
+    fields = {
+        "action": None,
+        "pull_request": {"number": None, "title": None, "html_url": None, "user": _USER_FIELDS,
+                         "head": ("ref",), "base": ("ref",), "merged": None, "draft": None},
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def branch(self, payload):
+        return ((payload.get("pull_request") or {}).get("base") or {}).get("ref")
+
+    def _status(self, payload):
+        if payload.get("action") == "closed" and (payload.get("pull_request") or {}).get("merged"):
+            return "🔀 已合并", "purple"
+        return self.ACTIONS.get(payload.get("action"), ("📝 已更新", "blue"))
+
+    def template(self, payload):
+        return self._status(payload)[1]
+
+    def elements(self, payload, repo_name):
+        pr = payload.get("pull_request") or {}
+        head = (pr.get("head") or {}).get("ref", "?")
+        base = (pr.get("base") or {}).get("ref", "?")
+        return [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"📌 **#{pr.get('number')}** {pr.get('title', '')}"),
+            lark_md(f"👤 **作者**: **@{_login(pr.get('user'))}**"),
+            lark_md(f"🌿 **分支**: {head} → {base}"),
+            lark_md(f"📋 **状态**: {self._status(payload)[0]}"),
+            link_button("🔗 查看 Pull Request", pr.get("html_url", "#")),
+        ]
+
+
+class PullRequestReviewHandler(EventHandler):
+    event = "pull_request_review"
+    title = "GitHub 代码评审通知"
+    actions = frozenset({"submitted"})
+    # 评审结果 -> (文字, 卡片颜色)
+    STATES = {
+        "approved": ("✅ 通过", "green"),
+        "changes_requested": ("✏️ 需要修改", "orange"),
+        "commented": ("💬 评论", "blue"),
+    }
+    fields = {
+        "action": None,
+        "review": {"user": _USER_FIELDS, "state": None, "body": None, "html_url": None},
+        "pull_request": {"number": None, "title": None, "html_url": None, "base": ("ref",)},
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def branch(self, payload):
+        return ((payload.get("pull_request") or {}).get("base") or {}).get("ref")
+
+    def _state(self, payload):
+        state = ((payload.get("review") or {}).get("state") or "").lower()
+        return self.STATES.get(state, ("💬 评论", "blue"))
+
+    def template(self, payload):
+        return self._state(payload)[1]
+
+    def elements(self, payload, repo_name):
+        review = payload.get("review") or {}
+        pr = payload.get("pull_request") or {}
+        elements = [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"📌 **#{pr.get('number')}** {pr.get('title', '')}"),
+            lark_md(f"👤 **评审者**: **@{_login(review.get('user'))}**"),
+            lark_md(f"📋 **结果**: {self._state(payload)[0]}"),
+        ]
+        if review.get("body"):
+            elements.append(lark_md(f"💬 **意见**: {_short_text(review['body'])}"))
+        elements.append(link_button("🔗 查看评审", review.get("html_url") or pr.get("html_url", "#")))
+        return elements
+
+
+# CI 结论 -> (文字, 卡片颜色)；未结束时按状态显示
+CI_CONCLUSIONS = {
+    "success": ("✅ 成功", "green"),
+    "failure": ("❌ 失败", "red"),
+    "timed_out": ("⌛ 超时", "red"),
+    "cancelled": ("⏹️ 已取消", "grey"),
+    "skipped": ("⏭️ 已跳过", "grey"),
+    "neutral": ("➖ 中性", "grey"),
+    "action_required": ("⚠️ 需要处理", "orange"),
+    "stale": ("💤 已过期", "grey"),
+}
+CI_STATUSES = {
+    "requested": ("⏳ 排队中", "wathet"),
+    "queued": ("⏳ 排队中", "wathet"),
+    "waiting": ("⏳ 等待中", "wathet"),
+    "pending": ("⏳ 等待中", "wathet"),
+    "in_progress": ("🏃 运行中", "blue"),
+}
+
+
+# CI 状态的先后顺序
+CI_STATUS_RANKS = {"requested": 0, "queued": 0, "waiting": 1, "pending": 1, "in_progress": 2, "completed": 3}
+
+
+def ci_status(status, conclusion):
+    if status == "completed":
+        return CI_CONCLUSIONS.get(conclusion, (f"🏁 已完成 ({conclusion})", "grey"))
+    return CI_STATUSES.get(status, (f"⏳ {status}", "wathet"))
+
+
+class WorkflowRunHandler(EventHandler):
+    event = "workflow_run"
+    title = "GitHub Actions 通知"
+    actions = frozenset({"requested", "in_progress", "completed"})
+    updatable = True
+    fields = {
+        "action": None,
+        "workflow_run": {"id": None, "name": None, "run_number": None, "run_attempt": None, "head_branch": None,
+                         "head_sha": None, "status": None, "conclusion": None, "html_url": None, "event": None,
+                         "actor": _USER_FIELDS},
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def template(self, payload):
+        run = payload.get("workflow_run") or {}
+        return ci_status(run.get("status"), run.get("conclusion"))[1]
+
+    def branch(self, payload):
+        return (payload.get("workflow_run") or {}).get("head_branch")
+
+    def message_key(self, payload, repo_name):
+        run_id = (payload.get("workflow_run") or {}).get("id")
+        return f"{repo_name}:workflow_run:{run_id}" if run_id is not None else None
+
+    def update_rank(self, payload):
+        # 重新运行时 run id 不变、run_attempt 递增，新一轮的排队状态应覆盖上一轮的结果
+        run = payload.get("workflow_run") or {}
+        return (run.get("run_attempt") or 1, CI_STATUS_RANKS.get(run.get("status"), 0))
+
+    def elements(self, payload, repo_name):
+        run = payload.get("workflow_run") or {}
+        status_text = ci_status(run.get("status"), run.get("conclusion"))[0]
+        return [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"⚙️ **工作流**: {run.get('name', '未知工作流')} #{run.get('run_number', '?')}"),
+            lark_md(f"🌿 **分支**: {run.get('head_branch') or '未知分支'}"),
+            lark_md(f"🔖 **提交**: {(run.get('head_sha') or '')[:7]}"),
+            lark_md(f"👤 **触发者**: **@{_login(run.get('actor'))}** ({run.get('event', '?')})"),
+            lark_md(f"📋 **状态**: {status_text}"),
+            link_button("🔗 查看运行详情", run.get("html_url", "#")),
+        ]
+
+
+class CheckSuiteHandler(EventHandler):
+    event = "check_suite"
+    title = "GitHub 检查通知"
+    actions = frozenset({"completed"})
+    updatable = True
+    fields = {
+        "action": None,
+        "check_suite": {"id": None, "head_branch": None, "head_sha": None, "status": None, "conclusion": None,
+                        "app": ("id", "name")},
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def template(self, payload):
+        suite = payload.get("check_suite") or {}
+        return ci_status(suite.get("status"), suite.get("conclusion"))[1]
+
+    def branch(self, payload):
+        return (payload.get("check_suite") or {}).get("head_branch")
+
+    def message_key(self, payload, repo_name):
+        # 同一个提交的同一个检查应用重新运行时更新原来的卡片
+        suite = payload.get("check_suite") or {}
+        if not suite.get("head_sha"):
+            return None
+        return f"{repo_name}:check_suite:{(suite.get('app') or {}).get('id')}:{suite['head_sha']}"
+
+    def update_rank(self, payload):
+        return CI_STATUS_RANKS.get((payload.get("check_suite") or {}).get("status"), 0)
+
+    def elements(self, payload, repo_name):
+        suite = payload.get("check_suite") or {}
+        head_sha = suite.get("head_sha") or ""
+        html_url = (payload.get("repository") or {}).get("html_url")
+        checks_url = f"{html_url}/commit/{head_sha}/checks" if html_url and head_sha else "#"
+        return [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"🧩 **检查**: {(suite.get('app') or {}).get('name', '未知应用')}"),
+            lark_md(f"🌿 **分支**: {suite.get('head_branch') or '未知分支'}"),
+            lark_md(f"🔖 **提交**: {head_sha[:7]}"),
+            lark_md(f"📋 **状态**: {ci_status(suite.get('status'), suite.get('conclusion'))[0]}"),
+            link_button("🔗 查看检查结果", checks_url),
+        ]
+
+
+class ReleaseHandler(EventHandler):
+    event = "release"
+    title = "GitHub 版本发布通知"
+    actions = frozenset({"published"})
+    fields = {
+        "action": None,
+        "release": {"tag_name": None, "name": None, "html_url": None, "author": _USER_FIELDS,
+                    "prerelease": None, "body": None},
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def template(self, payload):
+        return "orange" if (payload.get("release") or {}).get("prerelease") else "green"
+
+    def elements(self, payload, repo_name):
+        release = payload.get("release") or {}
+        tag = release.get("tag_name", "?")
+        kind = "预发布" if release.get("prerelease") else "正式版"
+        elements = [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"🏷️ **版本**: {tag} ({kind})"),
+        ]
+        if release.get("name") and release["name"] != tag:
+            elements.append(lark_md(f"📝 **标题**: {release['name']}"))
+        elements.append(lark_md(f"👤 **发布者**: **@{_login(release.get('author'))}**"))
+        if release.get("body"):
+            elements.append(lark_md(f"💬 **说明**: {_short_text(release['body'])}"))
+        elements.append(link_button("🔗 查看版本", release.get("html_url", "#")))
+        return elements
+
+
+class IssuesHandler(EventHandler):
+    event = "issues"
+    title = "GitHub Issue 通知"
+    ACTIONS = {
+        "opened": ("🆕 已创建", "blue"),
+        "reopened": ("🔄 已重新打开", "blue"),
+        "closed": ("✅ 已关闭", "grey"),
+    }
+    actions = frozenset(ACTIONS)
+    fields = {
+        "action": None,
+        "issue": {"number": None, "title": None, "html_url": None, "user": _USER_FIELDS,
+                  "labels": ("name",), "state_reason": None},
+        "sender": _USER_FIELDS,
+        "repository": _REPOSITORY_FIELDS,
+    }
+
+    def template(self, payload):
+        return self.ACTIONS.get(payload.get("action"), ("", "blue"))[1]
+
+    def elements(self, payload, repo_name):
+        issue = payload.get("issue") or {}
+        status_text = self.ACTIONS.get(payload.get("action"), ("📝 已更新", ""))[0]
+        if payload.get("action") == "closed" and issue.get("state_reason") == "not_planned":
+            status_text = "🚫 已关闭 (不计划处理)"
+        elements = [
+            lark_md(f"📦 **仓库**: {repo_name}"),
+            lark_md(f"📌 **#{issue.get('number')}** {issue.get('title', '')}"),
+            lark_md(f"👤 **作者**: **@{_login(issue.get('user'))}**"),
+            lark_md(f"📋 **状态**: {status_text} (操作者: @{_login(payload.get('sender'))})"),
+        ]
+        labels = [label.get("name") for label in issue.get("labels") or [] if label.get("name")]
+        if labels:
+            elements.append(lark_md(f"🏷️ **标签**: {', '.join(labels)}"))
+        elements.append(link_button("🔗 查看 Issue", issue.get("html_url", "#")))
+        return elements
+
+
+class EventRegistry:
+    """事件类型 -> 处理器的分发表，未注册的事件或 action 在解析请求体之前即可忽略"""
+
+    def __init__(self, handlers=()):
+        self._handlers = {}
+        for handler in handlers:
+            self.register(handler)
+
+    def register(self, handler):
+        self._handlers[handler.event] = handler
+
+    @property
+    def events(self):
+        return sorted(self._handlers)
+
+    def handles_event(self, event_type):
+        return event_type in self._handlers
+
+    def handler_for(self, event_type, action=None):
+        """返回处理该事件和 action 的处理器，不处理时返回 None"""
+        handler = self._handlers.get(event_type)
+        if handler is None or not handler.accepts(action):
+            return None
+        return handler
+
+    def get(self, event_type):
+        return self._handlers[event_type]
+
+    def render(self, event_type, payload, repo_name):
+        return self._handlers[event_type].render(payload, repo_name)
+
+
+def create_default_registry(renderer):
+    return EventRegistry([
+        PushHandler(renderer),
+        PullRequestHandler(),
+        PullRequestReviewHandler(),
+        WorkflowRunHandler(),
+        CheckSuiteHandler(),
+        ReleaseHandler(),
+        IssuesHandler(),
+    ])
@@ -0,0 +1,143 @@
+import logging
+
+from circuit_breaker import CircuitBreaker
+from delivery import DeliveryError
+from feishu_client import FeishuClient
+from rate_limiter import SendScheduler
+from token_manager import TenantTokenManager
+
+logger = logging.getLogger(__name__)
+
+# feishu_app_id / feishu_app_secret 对应的应用名；路由目标不带应用名时使用该应用
+DEFAULT_APP_NAME = "default"
+
+# feishu_apps 中每个应用可以单独覆盖的配置节，未覆盖的项沿用全局配置
+APP_OPTION_SECTIONS = ("feishu_http", "token", "rate_limit", "circuit_breaker")
+
+
+class FeishuApp:
+    """一个飞书应用：各自的 tenant_access_token、发送限流、熔断器与 HTTP 连接池"""
+
+    def __init__(self, name, app_id, app_secret, options=None):
+        options = options or {}
+        self.name = name
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.encrypt_key = options.get("encrypt_key")
+        self.verification_token = options.get("verification_token")
+        self.token_options = options.get("token") or {}
+        self.breaker = CircuitBreaker(options.get("circuit_breaker"))
+        self.client = FeishuClient(options.get("feishu_http"), breaker=self.breaker)
+        self.scheduler = SendScheduler(options.get("rate_limit"))
+        # 需要状态后端，在应用启动时创建
+        self.token_manager = None
+
+    @property
+    def token_key(self):
+        """token 在状态后端中的键；默认应用沿用原来的键，升级后不必重新获取 token"""
+        if self.name == DEFAULT_APP_NAME:
+            return "tenant_access_token"
+        return f"tenant_access_token:{self.name}"
+
+    def create_token_manager(self, backend):
+        self.token_manager = TenantTokenManager(
+            self.fetch_tenant_access_token, self.token_options, backend=backend, key=self.token_key
+        )
+        return self.token_manager
+
+    async def fetch_tenant_access_token(self):
+        """向飞书请求本应用新的 tenant_access_token，返回原始响应"""
+        return await self.client.fetch_tenant_access_token(self.app_id, self.app_secret)
+
+    @property
+    def configured(self):
+        return bool(self.app_id and self.app_secret
+                    and not self.app_id.startswith("YOUR_") and not self.app_secret.startswith("YOUR_"))
+
+    def stats(self):
+        return {
+            "app_id": self.app_id,
+            "token": self.token_manager.stats() if self.token_manager is not None else None,
+            "rate_limit": self.scheduler.stats(),
+            "circuit_breaker": self.breaker.stats(),
+        }
+
+
+class FeishuAppRegistry:
+    """同一进程中托管的多个飞书应用。
+
+    feishu_app_id / feishu_app_secret 为默认应用，feishu_apps 中按名称配置其他应用：
+        {"team-b": {"app_id": "cli_xxx", "app_secret": "...", "rate_limit": {...}}}
+    路由目标写成 "team-b:oc_xxx" 时用该应用发送，不带前缀的群组ID用默认应用发送。
+    各应用的 token、限流与连接池相互独立，投递管道、发件箱与 worker 进程由所有应用共享。
+    """
+
+    def __init__(self, app_id, app_secret, apps=None, defaults=None):
+        defaults = defaults or {}
+        self._apps = {DEFAULT_APP_NAME: FeishuApp(DEFAULT_APP_NAME, app_id, app_secret, defaults)}
+        for name, config in (apps or {}).items():
+            if name == DEFAULT_APP_NAME or ":" in name:
+                logger.error(f"飞书应用名 {name} 无效（不能为 {DEFAULT_APP_NAME} 或包含冒号），已忽略")
+                continue
+            if not config.get("app_id") or not config.get("app_secret"):
+                logger.error(f"飞书应用 {name} 缺少 app_id 或 app_secret，已忽略")
+                continue
+            options = dict(config)
+            for section in APP_OPTION_SECTIONS:
+                options[section] = {**(defaults.get(section) or {}), **(config.get(section) or {})}
+            self._apps[name] = FeishuApp(name, config["app_id"], config["app_secret"], options)
+        self._by_app_id = {app.app_id: app for app in self._apps.values()}
+
+    @property
+    def default(self):
+        return self._apps[DEFAULT_APP_NAME]
+
+    def __iter__(self):
+        return iter(self._apps.values())
+
+    def __len__(self):
+        return len(self._apps)
+
+    def get(self, name=None):
+        return self._apps.get(name or DEFAULT_APP_NAME)
+
+    def resolve(self, target):
+        """把路由目标拆成 (应用, 群组ID)；应用名未配置时抛出不可重试的 DeliveryError"""
+        name, sep, chat_id = target.partition(":")
+        if not sep:
+            return self.default, target
+        app = self._apps.get(name)
+        if app is None:
+            raise DeliveryError(f"群组 {target} 指定的飞书应用 {name} 未配置", retryable=False)
+        return app, chat_id
+
+    def qualify(self, app_id, chat_id):
+        """飞书事件中的群组ID加上接收事件的应用名，与路由目标的写法一致"""
+        app = self._by_app_id.get(app_id)
+        if app is None or app.name == DEFAULT_APP_NAME or not chat_id:
+            return chat_id
+        return f"{app.name}:{chat_id}"
+
+    def encrypt_keys(self):
+        return [app.encrypt_key for app in self if app.encrypt_key]
+
+    def verification_tokens(self):
+        return [app.verification_token for app in self if app.verification_token]
+
+    def create_token_managers(self, backend):
+        for app in self:
+            app.create_token_manager(backend)
+
+    async def start(self):
+        for app in self:
+            await app.token_manager.start()
+
+    async def stop(self):
+        for app in self:
+            await app.scheduler.stop()
+            if app.token_manager is not None:
+                await app.token_manager.stop()
+            await app.client.aclose()
+
+    def stats(self):
+        return {app.name: app.stats() for app in self}
@@ -0,0 +1,222 @@
+import importlib.util
+import logging
+import os
+import time
+
+from card_renderer import dumps
+
+logger = logging.getLogger(__name__)
+
+FEISHU_API_BASE = "https://open.feishu.cn/open-apis"
+
+# 连接池与超时的默认值，可通过 feishu_config.json 的 "feishu_http" 覆盖
+DEFAULT_HTTP_OPTIONS = {
+    "base_url": FEISHU_API_BASE,      # 开放接口地址，环境变量 FEISHU_API_BASE 优先（例如指向本地模拟服务）
+    "max_connections": 20,            # 连接池最大连接数
+    "max_keepalive_connections": 10,  # 保持 keep-alive 的空闲连接数
+    "keepalive_expiry": 60,           # 空闲连接保留秒数
+    "connect_timeout": 3,
+    "read_timeout": 10,
+    "write_timeout": 10,
+    "pool_timeout": 5,                # 等待连接池空闲连接的秒数
+    "auth_timeout": 5,                # 获取 tenant_access_token 的整体超时
+    "http2": True,                    # 安装了 h2 时启用 HTTP/2
+}
+
+# 飞书的限流错误码：99991400 为应用级接口频率限制，230020 为群组内消息发送频率限制
+RATE_LIMIT_CODES = {99991400, 230020}
+APP_LEVEL_RATE_LIMIT_CODES = {99991400}
+
+
+class FeishuAPIError(Exception):
+    """调用飞书开放接口时的网络错误或非 JSON 响应"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FeishuRateLimited(FeishuAPIError):
+    """飞书返回限流 (HTTP 429 或限流错误码)；retry_after 为飞书给出的重置秒数，未给出时为 None"""
+
+    def __init__(self, message, status_code=None, code=None, retry_after=None):
+        super().__init__(message, status_code)
+        self.code = code
+        self.retry_after = retry_after
+
+    @property
+    def app_level(self):
+        return self.code in APP_LEVEL_RATE_LIMIT_CODES
+
+
+class FeishuCircuitOpen(FeishuAPIError):
+    """熔断器断开期间的调用直接失败，不发出请求；retry_after 为距离下一次试探的秒数"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(headers):
+    """从飞书网关的 x-ogw-ratelimit-reset 或标准 Retry-After 头中读取需要等待的秒数"""
+    for name in ("x-ogw-ratelimit-reset", "retry-after"):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                continue
+    return None
+
+
+class FeishuClient:
+    """共享 keep-alive 连接池的异步飞书客户端，所有出站请求都经由它发出。
+
+    传入 breaker（circuit_breaker.CircuitBreaker）时，网络错误、超时与 HTTP 5xx 计入熔断统计，
+    熔断期间的请求直接抛出 FeishuCircuitOpen。
+    """
+
+    def __init__(self, options=None, breaker=None):
+        self.options = dict(DEFAULT_HTTP_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.breaker = breaker
+        self._client = None
+
+    @property
+    def base_url(self):
+        return (os.environ.get("FEISHU_API_BASE") or self.options["base_url"]).rstrip("/")
+
+    @property
+    def http2_enabled(self):
+        return bool(self.options["http2"]) and importlib.util.find_spec("h2") is not None
+
+    def _build_client(self):
+        # httpx 的导入较慢，推迟到第一次创建连接池时（服务启动后的预热阶段）
+        import httpx
+
+        opts = self.options
+        limits = httpx.Limits(
+            max_connections=opts["max_connections"],
+            max_keepalive_connections=opts["max_keepalive_connections"],
+            keepalive_expiry=opts["keepalive_expiry"],
+        )
+        timeout = httpx.Timeout(
+            connect=opts["connect_timeout"],
+            read=opts["read_timeout"],
+            write=opts["write_timeout"],
+            pool=opts["pool_timeout"],
+        )
+        client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=limits,
+            timeout=timeout,
+            http2=self.http2_enabled,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        )
+        logger.info(
+            f"飞书 HTTP 客户端已创建: base_url={self.base_url}, max_connections={opts['max_connections']}, "
+            f"keepalive={opts['max_keepalive_connections']}, http2={self.http2_enabled}"
+        )
+        return client
+
+    @property
+    def client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("飞书 HTTP 客户端连接池已关闭")
+        self._client = None
+
+    async def request(self, method, path, json_body=None, access_token=None, params=None, timeout=None):
+        """发出请求并返回解析后的 JSON；网络错误或响应不是 JSON 时抛出 FeishuAPIError，被限流时抛出 FeishuRateLimited。
+
+        json_body 在这里一次性编码为紧凑的 UTF-8 字节串（不做 \\uXXXX 转义），也可以直接传入已编码的 bytes。
+        """
+        import httpx
+
+        headers = {}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        kwargs = {}
+        if json_body is not None:
+            kwargs["content"] = json_body if isinstance(json_body, bytes) else dumps(json_body)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        breaker = self.breaker
+        permit = breaker.allow() if breaker is not None else None
+        if breaker is not None and permit is None:
+            raise FeishuCircuitOpen(f"飞书接口熔断中，跳过请求 {path}", retry_after=breaker.retry_after())
+        success = None
+        started = time.monotonic()
+        try:
+            response = await self.client.request(
+                method, path, params=params, headers=headers, **kwargs
+            )
+            success = response.status_code < 500
+        except httpx.HTTPError as e:
+            success = False
+            raise FeishuAPIError(f"请求飞书接口 {path} 时发生网络错误: {e!r}") from e
+        finally:
+            if breaker is not None:
+                breaker.record(permit, success, time.monotonic() - started)
+
+        # 飞书在 4xx/5xx 时通常仍返回带 code/msg 的 JSON，优先交给调用方判断 code
+        try:
+            data = response.json()
+        except ValueError:
+            if response.status_code == 429:
+                raise FeishuRateLimited(
+                    f"飞书接口 {path} 限流: HTTP 429",
+                    status_code=429,
+                    retry_after=_parse_retry_after(response.headers),
+                )
+            raise FeishuAPIError(
+                f"飞书接口 {path} 返回了非 JSON 响应: HTTP {response.status_code}",
+                status_code=response.status_code,
+            )
+        if not isinstance(data, dict):
+            raise FeishuAPIError(
+                f"飞书接口 {path} 返回了意外的响应格式: HTTP {response.status_code}",
+                status_code=response.status_code,
+            )
+        if response.status_code == 429 or data.get("code") in RATE_LIMIT_CODES:
+            raise FeishuRateLimited(
+                f"飞书接口 {path} 限流: {data.get('msg')}, code: {data.get('code')}",
+                status_code=response.status_code,
+                code=data.get("code"),
+                retry_after=_parse_retry_after(response.headers),
+            )
+        return data
+
+    async def fetch_tenant_access_token(self, app_id, app_secret):
+        """请求 /auth/v3/tenant_access_token/internal，返回原始响应"""
+        return await self.request(
+            "POST",
+            "/auth/v3/tenant_access_token/internal",
+            json_body={"app_id": app_id, "app_secret": app_secret},
+            timeout=self.options["auth_timeout"],
+        )
+
+    async def send_message(self, access_token, receive_id, msg_type, content, receive_id_type="chat_id"):
+        """调用 /im/v1/messages 发送消息，content 为已序列化的 JSON 字符串"""
+        return await self.request(
+            "POST",
+            "/im/v1/messages",
+            json_body={"receive_id": receive_id, "msg_type": msg_type, "content": content},
+            access_token=access_token,
+            params={"receive_id_type": receive_id_type},
+        )
+
+    async def update_message(self, access_token, message_id, content):
+        """调用 PATCH /im/v1/messages/{message_id} 更新已发送的共享卡片（卡片需设置 update_multi）"""
+        return await self.request(
+            "PATCH",
+            f"/im/v1/messages/{message_id}",
+            json_body={"content": content},
+            access_token=access_token,
+        )
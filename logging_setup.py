@@ -0,0 +1,192 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+# 日志默认配置，可通过 feishu_config.json 的 "logging" 覆盖
+DEFAULT_LOGGING_OPTIONS = {
+    "level": "INFO",
+    "format": "text",             # text 为原来的单行文本，json 为每行一个 JSON 对象
+    "dir": "logs",
+    "filename": "github_webhook.log",
+    "backup_count": 30,           # 按天轮转，保留的天数
+    "console": True,
+    "queue_size": 10000,          # 后台写日志线程的队列上限，写满时丢弃新日志而不是阻塞请求
+    "max_payload_chars": 500,     # 日志中卡片、响应等负载摘录的最大字符数
+    "sample_rates": {             # 高频日志的采样率（只对 INFO 及以下生效），1 表示全部记录
+        "feishu.request": 0.1,
+        "route": 0.1,
+    },
+}
+
+_TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_options = dict(DEFAULT_LOGGING_OPTIONS)
+_listener = None
+_queue_handler = None
+
+
+def excerpt(value, limit=None):
+    """把负载截断为日志摘录，超出部分只记录总长度"""
+    if limit is None:
+        limit = _options["max_payload_chars"]
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(共 {len(text)} 字符)"
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON；extra={"fields": {...}} 中的字段会合并到对象中"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按 extra={"sample": key} 对高频日志采样：采样率为 r 时每 round(1/r) 条记录一条；WARNING 及以上不采样"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self._every = {}
+        for key, rate in (rates or {}).items():
+            self._every[key] = 0 if rate <= 0 else max(1, round(1 / rate))
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.sampled_out = 0
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        every = self._every.get(key)
+        if every is None or every == 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if every and count % every == 0:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列已满时丢弃日志并计数，记录日志永远不会阻塞事件循环"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_handlers(options):
+    formatter = JsonFormatter() if options["format"] == "json" else logging.Formatter(_TEXT_FORMAT)
+    handlers = []
+    if options["console"]:
+        handlers.append(logging.StreamHandler())
+    log_dir = options["dir"]
+    if log_dir:
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                filename=os.path.join(log_dir, options["filename"]),
+                when="midnight",
+                interval=1,
+                backupCount=options["backup_count"],
+                encoding="utf-8",
+            )
+            file_handler.suffix = "%Y-%m-%d"
+            handlers.append(file_handler)
+        except OSError:
+            # 日志目录不可写时只输出到控制台
+            pass
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging(options=None):
+    """配置根日志器：请求处理中只把日志放进队列，由后台线程格式化并写入控制台和按天轮转的文件。
+
+    可以重复调用（例如加载配置文件之后），旧的后台线程会先把队列中的日志写完再退出。
+    """
+    global _options, _listener, _queue_handler
+    new_options = dict(DEFAULT_LOGGING_OPTIONS)
+    if options:
+        new_options.update(options)
+
+    stop_logging()
+    _options = new_options
+    log_queue = queue.Queue(maxsize=max(0, new_options["queue_size"]))
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(new_options["sample_rates"]))
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_build_handlers(new_options), respect_handler_level=True
+    )
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(_queue_handler)
+    set_log_level(new_options["level"])
+
+
+def stop_logging():
+    """停止后台写日志线程，队列中剩余的日志会先写完"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def set_log_level(level):
+    """运行时调整根日志器的级别，返回调整后的级别名称；级别无效时抛出 ValueError"""
+    if isinstance(level, str):
+        level_value = logging.getLevelName(level.upper())
+        if not isinstance(level_value, int):
+            raise ValueError(f"无效的日志级别: {level}")
+    else:
+        level_value = int(level)
+    logging.getLogger().setLevel(level_value)
+    return logging.getLevelName(level_value)
+
+
+def get_log_level():
+    return logging.getLevelName(logging.getLogger().getEffectiveLevel())
+
+
+def stats():
+    sampling = next((f for f in _queue_handler.filters if isinstance(f, SamplingFilter)), None) if _queue_handler else None
+    return {
+        "level": get_log_level(),
+        "format": _options["format"],
+        "queue_depth": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "sampled_out": sampling.sampled_out if sampling else 0,
+    }
+
+
+atexit.register(stop_logging)
@@ -1,79 +1,117 @@
-import uvicorn
-from fastapi import FastAPI, Request, HTTPException
-import requests
+from contextlib import asynccontextmanager
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import asyncio
+import hmac
 import json
 import os
 import time
 
-# 创建 logs 目录
-logs_dir = "logs"
-if not os.path.exists(logs_dir):
-    try:
-        os.makedirs(logs_dir)
-    except PermissionError:
-        pass
-
-# 配置日志
+from feishu_client import FeishuAPIError, FeishuCircuitOpen, FeishuRateLimited
+from feishu_apps import FeishuAppRegistry
+from admission import AdmissionController, AdmissionRejected
+from delivery import DeliveryPipeline, DeliveryError
+from outbox import Outbox
+from state_backend import DEFAULT_STATE_BACKEND_OPTIONS, create_state_backend
+from coalesce import PushCoalescer
+from dedup import DedupIndex
+from commit_classifier import CommitClassifier
+from card_renderer import CardRenderer
+from event_handlers import create_default_registry, peek_action
+from payload_parser import PayloadError, PayloadParser, PayloadTooLarge
+from message_index import MessageIndex
+from routing import ProjectRouter
+from config_store import ConfigStore
+import logging_setup
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, InFlightMiddleware, MetricsRegistry
+from signature import (GitHubSignatureVerifier, FeishuDecryptError, decrypt_feishu_event,
+                       verify_feishu_signature, verify_feishu_token)
+
+# 导入本模块不读取配置、不创建日志目录，也不导入 FastAPI/uvicorn/httpx；这些都推迟到 create_app() 与应用启动时
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# 清除默认的 handler
-logger.handlers.clear()
-
-# 创建格式器
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-# 控制台输出
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(formatter)
-
-# 文件输出 - 按天轮转
-file_handler = TimedRotatingFileHandler(
-    filename=os.path.join(logs_dir, 'github_webhook.log'),
-    when='midnight',
-    interval=1,
-    backupCount=30,
-    encoding='utf-8'
-)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-file_handler.suffix = "%Y-%m-%d"
-
-# 添加处理器到日志器
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
-
-# 设置根日志器，避免重复日志
-logging.getLogger().handlers.clear()
-logging.getLogger().addHandler(console_handler)
-logging.getLogger().addHandler(file_handler)
-logging.getLogger().setLevel(logging.INFO)
-
-logger.info("日志系统初始化完成，日志将保存到 logs/ 目录")
 
 # 应用配置变量 - 将从 feishu_config.json 加载
 FEISHU_APP_ID = None
 FEISHU_APP_SECRET = None
 FEISHU_CHAT_ID = None # 这是实际操作中使用的 current_chat_id
 PROJECT_CHAT_MAPPING = None
+FEISHU_HTTP_OPTIONS = {} # 飞书 HTTP 连接池与超时配置，见 feishu_client.DEFAULT_HTTP_OPTIONS
+DELIVERY_OPTIONS = {} # 后台投递管道配置，见 delivery.DEFAULT_DELIVERY_OPTIONS
+OUTBOX_OPTIONS = {} # 持久化发件箱配置，见 outbox.DEFAULT_OUTBOX_OPTIONS
+TOKEN_OPTIONS = {} # tenant_access_token 续期配置，见 token_manager.DEFAULT_TOKEN_OPTIONS
+STATE_BACKEND_OPTIONS = {} # token 与当前群组等共享状态的存储后端，见 state_backend.DEFAULT_STATE_BACKEND_OPTIONS
+SERVER_OPTIONS = {} # uvicorn 监听地址、端口与 worker 进程数
+RATE_LIMIT_OPTIONS = {} # 按群组/应用的发送限流配置，见 rate_limiter.DEFAULT_RATE_LIMIT_OPTIONS
+DEDUP_OPTIONS = {} # 重复投递去重配置，见 dedup.DEFAULT_DEDUP_OPTIONS
+GITHUB_WEBHOOK_SECRETS = {} # GitHub Webhook 密钥，{"owner/repo": secret, "default": secret}
+FEISHU_ENCRYPT_KEY = None # 飞书事件订阅的 Encrypt Key
+FEISHU_VERIFICATION_TOKEN = None # 飞书事件订阅的 Verification Token
+COMMIT_TYPES = {} # 自定义提交类型，{"hotfix": {"icon": "🚑", "label": "热修复"}}
+MESSAGE_INDEX_OPTIONS = {} # CI 状态卡片原地更新的索引配置，见 message_index.DEFAULT_MESSAGE_INDEX_OPTIONS
+CONFIG_STORE_OPTIONS = {} # 配置文件写回与热加载配置，见 config_store.DEFAULT_CONFIG_STORE_OPTIONS
+LOGGING_OPTIONS = {} # 日志级别、格式与采样配置，见 logging_setup.DEFAULT_LOGGING_OPTIONS
+METRICS_OPTIONS = {} # /metrics 指标配置，见 metrics.DEFAULT_METRICS_OPTIONS
+CIRCUIT_BREAKER_OPTIONS = {} # 飞书接口熔断配置，见 circuit_breaker.DEFAULT_CIRCUIT_BREAKER_OPTIONS
+PAYLOAD_OPTIONS = {} # 请求体大小上限与解析器配置，见 payload_parser.DEFAULT_PAYLOAD_OPTIONS
+ADMISSION_OPTIONS = {} # 同时处理的请求数与待投递任务数上限，见 admission.DEFAULT_ADMISSION_OPTIONS
+FEISHU_APPS_OPTIONS = {} # 默认应用之外的飞书应用，{"应用名": {"app_id": ..., "app_secret": ...}}，见 feishu_apps.FeishuAppRegistry
+DEFAULT_CHAT_ID = None # 机器人被移出当前群组时回退到的群组
 # DEFAULT_FEISHU_CHAT_ID 将从配置文件读取，不再硬编码
 
 APP_CONFIG_FILE = "feishu_config.json" # 统一的配置文件
-
-def load_app_config():
-    global FEISHU_APP_ID, FEISHU_APP_SECRET, FEISHU_CHAT_ID, PROJECT_CHAT_MAPPING
+CONFIG_SUCCESSFULLY_LOADED = False
+
+# 配置文件的内存副本：请求处理只读内存，修改在后台原子地写回，文件被修改后自动热加载
+config_store = None
+
+# 以下组件由 create_app() 按配置创建；state_backend 与各飞书应用的 token 管理在应用启动时创建
+metrics = None
+github_events_total = stage_seconds = feishu_messages_total = feishu_errors_total = http_in_flight = None
+commit_classifier = None
+state_backend = None
+project_router = None
+github_signature_verifier = None
+dedup_index = None
+feishu_apps = None
+admission = None
+payload_parser = None
+card_renderer = None
+event_registry = None
+message_index = None
+outbox = None
+delivery_pipeline = None
+push_coalescer = None
+
+# 启动各阶段耗时（秒）：create_app 创建应用、startup 启动后台组件、warmup 预热
+STARTUP_TIMINGS = {}
+
+def _parse_webhook_secrets(value):
+    """github_webhook_secrets 可以是 {"owner/repo": secret, "default": secret}，也可以是所有仓库共用的字符串"""
+    if isinstance(value, str):
+        return {"default": value}
+    return value or {}
+
+def load_app_config(config=None):
+    """加载配置：config 为配置字典或配置文件路径，默认读取 feishu_config.json。
+
+    缺少的 feishu_chat_id / project_chat_mapping 以 default_chat_id 补全，补全的内容在应用启动后才写回文件。
+    """
+    global FEISHU_APP_ID, FEISHU_APP_SECRET, FEISHU_CHAT_ID, PROJECT_CHAT_MAPPING, FEISHU_HTTP_OPTIONS, DELIVERY_OPTIONS, OUTBOX_OPTIONS, TOKEN_OPTIONS, STATE_BACKEND_OPTIONS, SERVER_OPTIONS, RATE_LIMIT_OPTIONS, DEDUP_OPTIONS
+    global GITHUB_WEBHOOK_SECRETS, FEISHU_ENCRYPT_KEY, FEISHU_VERIFICATION_TOKEN, COMMIT_TYPES, MESSAGE_INDEX_OPTIONS
+    global CONFIG_STORE_OPTIONS, DEFAULT_CHAT_ID, LOGGING_OPTIONS, METRICS_OPTIONS, CIRCUIT_BREAKER_OPTIONS
+    global PAYLOAD_OPTIONS, ADMISSION_OPTIONS, FEISHU_APPS_OPTIONS, config_store
     config_loaded_successfully = False
     required_keys = ["feishu_app_id", "feishu_app_secret", "default_chat_id"]
     default_chat_id_from_config = None
 
-    if os.path.exists(APP_CONFIG_FILE):
+    # 直接传入配置字典时只保存在内存中，不写回任何文件
+    config_store = ConfigStore(None if isinstance(config, dict) else (config or APP_CONFIG_FILE))
+    if config_store.path is None or os.path.exists(config_store.path):
         try:
-            with open(APP_CONFIG_FILE, 'r') as f:
-                config_data = json.load(f)
-            
+            config_data = config_store.load(config if isinstance(config, dict) else None)
+
             missing_keys = [key for key in required_keys if not config_data.get(key)]
             if missing_keys:
                 logger.error(f"{APP_CONFIG_FILE} is missing required keys: {', '.join(missing_keys)}. Please check the file content.")
@@ -82,8 +120,30 @@ def load_app_config():
             FEISHU_APP_ID = config_data.get("feishu_app_id")
             FEISHU_APP_SECRET = config_data.get("feishu_app_secret")
             default_chat_id_from_config = config_data.get("default_chat_id")
+            DEFAULT_CHAT_ID = default_chat_id_from_config
             current_chat_id_from_file = config_data.get("feishu_chat_id")
             project_chat_mapping_from_file = config_data.get("project_chat_mapping")
+            FEISHU_HTTP_OPTIONS = config_data.get("feishu_http") or {}
+            DELIVERY_OPTIONS = config_data.get("delivery") or {}
+            OUTBOX_OPTIONS = config_data.get("outbox") or {}
+            TOKEN_OPTIONS = config_data.get("token") or {}
+            STATE_BACKEND_OPTIONS = config_data.get("state_backend") or {}
+            SERVER_OPTIONS = config_data.get("server") or {}
+            RATE_LIMIT_OPTIONS = config_data.get("rate_limit") or {}
+            DEDUP_OPTIONS = config_data.get("dedup") or {}
+            GITHUB_WEBHOOK_SECRETS = _parse_webhook_secrets(config_data.get("github_webhook_secrets"))
+            FEISHU_ENCRYPT_KEY = config_data.get("feishu_encrypt_key")
+            FEISHU_VERIFICATION_TOKEN = config_data.get("feishu_verification_token")
+            COMMIT_TYPES = config_data.get("commit_types") or {}
+            MESSAGE_INDEX_OPTIONS = config_data.get("message_index") or {}
+            CONFIG_STORE_OPTIONS = config_data.get("config_store") or {}
+            LOGGING_OPTIONS = config_data.get("logging") or {}
+            METRICS_OPTIONS = config_data.get("metrics") or {}
+            CIRCUIT_BREAKER_OPTIONS = config_data.get("circuit_breaker") or {}
+            PAYLOAD_OPTIONS = config_data.get("payload") or {}
+            ADMISSION_OPTIONS = config_data.get("admission") or {}
+            FEISHU_APPS_OPTIONS = config_data.get("feishu_apps") or {}
+            config_store.options.update(CONFIG_STORE_OPTIONS)
 
             if current_chat_id_from_file:
                 FEISHU_CHAT_ID = current_chat_id_from_file
@@ -91,13 +151,8 @@ def load_app_config():
             elif default_chat_id_from_config:
                 FEISHU_CHAT_ID = default_chat_id_from_config
                 logger.info(f"feishu_chat_id not found in {APP_CONFIG_FILE}. Using default_chat_id: {FEISHU_CHAT_ID}. Saving it as feishu_chat_id.")
-                config_data["feishu_chat_id"] = default_chat_id_from_config
-                try:
-                    with open(APP_CONFIG_FILE, 'w') as f_write:
-                        json.dump(config_data, f_write, indent=2)
-                    logger.info(f"Updated {APP_CONFIG_FILE} with feishu_chat_id set to default_chat_id.")
-                except IOError as e_write:
-                    logger.error(f"Error writing updated config to {APP_CONFIG_FILE}: {e_write}")
+                config_store.update({"feishu_chat_id": default_chat_id_from_config})
+                logger.info(f"Updated {APP_CONFIG_FILE} with feishu_chat_id set to default_chat_id.")
             else:
                 logger.error(f"default_chat_id is also missing. Cannot determine chat_id.")
                 return False
@@ -107,174 +162,188 @@ def load_app_config():
                 logger.info(f"Loaded project_chat_mapping from {APP_CONFIG_FILE}: {PROJECT_CHAT_MAPPING}")
             else:
                 logger.info(f"project_chat_mapping not found in {APP_CONFIG_FILE}. Using default_chat_id as project_chat_mapping.")
-                config_data["project_chat_mapping"] = default_chat_id_from_config
-                try:
-                    with open(APP_CONFIG_FILE, 'w') as f_write:
-                        json.dump(config_data, f_write, indent=2)
-                    logger.info(f"Updated {APP_CONFIG_FILE} with project_chat_mapping set to default_chat_id.")
-                except IOError as e_write:
-                    logger.error(f"Error writing updated config to {APP_CONFIG_FILE}: {e_write}")
+                config_store.update({"project_chat_mapping": default_chat_id_from_config})
+                logger.info(f"Updated {APP_CONFIG_FILE} with project_chat_mapping set to default_chat_id.")
 
             logger.info(f"Successfully loaded App ID, App Secret, and Chat ID from {APP_CONFIG_FILE}.")
             config_loaded_successfully = True
             
-        except (json.JSONDecodeError, IOError) as e:
+        except (ValueError, IOError) as e:
             logger.error(f"Error loading {APP_CONFIG_FILE}: {e}. Please ensure it is valid JSON and contains required keys.")
     else:
-        logger.error(f"{APP_CONFIG_FILE} not found. Please create it with feishu_app_id, feishu_app_secret, default_chat_id, and optionally feishu_chat_id.")
+        logger.error(f"{config_store.path} not found. Please create it with feishu_app_id, feishu_app_secret, default_chat_id, and optionally feishu_chat_id.")
     
     return config_loaded_successfully
 
 def save_current_chat_id_to_config(new_chat_id):
+    """切换当前群组：内存与共享状态后端立即生效，配置文件由配置存储在后台合并写回"""
     global FEISHU_CHAT_ID
-    current_config = {}
-    if os.path.exists(APP_CONFIG_FILE):
-        try:
-            with open(APP_CONFIG_FILE, 'r') as f_read:
-                current_config = json.load(f_read)
-        except (json.JSONDecodeError, IOError) as e_read:
-            logger.error(f"Error reading {APP_CONFIG_FILE} before saving new chat_id: {e_read}. Proceeding with new data.")
-            current_config["feishu_app_id"] = FEISHU_APP_ID
-            current_config["feishu_app_secret"] = FEISHU_APP_SECRET
-    
-    current_config["feishu_chat_id"] = new_chat_id
-    if "feishu_app_id" not in current_config and FEISHU_APP_ID: current_config["feishu_app_id"] = FEISHU_APP_ID
-    if "feishu_app_secret" not in current_config and FEISHU_APP_SECRET: current_config["feishu_app_secret"] = FEISHU_APP_SECRET
-    if "default_chat_id" not in current_config and current_config.get("default_chat_id"):
-        pass
-    elif "default_chat_id" not in current_config:
-        pass
+    FEISHU_CHAT_ID = new_chat_id
+    # 同步到共享状态后端（后台写入，不阻塞事件循环），其他 worker 进程随后看到新的群组
+    state_backend.set_nowait("feishu_chat_id", new_chat_id)
+    config_store.update({"feishu_chat_id": new_chat_id})
+    logger.info(f"Saved new feishu_chat_id to {APP_CONFIG_FILE}: {FEISHU_CHAT_ID}")
 
-    try:
-        with open(APP_CONFIG_FILE, 'w') as f_write:
-            json.dump(current_config, f_write, indent=2)
-        FEISHU_CHAT_ID = new_chat_id
-        logger.info(f"Saved new feishu_chat_id to {APP_CONFIG_FILE}: {FEISHU_CHAT_ID}")
-    except IOError as e_write:
-        logger.error(f"Error saving new feishu_chat_id to {APP_CONFIG_FILE}: {e_write}")
+def get_current_chat_id():
+    """返回当前生效的 feishu_chat_id，多 worker 部署时以共享状态后端中的值为准"""
+    return state_backend.get("feishu_chat_id", FEISHU_CHAT_ID)
 
-# Load all app configurations at startup
-CONFIG_SUCCESSFULLY_LOADED = load_app_config()
+def observe_stage(stage, started):
+    stage_seconds.observe(stage, value=time.perf_counter() - started)
+
+def count_github_event(event_type, repo_name, outcome):
+    github_events_total.inc(event_type or "", repo_name or "", outcome)
 
 def format_commit_message(commit):
     """格式化提交信息，添加图标和样式"""
-    import re
-
-    message = commit.get("message", "无提交信息").split('\n')[0]
-    author = commit.get("author", {}).get("name", "未知作者")
-
-    # 为提交者添加@符号并加粗
-    author_display = f"**@{author}**" if author != "未知作者" else author
-
-    # 使用正则表达式匹配提交类型，包括带括号的格式
-    commit_type_match = re.match(r'^(\w+)(\([^)]*\))?:\s', message.lower())
-
-    if commit_type_match:
-        commit_type = commit_type_match.group(1)
-
-        # 根据提交类型添加图标
-        if commit_type == 'feat':
-            icon = "✨"
-            type_label = "特性"
-        elif commit_type == 'fix':
-            icon = "🐛"
-            type_label = "修复"
-        elif commit_type == 'docs':
-            icon = "📚"
-            type_label = "文档"
-        elif commit_type == 'style':
-            icon = "💅"
-            type_label = "样式"
-        elif commit_type == 'refactor':
-            icon = "♻️"
-            type_label = "重构"
-        elif commit_type == 'test':
-            icon = "🧪"
-            type_label = "测试"
-        elif commit_type == 'chore':
-            icon = "🔧"
-            type_label = "杂项"
-        elif commit_type == 'perf':
-            icon = "⚡"
-            type_label = "性能"
-        elif commit_type == 'ci':
-            icon = "🚀"
-            type_label = "CI"
-        elif commit_type == 'build':
-            icon = "📦"
-            type_label = "构建"
-        elif commit_type == 'revert':
-            icon = "⏪"
-            type_label = "回滚"
-        else:
-            icon = "📝"
-            type_label = "其他"
-    elif message.lower().startswith('merge'):
-        icon = "🔀"
-        type_label = "合并"
-    else:
-        icon = "📝"
-        type_label = "其他"
+    return commit_classifier.format(commit)
 
-    return f"{icon} **{type_label}** {message}", author_display
+def route_event(repo_full_name, event_type=None, branch=None):
+    """根据路由规则返回 (命中的规则, 目标群组ID列表)。
 
-def get_chat_id_for_project(repo_full_name):
-    """根据项目名称获取对应的群组ID"""
-    if not PROJECT_CHAT_MAPPING:
+    没有配置映射或没有规则匹配该仓库时使用系统默认群组；规则匹配但被分支/事件过滤掉时返回空列表。
+    """
+    if project_router.empty:
         logger.warning("项目群组映射未配置，使用默认群组")
-        return FEISHU_CHAT_ID
-    
-    chat_id = PROJECT_CHAT_MAPPING.get(repo_full_name)
-    if chat_id:
-        logger.info(f"项目 {repo_full_name} 使用专用群组: {chat_id}")
-        return chat_id
-    
-    default_chat_id = PROJECT_CHAT_MAPPING.get("default")
-    if default_chat_id:
-        logger.info(f"项目 {repo_full_name} 使用默认群组: {default_chat_id}")
-        return default_chat_id
-    
+        return None, [get_current_chat_id()]
+
+    result = project_router.route(repo_full_name, event_type, branch)
+    if result.rule is not None:
+        logger.info(
+            f"项目 {repo_full_name} 命中路由规则 {result.rule.pattern}: {', '.join(result.rule.chat_ids) or '不通知'}",
+            extra={"sample": "route", "fields": {"repo": repo_full_name, "rule": result.rule.pattern}},
+        )
+        return result.rule, result.rule.chat_ids
+    if result.skipped:
+        logger.info(f"项目 {repo_full_name} 的 {event_type} 事件 (分支 {branch}) 被路由规则过滤")
+        return None, []
+
     logger.warning(f"项目 {repo_full_name} 未找到配置的群组，使用系统默认群组")
-    return FEISHU_CHAT_ID
-
-# 缓存 tenant_access_token 及其过期时间
-tenant_access_token_cache = {
-    "token": None,
-    "expires_at": 0
-}
-
-app = FastAPI()
-
-async def get_tenant_access_token():
-    """获取或刷新 tenant_access_token"""
-    current_time = time.time()
-    if tenant_access_token_cache["token"] and tenant_access_token_cache["expires_at"] > current_time:
-        return tenant_access_token_cache["token"]
-
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-    headers = {"Content-Type": "application/json; charset=utf-8"}
-    payload = {
-        "app_id": FEISHU_APP_ID,
-        "app_secret": FEISHU_APP_SECRET
-    }
+    return None, [get_current_chat_id()]
+
+def apply_reloaded_config(config_data):
+    """配置文件被修改后热加载：路由规则、当前/默认群组、提交类型、签名密钥与 Verification Token 立即生效，
+    App ID/Secret 以及连接池、队列等其余配置需要重启服务"""
+    global PROJECT_CHAT_MAPPING, DEFAULT_CHAT_ID, FEISHU_CHAT_ID, COMMIT_TYPES, GITHUB_WEBHOOK_SECRETS
+    global FEISHU_ENCRYPT_KEY, FEISHU_VERIFICATION_TOKEN, project_router, commit_classifier, github_signature_verifier
+    PROJECT_CHAT_MAPPING = config_data.get("project_chat_mapping")
+    project_router = ProjectRouter(PROJECT_CHAT_MAPPING)
+    DEFAULT_CHAT_ID = config_data.get("default_chat_id") or DEFAULT_CHAT_ID
+    new_chat_id = config_data.get("feishu_chat_id")
+    if new_chat_id and new_chat_id != FEISHU_CHAT_ID:
+        FEISHU_CHAT_ID = new_chat_id
+        state_backend.set_nowait("feishu_chat_id", new_chat_id)
+    COMMIT_TYPES = config_data.get("commit_types") or {}
+    commit_classifier = CommitClassifier(COMMIT_TYPES)
+    card_renderer.classifier = commit_classifier
+    GITHUB_WEBHOOK_SECRETS = _parse_webhook_secrets(config_data.get("github_webhook_secrets"))
+    github_signature_verifier = GitHubSignatureVerifier(GITHUB_WEBHOOK_SECRETS)
+    FEISHU_ENCRYPT_KEY = config_data.get("feishu_encrypt_key")
+    FEISHU_VERIFICATION_TOKEN = config_data.get("feishu_verification_token")
+    log_level = (config_data.get("logging") or {}).get("level")
+    if log_level:
+        try:
+            logging_setup.set_log_level(log_level)
+        except ValueError as e:
+            logger.error(str(e))
+    logger.info(f"已热加载配置: 路由规则 {project_router.stats()}，当前群组 {FEISHU_CHAT_ID}")
+
+def get_feishu_client(app_name=None):
+    """返回飞书应用（默认为 feishu_app_id 对应的应用）的客户端，每个应用有自己的连接池"""
+    return feishu_apps.get(app_name).client
+
+async def warm_up_feishu_client():
+    """为每个飞书应用创建连接池（httpx 在此时才导入）"""
+    for app in feishu_apps:
+        app.client.client
+
+async def warm_up_token():
+    """并发预取各应用的 tenant_access_token，同时建立到飞书的第一条 keep-alive 连接"""
+    tokens = await asyncio.gather(*(app.token_manager.get_token() for app in feishu_apps))
+    for app, token in zip(feishu_apps, tokens):
+        if not token:
+            logger.warning(f"预热时未能获取飞书应用 {app.name} 的 tenant_access_token，将在首次发送消息时重试")
+
+# 应用启动后、开始接收请求前依次执行的预热钩子（无参数的协程函数），可通过 add_warmup_hook() 追加
+WARMUP_HOOKS = [warm_up_feishu_client, warm_up_token]
+
+def add_warmup_hook(hook):
+    """追加一个预热钩子，可作为装饰器使用"""
+    WARMUP_HOOKS.append(hook)
+    return hook
+
+async def _run_warmup_hooks():
+    for hook in WARMUP_HOOKS:
+        started = time.perf_counter()
+        try:
+            await hook()
+        except Exception as e:
+            logger.error(f"预热钩子 {hook.__name__} 失败: {e}", exc_info=True)
+        STARTUP_TIMINGS[f"warmup.{hook.__name__}"] = round(time.perf_counter() - started, 4)
+
+async def run_warmup_hooks():
+    """执行预热钩子，总耗时不超过 server.warmup_timeout 秒（为 0 时跳过）；预热失败不影响服务启动"""
+    timeout = SERVER_OPTIONS.get("warmup_timeout", 10)
+    if not timeout:
+        return
+    started = time.perf_counter()
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("code") == 0:
-            tenant_access_token_cache["token"] = data["tenant_access_token"]
-            tenant_access_token_cache["expires_at"] = current_time + data.get("expire", 7200) - 300
-            logger.info("成功获取 tenant_access_token")
-            return data["tenant_access_token"]
-        else:
-            logger.error(f"获取 tenant_access_token 失败: {data.get('msg')}")
-            return None
-    except requests.RequestException as e:
-        logger.error(f"请求 tenant_access_token 时发生网络错误: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"获取 tenant_access_token 时发生未知错误: {e}")
-        return None
+        await asyncio.wait_for(_run_warmup_hooks(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"预热超过 {timeout} 秒，未完成的部分将在处理请求时进行")
+    STARTUP_TIMINGS["warmup"] = round(time.perf_counter() - started, 4)
+
+async def start_components(sending=True):
+    """打开日志、状态后端与后台组件并执行预热。
+
+    sending 为 False 时（重放存档的试运行）只打开路由与去重需要的部分：不写共享状态和配置文件，
+    不启动发件箱、投递管道与 token 续期，也不预热。
+    """
+    global state_backend
+    started = time.perf_counter()
+    # 配置日志：日志先进入队列，由后台线程写入控制台和按天轮转的文件
+    logging_setup.setup_logging(LOGGING_OPTIONS)
+    # 共享状态后端：单进程时为内存，多 worker 进程部署时使用共享 SQLite 文件
+    state_backend = create_state_backend(STATE_BACKEND_OPTIONS)
+    # 每个飞书应用的 tenant_access_token 管理：合并并发刷新，过期前在后台续期，多 worker 之间通过状态后端共享
+    feishu_apps.create_token_managers(state_backend)
+    if not sending:
+        await dedup_index.start()
+        return
+    # 以配置文件中的当前群组为准（群组变更时配置文件与状态后端会同时更新）
+    state_backend.set_nowait("feishu_chat_id", FEISHU_CHAT_ID)
+    await config_store.start()
+    await dedup_index.start()
+    await message_index.start()
+    await feishu_apps.start()
+    await outbox.start()
+    await delivery_pipeline.start()
+    STARTUP_TIMINGS["startup"] = round(time.perf_counter() - started, 4)
+    await run_warmup_hooks()
+    logger.info(f"服务已就绪，启动耗时（秒）: {STARTUP_TIMINGS}")
+
+async def stop_components(sending=True):
+    """先发出未结束的聚合窗口并清空投递队列，再把发件箱缓冲落盘，最后关闭连接池；sending 与启动时一致"""
+    push_coalescer.flush_all()
+    await delivery_pipeline.stop()
+    await outbox.stop()
+    await dedup_index.stop()
+    await message_index.stop()
+    if sending:
+        await config_store.stop()
+    await feishu_apps.stop()
+    # 等待后台线程把共享状态写完
+    await asyncio.to_thread(state_backend.close)
+
+@asynccontextmanager
+async def lifespan(app):
+    await start_components()
+    yield
+    await stop_components()
+
+async def get_tenant_access_token(app_name=None):
+    """获取飞书应用（默认为 feishu_app_id 对应的应用）的 tenant_access_token，缓存失效且刷新失败时返回 None"""
+    return await feishu_apps.get(app_name).token_manager.get_token()
 
 # async def list_bot_chats(): # <-- 函数 list_bot_chats 已注释掉
 #     logger.info(\"开始尝试获取机器人所在的群聊列表...\")
@@ -321,39 +390,104 @@ async def get_tenant_access_token():
 #     except Exception as e:
 #         logger.error(f\"处理群聊列表时发生未知错误: {e}\", exc_info=True)
 
-@app.post("/webhook/feishu_events")
+async def read_request_body(request):
+    """读取请求体，超过上限时返回 413；被拒绝的 GitHub 投递记录投递ID，可以调大上限后用 replay.py 补发"""
+    try:
+        return await payload_parser.read_body(request)
+    except PayloadTooLarge as e:
+        delivery_id = request.headers.get("X-GitHub-Delivery")
+        if delivery_id:
+            logger.error(
+                f"拒绝过大的GitHub投递 {delivery_id} ({request.headers.get('X-GitHub-Event')}): {e}，该投递的通知不会发送",
+                extra={"fields": {"delivery_id": delivery_id}},
+            )
+        else:
+            logger.warning(f"拒绝过大的请求 {request.url.path}: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+
+def feishu_event_secrets():
+    """事件订阅的 (Encrypt Key 列表, Verification Token 列表)：全局配置在前，其后是 feishu_apps 中各应用单独配置的"""
+    encrypt_keys = [key for key in [FEISHU_ENCRYPT_KEY, *feishu_apps.encrypt_keys()] if key]
+    verification_tokens = [token for token in [FEISHU_VERIFICATION_TOKEN, *feishu_apps.verification_tokens()] if token]
+    return encrypt_keys, verification_tokens
+
+def decrypt_feishu_event_with_keys(encrypted, encrypt_keys):
+    """依次尝试各应用的 Encrypt Key 解密事件"""
+    if not encrypt_keys:
+        raise FeishuDecryptError("Received an encrypted Feishu event but feishu_encrypt_key is not configured")
+    for encrypt_key in encrypt_keys:
+        try:
+            return json.loads(decrypt_feishu_event(encrypted, encrypt_key))
+        except (FeishuDecryptError, ValueError) as e:
+            error = e
+    raise FeishuDecryptError(str(error))
+
 async def feishu_events_receiver(request: Request):
     global FEISHU_CHAT_ID
+    raw_body = await read_request_body(request)
+    encrypt_keys, verification_tokens = feishu_event_secrets()
+
+    # Verify X-Lark-Signature on the raw body before decoding anything (only sent when an Encrypt Key is configured)
+    signature = request.headers.get("X-Lark-Signature")
+    signed = False
+    if encrypt_keys and signature:
+        timestamp = request.headers.get("X-Lark-Request-Timestamp")
+        nonce = request.headers.get("X-Lark-Request-Nonce")
+        signing_key = next((key for key in encrypt_keys
+                            if verify_feishu_signature(raw_body, timestamp, nonce, signature, key)), None)
+        if signing_key is None:
+            logger.warning("Rejected Feishu event with invalid X-Lark-Signature")
+            raise HTTPException(status_code=401, detail="Invalid signature")
+        # 签名已确定是哪个应用的 Encrypt Key，解密时只用它
+        encrypt_keys = [signing_key]
+        signed = True
+
     try:
-        payload = await request.json()
+        payload = json.loads(raw_body)
+        if "encrypt" in payload:
+            payload = decrypt_feishu_event_with_keys(payload["encrypt"], encrypt_keys)
         logger.info(f"Received Feishu event on /webhook/feishu_events: {payload.get('header', {}).get('event_type')}")
+    except FeishuDecryptError as e:
+        logger.error(f"Cannot decrypt Feishu event: {e}")
+        raise HTTPException(status_code=400, detail="Cannot decrypt event payload")
     except Exception as e:
         logger.error(f"Cannot parse JSON from Feishu event: {e}")
-        # Try to read body for challenge request even if JSON parsing fails initially for some reason
-        try:
-            raw_body = await request.body()
-            body_str = raw_body.decode()
-            logger.debug(f"Raw body for Feishu event: {body_str}")
-            if 'challenge' in body_str: # Simplified check for challenge
-                 payload_check = json.loads(body_str) # Attempt to parse again
-                 if payload_check.get("type") == "url_verification":
-                    logger.info("Received Feishu URL Verification (raw body parse)")
-                    return {"challenge": payload_check.get("challenge")}
-        except Exception as raw_e:
-            logger.error(f"Error processing raw body for Feishu event: {raw_e}")
+        logger.debug(f"Raw body for Feishu event: {raw_body[:1000]!r}")
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
+    # With an Encrypt Key configured, only the URL verification challenge may arrive unsigned
+    if encrypt_keys and not signed and payload.get("type") != "url_verification":
+        logger.warning("Rejected unsigned Feishu event")
+        raise HTTPException(status_code=401, detail="Missing signature")
+    if verification_tokens and not any(verify_feishu_token(payload, token) for token in verification_tokens):
+        logger.warning("Rejected Feishu event with invalid verification token")
+        raise HTTPException(status_code=401, detail="Invalid verification token")
+
     # Handle URL Verification Challenge
     if payload.get("type") == "url_verification":
         logger.info("Received Feishu URL Verification for /webhook/feishu_events")
         challenge = payload.get("challenge")
         return {"challenge": challenge}
 
-    # Handle Bot Added to Chat Event
+    # URL 校验之外的事件在服务饱和时直接拒绝，由飞书稍后重试
+    if admission.saturated:
+        rejection = admission.reject_saturated()
+        raise HTTPException(status_code=rejection.status_code, detail=str(rejection), headers=rejection.headers)
+
+    # Feishu retries callbacks that were not acknowledged in time; drop repeated event_ids (v2: header.event_id, v1: uuid)
     event_header = payload.get("header", {})
+    event_id = event_header.get("event_id") or payload.get("uuid")
+    if event_id and await dedup_index.check_and_mark(f"feishu:{event_id}"):
+        logger.info(f"Ignored duplicate Feishu event: {event_id}")
+        return {"status": "duplicate", "message": f"Event {event_id} already processed."}
+
+    # 群组ID加上收到事件的应用名（header.app_id），之后发往该群组的消息由同一个应用发送
+    event_app_id = event_header.get("app_id")
+
+    # Handle Bot Added to Chat Event
     if event_header.get("event_type") == "im.chat.member.bot.added_v1":
         event_data = payload.get("event", {})
-        event_chat_id = event_data.get("chat_id")
+        event_chat_id = feishu_apps.qualify(event_app_id, event_data.get("chat_id"))
         if event_chat_id:
             logger.info(f"Bot added to chat event received. New Chat ID: {event_chat_id}")
             save_current_chat_id_to_config(event_chat_id) # 使用新的保存函数
@@ -365,7 +499,7 @@ async def feishu_events_receiver(request: Request):
     # Handle Bot Removed from Chat Event
     elif event_header.get("event_type") == "im.chat.member.bot.deleted_v1":
         event_data = payload.get("event", {})
-        event_chat_id = event_data.get("chat_id")
+        event_chat_id = feishu_apps.qualify(event_app_id, event_data.get("chat_id"))
         
         logger.info(f"Bot removed from chat event received. Chat ID from event: {event_chat_id}")
 
@@ -374,18 +508,11 @@ async def feishu_events_receiver(request: Request):
             return {"status": "warning", "message": "Chat ID missing in removal event."}
 
         # Check if the bot was removed from the currently active chat
-        if event_chat_id == FEISHU_CHAT_ID:
-            logger.warning(f"Bot was removed from the currently active chat ({FEISHU_CHAT_ID}). Attempting to revert to default chat ID.")
+        current_chat_id = get_current_chat_id()
+        if event_chat_id == current_chat_id:
+            logger.warning(f"Bot was removed from the currently active chat ({current_chat_id}). Attempting to revert to default chat ID.")
             
-            default_chat_id = None
-            if os.path.exists(APP_CONFIG_FILE):
-                try:
-                    with open(APP_CONFIG_FILE, 'r') as f_read:
-                        current_config = json.load(f_read)
-                    default_chat_id = current_config.get("default_chat_id")
-                except (json.JSONDecodeError, IOError) as e_read:
-                    logger.error(f"Error reading {APP_CONFIG_FILE} to find default_chat_id: {e_read}")
-
+            default_chat_id = DEFAULT_CHAT_ID
             if default_chat_id:
                 logger.info(f"Found default_chat_id: {default_chat_id}. Reverting active chat ID.")
                 save_current_chat_id_to_config(default_chat_id)
@@ -394,239 +521,329 @@ async def feishu_events_receiver(request: Request):
                 logger.error("Could not find a default_chat_id to revert to. The active chat ID might now be invalid until a bot is added to a new chat.")
                 return {"status": "error", "message": "Bot removed from active chat, but no default_chat_id was found to revert to."}
         else:
-            logger.info(f"Bot was removed from chat {event_chat_id}, which is not the currently active chat ({FEISHU_CHAT_ID}). No configuration change needed.")
+            logger.info(f"Bot was removed from chat {event_chat_id}, which is not the currently active chat ({current_chat_id}). No configuration change needed.")
             return {"status": "success", "message": "Bot removed from an inactive chat."}
     
     logger.info(f"Ignored Feishu event type: {event_header.get('event_type')}")
     return {"status": "ignored", "message": "Event type not handled by this endpoint."}
 
-@app.post("/webhook/github")
+# 重试也不会成功的飞书错误码：参数错误、机器人不在群内、机器人能力未启用、卡片内容错误
+NON_RETRYABLE_FEISHU_CODES = {230001, 230002, 230006, 230099}
+
+async def call_feishu_with_rate_limit(target, call):
+    """用路由目标所属飞书应用的 token、限流配额与连接池调用飞书接口 call(client, access_token, chat_id)，
+    被限流时降速并重新排队，返回原始响应"""
+    app, chat_id = feishu_apps.resolve(target)
+    scheduler, breaker = app.scheduler, app.breaker
+    max_retries = scheduler.options["max_rate_limit_retries"]
+    for attempt in range(max_retries + 1):
+        if breaker.is_open:
+            raise DeliveryError(f"飞书应用 {app.name} 的接口熔断中，消息搁置在发件箱", retry_after=breaker.retry_after())
+        started = time.perf_counter()
+        access_token = await app.token_manager.get_token()
+        observe_stage("auth", started)
+        if not access_token:
+            if breaker.is_open:
+                raise DeliveryError(f"飞书应用 {app.name} 的接口熔断中，消息搁置在发件箱", retry_after=breaker.retry_after())
+            raise DeliveryError(f"无法获取飞书应用 {app.name} 的 access_token")
+
+        await scheduler.acquire(chat_id)
+        started = time.perf_counter()
+        try:
+            response_data = await call(app.client, access_token, chat_id)
+            if response_data.get("code") == 0:
+                scheduler.report_success(chat_id)
+            return response_data
+        except FeishuRateLimited as e:
+            feishu_errors_total.inc(str(e.code) if e.code is not None else f"http_{e.status_code}")
+            # 被限流时不丢弃消息：暂停并降低该群组（或整个应用）的发送速率后重新排队
+            scheduler.report_rate_limited(chat_id, app_level=e.app_level, retry_after=e.retry_after)
+            if attempt == max_retries:
+                raise DeliveryError(f"通过API发送到飞书时持续被限流: {e}") from e
+        except FeishuCircuitOpen as e:
+            # 半开状态下试探名额已被占用，稍后再发
+            raise DeliveryError(str(e), retry_after=max(e.retry_after or 0, 1)) from e
+        except FeishuAPIError as e:
+            feishu_errors_total.inc(f"http_{e.status_code}" if e.status_code else "network")
+            raise DeliveryError(f"通过API发送到飞书时发生网络错误: {e}") from e
+        finally:
+            observe_stage("send", started)
+
+async def post_message(entry):
+    """发送一条新消息，返回飞书响应中的 data"""
+    target_chat_id = entry["chat_id"]
+    response_data = await call_feishu_with_rate_limit(
+        target_chat_id,
+        lambda client, access_token, chat_id: client.send_message(
+            access_token, chat_id, entry["msg_type"], entry["content"]
+        ),
+    )
+    code = response_data.get("code")
+    if code != 0:
+        feishu_errors_total.inc(str(code))
+        raise DeliveryError(
+            f"通过API发送到飞书失败: {response_data.get('msg')}, code: {code}",
+            retryable=code not in NON_RETRYABLE_FEISHU_CODES,
+        )
+    feishu_messages_total.inc(target_chat_id, "sent")
+    logger.info(
+        f"成功将项目 {entry['repo_name']} 的更新通过API转发到飞书群组 {target_chat_id}: {logging_setup.excerpt(response_data)}",
+        extra={"fields": {"chat_id": target_chat_id, "repo": entry["repo_name"], "outbox_id": entry["id"]}},
+    )
+    return response_data.get("data") or {}
+
+async def send_updatable_entry(entry):
+    """发送可更新的卡片：该 key 已有卡片时原地更新，否则发送新卡片并记下 message_id"""
+    message_key = entry["message_key"]
+    async with message_index.lock(message_key):
+        if not await message_index.is_current(message_key, entry["id"]):
+            feishu_messages_total.inc(entry["chat_id"], "skipped")
+            logger.info(f"跳过已被更新内容取代的卡片: {message_key}")
+            return
+
+        message_id = await message_index.message_id(message_key)
+        if message_id:
+            response_data = await call_feishu_with_rate_limit(
+                entry["chat_id"],
+                lambda client, access_token, chat_id: client.update_message(access_token, message_id, entry["content"]),
+            )
+            if response_data.get("code") == 0:
+                message_index.record_update()
+                feishu_messages_total.inc(entry["chat_id"], "updated")
+                logger.info(f"已更新项目 {entry['repo_name']} 的卡片 {message_id}: {message_key}")
+                return
+            feishu_errors_total.inc(str(response_data.get("code")))
+            # 卡片被撤回、超过可编辑期限等情况下改为发送新卡片
+            logger.warning(
+                f"更新卡片 {message_id} 失败，改为发送新卡片: {response_data.get('msg')}, code: {response_data.get('code')}"
+            )
+            await message_index.set_message_id(message_key, None)
+
+        data = await post_message(entry)
+        await message_index.set_message_id(message_key, data.get("message_id"))
+
+async def send_outbox_entry(entry):
+    """发件箱的发送回调：按限流配额排队后发送一条消息，失败时抛出 DeliveryError"""
+    logger.info(
+        f"准备通过API发送到飞书的消息 (卡片): receive_id={entry['chat_id']}, content={logging_setup.excerpt(entry['content'])}",
+        extra={"sample": "feishu.request", "fields": {"chat_id": entry["chat_id"], "repo": entry["repo_name"]}},
+    )
+    try:
+        if entry.get("message_key") and message_index.enabled:
+            await send_updatable_entry(entry)
+        else:
+            await post_message(entry)
+    except DeliveryError as e:
+        feishu_messages_total.inc(entry["chat_id"], "parked" if e.retry_after is not None else "failed")
+        raise
+
+async def deliver_github_event(job):
+    """渲染一次卡片，为每个目标群组写入一条发件箱条目并并发发送，全部群组都发送成功时返回 True。
+
+    每个群组的结果分别记录在发件箱中，部分群组发送失败时只重试失败的群组。
+    """
+    handler = event_registry.get(job["event_type"])
+    # content 是卡片对象的JSON字符串
+    started = time.perf_counter()
+    content = handler.render(job["payload"], job["repo_name"])
+    observe_stage("render", started)
+    update_key = None
+    if handler.updatable and message_index.enabled:
+        update_key = handler.message_key(job["payload"], job["repo_name"])
+        rank = handler.update_rank(job["payload"])
+
+    entries = []
+    for chat_id in job["chat_ids"]:
+        message_key = f"{chat_id}|{update_key}" if update_key else None
+        if message_key and await message_index.is_stale(message_key, rank):
+            logger.info(f"忽略晚到的过期状态: {message_key}")
+            continue
+        entry = outbox.add(chat_id, "interactive", content, job["repo_name"], message_key=message_key)
+        if message_key:
+            await message_index.claim(message_key, rank, entry["id"])
+        entries.append(entry)
+
+    if len(entries) == 1:
+        return await outbox.deliver(entries[0])
+    results = await asyncio.gather(*(outbox.deliver(entry) for entry in entries))
+    failed = [entry["chat_id"] for entry, sent in zip(entries, results) if not sent]
+    if failed:
+        logger.warning(
+            f"项目 {job['repo_name']} 的更新已发送到 {len(entries) - len(failed)}/{len(entries)} 个群组，"
+            f"发送失败的群组将由发件箱重试: {', '.join(failed)}"
+        )
+    return not failed
+
+async def process_delivery_job(job):
+    """投递管道的 worker 回调：投递完成（无论成功与否）后归还该任务占用的准入名额"""
+    try:
+        await deliver_github_event(job)
+    finally:
+        admission.release(job["repo_name"])
+
+def submit_delivery(job):
+    """把已接受的任务放入投递管道，未能入队时归还准入名额"""
+    if delivery_pipeline.submit(job):
+        return True
+    admission.release(job["repo_name"])
+    return False
+
+# 超过该大小的请求体在线程中计算签名
+SIGNATURE_OFFLOAD_BYTES = 64 * 1024
+
 async def github_webhook_receiver(request: Request):
-    if (not FEISHU_APP_ID or FEISHU_APP_ID.startswith("YOUR_") or
-            not FEISHU_APP_SECRET or FEISHU_APP_SECRET.startswith("YOUR_")):
+    """GitHub webhook 入口：ping 之外的请求受准入控制，同时处理的请求数达到上限时返回 503 并带 Retry-After"""
+    event_type = request.headers.get("X-GitHub-Event")
+    if admission.bypasses(event_type):
+        return await handle_github_webhook(request)
+    try:
+        admission.enter()
+    except AdmissionRejected as e:
+        count_github_event(event_type, None, "overloaded")
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    try:
+        return await handle_github_webhook(request)
+    finally:
+        admission.leave()
+
+async def handle_github_webhook(request):
+    if not feishu_apps.default.configured:
         logger.error("Feishu App ID or App Secret not configured properly.")
         raise HTTPException(status_code=500, detail="Feishu App ID or App Secret not configured properly.")
 
+    event_type = request.headers.get("X-GitHub-Event")
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+
+    # 没有处理器的事件只看请求头即可忽略，不读取也不解析请求体
+    if event_type != "ping" and not event_registry.handles_event(event_type):
+        count_github_event(event_type, None, "ignored")
+        logger.info(f"忽略未处理的事件类型: {event_type}")
+        return {"status": "ignored", "message": f"已忽略事件类型: {event_type}"}
+
+    raw_body = await read_request_body(request)
+
+    # 在解析 JSON 之前基于原始请求体校验签名，伪造的请求只需一次 HMAC 计算即被拒绝
+    signed_by = None
+    if github_signature_verifier.enabled:
+        started = time.perf_counter()
+        signature = request.headers.get("X-Hub-Signature-256")
+        if len(raw_body) > SIGNATURE_OFFLOAD_BYTES:
+            # 大请求体的 HMAC 在线程中计算（hashlib 计算时释放 GIL），不阻塞事件循环
+            signed_by = await asyncio.to_thread(github_signature_verifier.verify, raw_body, signature)
+        else:
+            signed_by = github_signature_verifier.verify(raw_body, signature)
+        observe_stage("verify", started)
+        if not signed_by:
+            count_github_event(event_type, None, "rejected")
+            logger.warning(f"拒绝签名无效的GitHub请求: {event_type}, 投递 {delivery_id}")
+            raise HTTPException(status_code=401, detail="签名校验失败")
+
+    # 负载开头的 action 不需要处理时直接忽略，不必解析整个请求体
+    action = peek_action(raw_body)
+    if event_type != "ping" and action is not None and event_registry.handler_for(event_type, action) is None:
+        count_github_event(event_type, None, "ignored")
+        logger.info(f"忽略未处理的事件: {event_type}.{action}")
+        return {"status": "ignored", "message": f"已忽略事件: {event_type}.{action}"}
+
+    # GitHub 超时后会以相同的 X-GitHub-Delivery 重新投递，在解析负载之前就拒绝重复投递
+    dedup_key = f"github:{delivery_id}" if delivery_id else None
+    if dedup_key and await dedup_index.check_and_mark(dedup_key):
+        count_github_event(event_type, None, "duplicate")
+        logger.info(f"忽略重复的GitHub投递: {delivery_id} ({event_type})")
+        return {"status": "duplicate", "message": f"投递 {delivery_id} 已处理过"}
+
+    # 按处理器声明的字段解码，提交的文件列表等未声明的字段不会被构建成对象
+    started = time.perf_counter()
     try:
-        payload = await request.json()
-    except Exception as e:
+        payload = payload_parser.parse(raw_body, event_registry.get(event_type) if event_type != "ping" else None)
+    except PayloadError as e:
+        count_github_event(event_type, None, "invalid")
         logger.error(f"无法解析JSON负载: {e}")
         raise HTTPException(status_code=400, detail="无法解析JSON负载")
+    observe_stage("parse", started)
 
-    event_type = request.headers.get("X-GitHub-Event")
     repo_name = payload.get("repository", {}).get("full_name", "未知仓库")
-    logger.info(f"接收到GitHub事件: {event_type}, 项目: {repo_name}")
+    logger.info(
+        f"接收到GitHub事件: {event_type}, 项目: {repo_name}",
+        extra={"fields": {"event": event_type, "repo": repo_name, "delivery_id": delivery_id}},
+    )
+
+    if signed_by is not None and not github_signature_verifier.allows(signed_by, repo_name):
+        count_github_event(event_type, repo_name, "rejected")
+        logger.warning(f"拒绝GitHub请求: 项目 {repo_name} 的签名未使用该项目配置的密钥")
+        if dedup_key:
+            await dedup_index.forget(dedup_key)
+        raise HTTPException(status_code=401, detail="签名校验失败")
+
+    if event_type == "ping":
+        count_github_event(event_type, repo_name, "ping")
+        logger.info("接收到GitHub Ping事件，测试连接成功。")
+        return {"status": "success", "message": "Ping event received successfully"}
 
-    target_chat_id = get_chat_id_for_project(repo_name)
-    if not target_chat_id:
+    action = payload.get("action")
+    handler = event_registry.handler_for(event_type, action)
+    if handler is None:
+        count_github_event(event_type, repo_name, "ignored")
+        logger.info(f"忽略未处理的事件: {event_type}.{action}")
+        return {"status": "ignored", "message": f"已忽略事件: {event_type}.{action}"}
+
+    started = time.perf_counter()
+    route_rule, target_chat_ids = route_event(repo_name, event_type, handler.branch(payload))
+    observe_stage("route", started)
+    if not target_chat_ids:
+        # 被规则的分支/事件过滤掉，或者规则配置为不通知
+        count_github_event(event_type, repo_name, "filtered")
+        return {"status": "ignored", "message": f"项目 {repo_name} 的 {event_type} 事件没有需要通知的群组"}
+    target_chat_ids = [chat_id for chat_id in target_chat_ids if chat_id]
+    if not target_chat_ids:
         logger.error(f"无法确定项目 {repo_name} 的目标群组")
         raise HTTPException(status_code=500, detail=f"无法确定项目 {repo_name} 的目标群组")
 
+    # 待投递任务总数与该仓库的任务数达到上限时拒绝，过载期间内存中等待发送的负载和卡片数量有上限
+    try:
+        admission.admit(repo_name)
+    except AdmissionRejected as e:
+        count_github_event(event_type, repo_name, "throttled" if e.status_code == 429 else "overloaded")
+        if dedup_key:
+            await dedup_index.forget(dedup_key)
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+
+    job = {
+        "delivery_id": delivery_id,
+        "event_type": event_type,
+        "repo_name": repo_name,
+        "chat_ids": target_chat_ids,
+        "payload": payload,
+    }
     if event_type == "push":
-        try:
-            ref = payload.get("ref", "未知分支") 
-            branch_name = ref.split("/")[-1] if ref else "未知分支"
-            
-            pusher_name = payload.get("pusher", {}).get("name", "未知推送者")
-            
-            commits = payload.get("commits", [])
-            if not commits:
-                head_commit = payload.get("head_commit")
-                if head_commit:
-                    commit_message = head_commit.get("message", "无提交信息 (可能为创建/删除分支)")
-                    commit_url = head_commit.get("url", "#")
-                    commit_author = head_commit.get("author", {}).get("name", pusher_name)
-                else:
-                    commit_message = "无具体代码变更 (例如：分支创建/删除)"
-                    commit_url = payload.get("compare", "#")
-                    commit_author = pusher_name
-            else:
-                # 处理多个提交的情况
-                if len(commits) == 1:
-                    # 单个提交时使用格式化函数
-                    single_commit = commits[0]
-                    formatted_message, author_display = format_commit_message(single_commit)
-                    commit_message = formatted_message
-                    commit_url = single_commit.get("url", "#")
-                    commit_author = author_display
-                else:
-                    # 多个提交时，展示所有提交信息
-                    commit_details = []
-                    # 收集所有不同的提交者
-                    unique_authors = set()
-                    for commit in commits:
-                        author = commit.get("author", {}).get("name", "未知作者")
-                        if author and author != "未知作者":
-                            unique_authors.add(author)
-
-                    for i, commit in enumerate(commits, 1):
-                        formatted_message, author_display = format_commit_message(commit)
-                        commit_details.append(f"{i}. {author_display}: {formatted_message}")
-
-                    commit_message = "\n".join(commit_details)
-                    commit_url = payload.get("compare", "#")  # 使用compare URL查看所有变更
-
-                    # 提交者显示为逗号分隔的名字列表
-                    if unique_authors:
-                        authors_list = [f"**@{author}**" for author in unique_authors]
-                        commit_author = ", ".join(authors_list)
-                    else:
-                        commit_author = "未知提交者"
-
-            message_lines = [
-                f"📦 **仓库**: {repo_name}",
-                f"🌿 **分支**: {branch_name}",
-                f"👤 **提交者**: {commit_author} (推送者: {pusher_name})",
-                f"💬 **信息**: {commit_message}",
-                f"🔗 **详情**: {commit_url}"
-            ]
-            
-            if len(commits) > 1:
-                message_lines.append(f"✨ **总提交数**: {len(commits)}")
-                compare_url = payload.get("compare")
-                if compare_url:
-                    message_lines.append(f"🔍 **查看所有变更**: {compare_url}")
-
-            # --- 构建消息卡片 ---
-            card_elements = [
-                {
-                    "tag": "div",
-                    "text": {"tag": "lark_md", "content": f"📦 **仓库**: {repo_name}"}
-                },
-                {
-                    "tag": "div",
-                    "text": {"tag": "lark_md", "content": f"🌿 **分支**: {branch_name}"}
-                },
-                {
-                    "tag": "div",
-                    "text": {"tag": "lark_md", "content": f"👤 **提交者**: {commit_author}"}
-                }
-            ]
-
-            # 处理提交信息显示
-            if len(commits) <= 1:
-                # 单个提交的情况
-                card_elements.append({
-                    "tag": "div",
-                    "text": {"tag": "lark_md", "content": f"💬 **信息**: {commit_message}"}
-                })
-                card_elements.append({
-                    "tag": "action",
-                    "actions": [
-                        {
-                            "tag": "button",
-                            "text": {"tag": "plain_text", "content": "🔗 查看提交详情"},
-                            "type": "default",
-                            "url": commit_url
-                        }
-                    ]
-                })
-            else:
-                # 多个提交的情况
-                card_elements.append({
-                    "tag": "div",
-                    "text": {"tag": "lark_md", "content": f"✨ **总提交数**: {len(commits)}"}
-                })
-
-                # 限制显示的提交数量，避免卡片过长
-                max_display_commits = 10
-                displayed_commits = commits[:max_display_commits]
-
-                # 添加提交列表
-                for i, commit in enumerate(displayed_commits, 1):
-                    formatted_message, author_display = format_commit_message(commit)
-                    card_elements.append({
-                        "tag": "div",
-                        "text": {"tag": "lark_md", "content": f"  {i}. {author_display}: {formatted_message}"}
-                    })
-
-                # 如果有更多提交，显示省略信息
-                if len(commits) > max_display_commits:
-                    remaining = len(commits) - max_display_commits
-                    card_elements.append({
-                        "tag": "div",
-                        "text": {"tag": "lark_md", "content": f"  ... 还有{remaining}个提交"}
-                    })
-
-                # 添加查看所有变更的按钮
-                compare_url_from_payload = payload.get("compare")
-                if compare_url_from_payload:
-                    card_elements.append({
-                        "tag": "action",
-                        "actions": [
-                            {
-                                "tag": "button",
-                                "text": {"tag": "plain_text", "content": "🔍 查看所有变更"},
-                                "type": "default",
-                                "url": compare_url_from_payload
-                            }
-                        ]
-                    })
-            
-            card_elements.append({
-                "tag": "div",
-                "text": {"tag": "lark_md", "content": "💾 请及时拉取最新数据 git pull origin main"}
-            })
-            
-            # 完整的消息卡片JSON对象 (content部分)
-            feishu_card_content_obj = {
-                "config": {"wide_screen_mode": True},
-                "header": {
-                    "title": {"tag": "plain_text", "content": "GitHub 项目更新通知"},
-                    "template": "blue" # 可以尝试其他颜色如 green, orange, red, etc.
-                },
-                "elements": card_elements
-            }
-            # --- 消息卡片构建结束 ---
-            
-            access_token = await get_tenant_access_token()
-            if not access_token:
-                logger.error("Failed to get tenant_access_token for sending message.")
-                raise HTTPException(status_code=500, detail="无法获取飞书 access_token")
+        coalesce_key = (repo_name, payload.get("ref"), tuple(target_chat_ids))
+        coalesce_window = route_rule.settings.get("coalesce_window") if route_rule is not None else None
+        if coalesce_window and payload.get("commits"):
+            if push_coalescer.add(coalesce_key, coalesce_window, job):
+                # 合并进已有窗口的推送只保留精简后的提交，不再单独占用名额
+                admission.release(repo_name)
+            count_github_event(event_type, repo_name, "coalesced")
+            return JSONResponse(
+                status_code=202,
+                content={"status": "accepted", "message": f"项目 {repo_name} 的更新已加入 {coalesce_window} 秒聚合窗口，目标群组 {', '.join(target_chat_ids)}"},
+            )
+
+        # 分支创建/删除等没有提交的推送不参与聚合，先发出已有的聚合窗口以保持顺序
+        push_coalescer.flush(coalesce_key)
+    if not submit_delivery(job):
+        count_github_event(event_type, repo_name, "queue_full")
+        if dedup_key:
+            # 未被接受的投递允许 GitHub 重新投递
+            await dedup_index.forget(dedup_key)
+        raise HTTPException(status_code=503, detail="投递队列已满，请稍后重试",
+                            headers={"Retry-After": str(admission.options["retry_after"])})
+
+    count_github_event(event_type, repo_name, "accepted")
+    return JSONResponse(
+        status_code=202,
+        content={"status": "accepted", "message": f"项目 {repo_name} 的更新已进入投递队列，目标群组 {', '.join(target_chat_ids)}"},
+    )
 
-            send_message_url = f"https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type=chat_id"
-            
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json; charset=utf-8"
-            }
-            
-            # Correctly create the JSON payload for Feishu API
-            feishu_api_payload = {
-                "receive_id": target_chat_id,
-                "msg_type": "interactive", # <--- 改为 interactive
-                "content": json.dumps(feishu_card_content_obj) # <--- content 是卡片对象的JSON字符串
-            }
-
-            logger.info(f"准备通过API发送到飞书的消息 (卡片): {feishu_api_payload}")
-            
-            response = requests.post(send_message_url, headers=headers, json=feishu_api_payload, timeout=10)
-            response.raise_for_status()
-            response_data = response.json()
-
-            if response_data.get("code") == 0:
-                logger.info(f"成功将项目 {repo_name} 的更新通过API转发到飞书群组 {target_chat_id}: {response.status_code} - {response_data}")
-            else:
-                logger.error(f"通过API发送到飞书失败: {response_data.get('msg')}, code: {response_data.get('code')}")
-                raise HTTPException(status_code=500, detail=f"通过API发送到飞书失败: {response_data.get('msg')}")
-
-            return {"status": "success", "message": f"已成功将项目 {repo_name} 的更新转发到群组 {target_chat_id}"}
-
-        except HTTPException: # Re-raise HTTPException
-            raise
-        except Exception as e: # Catch other exceptions
-            logger.error(f"处理push事件并发送到飞书时出错: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"处理并发送到飞书时出错: {str(e)}")
-
-    elif event_type == "ping":
-        logger.info("接收到GitHub Ping事件，测试连接成功。")
-        return {"status": "success", "message": "Ping event received successfully"}
-        
-    else:
-        logger.info(f"忽略非push事件: {event_type}")
-        return {"status": "ignored", "message": f"已忽略事件类型: {event_type}"}
-
-@app.get("/config/project-mapping")
 async def get_project_mapping():
     """获取项目群组映射配置"""
     if not PROJECT_CHAT_MAPPING:
@@ -638,23 +855,229 @@ async def get_project_mapping():
         "message": f"当前配置了 {len(PROJECT_CHAT_MAPPING)} 个项目映射"
     }
 
-@app.get("/")
+async def dry_run_route(repo: str, event: str = "push", branch: str = None):
+    """试运行路由：返回某个仓库/事件/分支会命中哪条规则、发送到哪些群组，不发送任何消息"""
+    result = project_router.route(repo, event, branch)
+    if result.rule is not None:
+        matched, chat_ids = result.rule.describe(), result.rule.chat_ids
+    elif result.skipped:
+        matched, chat_ids = None, []
+    else:
+        # 没有任何规则匹配该仓库时使用系统默认群组
+        matched, chat_ids = None, [get_current_chat_id()]
+    return {
+        "repo": repo,
+        "event": event,
+        "branch": branch,
+        "matched_rule": matched,
+        "skipped_rules": [rule.describe() for rule in result.skipped],
+        "chat_ids": chat_ids,
+        "router": project_router.stats(),
+    }
+
+def require_admin_token(request):
+    """管理接口需要 Authorization: Bearer <server.admin_token>；未配置 admin_token 时管理接口关闭"""
+    admin_token = SERVER_OPTIONS.get("admin_token")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="管理接口未启用，请配置 server.admin_token 或修改配置文件中的 logging.level")
+    scheme, _, token = (request.headers.get("Authorization") or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode("utf-8"), admin_token.encode("utf-8")):
+        logger.warning(f"拒绝未授权的管理请求 {request.url.path}，来自 {request.client.host if request.client else '未知地址'}")
+        raise HTTPException(status_code=401, detail="管理令牌无效", headers={"WWW-Authenticate": "Bearer"})
+
+async def update_log_level(request: Request, level: str):
+    """运行时调整日志级别（例如排查问题时临时改为 DEBUG），重启后恢复配置文件中的级别；需要管理令牌"""
+    require_admin_token(request)
+    try:
+        new_level = logging_setup.set_log_level(level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.warning(f"日志级别已调整为 {new_level}")
+    return {"status": "success", "level": new_level}
+
+async def get_metrics():
+    """Prometheus 文本格式的指标"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="指标未启用")
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 async def root():
     """服务状态检查"""
     return {
         "service": "GitHub to Feishu Webhook",
         "status": "running",
         "config_loaded": CONFIG_SUCCESSFULLY_LOADED,
+        "delivery": delivery_pipeline.stats(),
+        "outbox": outbox.stats(),
+        "token": feishu_apps.default.token_manager.stats(),
+        "rate_limit": feishu_apps.default.scheduler.stats(),
+        "coalesce": push_coalescer.stats(),
+        "dedup": dedup_index.stats(),
+        "message_index": message_index.stats(),
+        "config": config_store.stats(),
+        "circuit_breaker": feishu_apps.default.breaker.stats(),
+        "feishu_apps": feishu_apps.stats(),
+        "payload": payload_parser.stats(),
+        "admission": admission.stats(),
+        "logging": logging_setup.stats(),
+        "startup": STARTUP_TIMINGS,
         "endpoints": [
             "/webhook/github - GitHub webhook接收",
             "/webhook/feishu_events - 飞书事件接收", 
             "/config/project-mapping - 查看项目群组映射",
+            "/config/route?repo=owner/repo&event=push&branch=main - 试运行路由规则",
+            "PUT /config/log-level?level=DEBUG - 调整日志级别（需要 server.admin_token）",
+            "/metrics - Prometheus 指标",
             "/ - 服务状态"
         ]
     }
 
+# 路由表：(路径, 处理函数, HTTP 方法)，由 create_app() 注册
+ROUTES = [
+    ("/webhook/feishu_events", feishu_events_receiver, ["POST"]),
+    ("/webhook/github", github_webhook_receiver, ["POST"]),
+    ("/config/project-mapping", get_project_mapping, ["GET"]),
+    ("/config/route", dry_run_route, ["GET"]),
+    ("/config/log-level", update_log_level, ["PUT"]),
+    ("/metrics", get_metrics, ["GET"]),
+    ("/", root, ["GET"]),
+]
+
+def init_components():
+    """按已加载的配置创建各组件：只创建内存中的对象，文件、数据库与网络 I/O 留到应用启动时"""
+    global metrics, github_events_total, stage_seconds, feishu_messages_total, feishu_errors_total, http_in_flight
+    global commit_classifier, project_router, github_signature_verifier, dedup_index, feishu_apps
+    global admission
+    global payload_parser, card_renderer, event_registry, message_index, outbox, delivery_pipeline
+    global push_coalescer
+    # /metrics 指标：各组件已有的统计在抓取时读取，请求路径上只做无锁的计数和耗时记录
+    metrics = MetricsRegistry(METRICS_OPTIONS)
+    github_events_total = metrics.counter(
+        "github_webhook_events_total", "收到的 GitHub 事件数，按事件类型、仓库与处理结果", ("event", "repo", "outcome")
+    )
+    stage_seconds = metrics.histogram(
+        "webhook_stage_seconds", "各处理阶段的耗时：verify 签名校验、parse 解析、route 路由、render 渲染、auth 获取 token、send 调用飞书", ("stage",)
+    )
+    feishu_messages_total = metrics.counter(
+        "feishu_messages_total", "发送到飞书的消息数，按群组与结果 (sent/updated/skipped/parked/failed)", ("chat_id", "outcome")
+    )
+    feishu_errors_total = metrics.counter(
+        "feishu_api_errors_total", "飞书接口返回的错误，按错误码（网络错误为 network，HTTP 错误为 http_<状态码>）", ("code",)
+    )
+    http_in_flight = metrics.gauge("http_requests_in_flight", "正在处理的 HTTP 请求数", ("path",))
+    metrics.counter("feishu_token_cache_hits_total", "tenant_access_token 缓存命中次数，按飞书应用", ("app",),
+                    func=lambda: {(app.name,): app.token_manager.hits for app in feishu_apps if app.token_manager})
+    metrics.counter("feishu_token_cache_misses_total", "tenant_access_token 缓存未命中次数，按飞书应用", ("app",),
+                    func=lambda: {(app.name,): app.token_manager.misses for app in feishu_apps if app.token_manager})
+    metrics.gauge("feishu_token_cache_hit_ratio", "tenant_access_token 缓存命中率，按飞书应用", ("app",),
+                  func=lambda: {(app.name,): app.token_manager.stats()["hit_ratio"] for app in feishu_apps
+                                if app.token_manager and app.token_manager.stats()["hit_ratio"] is not None})
+    metrics.gauge("delivery_queue_depth", "投递队列中等待处理的任务数", func=lambda: delivery_pipeline.stats()["queue_depth"])
+    metrics.gauge("outbox_entries", "发件箱中的条目数，按状态", ("status",),
+                  func=lambda: {("pending",): outbox.stats()["pending"], ("dead",): outbox.stats()["dead"]})
+    metrics.gauge("feishu_circuit_state", "飞书接口熔断器状态：0 关闭，1 半开，2 断开，按飞书应用", ("app",),
+                  func=lambda: {(app.name,): {"closed": 0, "half_open": 1, "open": 2}[app.breaker.stats()["state"]] for app in feishu_apps})
+    metrics.counter("feishu_circuit_rejected_total", "熔断期间直接失败的飞书调用数，按飞书应用", ("app",),
+                    func=lambda: {(app.name,): app.breaker.rejected for app in feishu_apps})
+    metrics.gauge("webhook_admission_in_flight", "准入控制下正在处理的 webhook 请求数", func=lambda: admission.in_flight)
+    metrics.gauge("webhook_admission_pending", "已接受但尚未投递完成的任务数", func=lambda: admission.pending)
+    metrics.counter("webhook_admission_rejected_total", "准入控制拒绝的请求数，按原因 (in_flight/pending/per_repo)", ("reason",),
+                    func=lambda: {(reason,): count for reason, count in admission.rejected.items()})
+    metrics.counter("log_records_dropped_total", "日志队列已满而丢弃的日志条数", func=lambda: logging_setup.stats()["dropped"])
+
+    # 提交类型分类表，支持通过配置文件的 commit_types 扩展
+    commit_classifier = CommitClassifier(COMMIT_TYPES)
+
+    # project_chat_mapping 在加载时编译成的路由索引（精确匹配、前缀、通配符/正则与分支/事件过滤）
+    project_router = ProjectRouter(PROJECT_CHAT_MAPPING)
+
+    # GitHub Webhook 签名校验，未配置密钥时不校验
+    github_signature_verifier = GitHubSignatureVerifier(GITHUB_WEBHOOK_SECRETS)
+
+    # 配置文件被修改后热加载
+    config_store.add_listener(apply_reloaded_config)
+
+    # GitHub X-GitHub-Delivery 与飞书 event_id 的去重索引
+    dedup_index = DedupIndex(DEDUP_OPTIONS)
+
+    # 飞书应用：每个应用有自己的 token、按群组和应用限流的发送调度器、熔断器（飞书故障时快速失败，
+    # 消息搁置在发件箱中，恢复后再发送）与连接池；feishu_apps 中的应用未单独配置的项沿用全局配置
+    feishu_apps = FeishuAppRegistry(FEISHU_APP_ID, FEISHU_APP_SECRET, FEISHU_APPS_OPTIONS, defaults={
+        "feishu_http": FEISHU_HTTP_OPTIONS,
+        "token": TOKEN_OPTIONS,
+        "rate_limit": RATE_LIMIT_OPTIONS,
+        "circuit_breaker": CIRCUIT_BREAKER_OPTIONS,
+    })
+
+    # 准入控制：限制同时处理的请求数与尚未投递完成的任务数，饱和时快速返回 503 / 429
+    admission = AdmissionController(ADMISSION_OPTIONS)
+
+    # 请求体读取与解析：限制大小，只解码处理器声明的字段
+    payload_parser = PayloadParser(PAYLOAD_OPTIONS)
+
+    # 卡片渲染器：静态模板片段预先序列化，每张卡片只序列化一次动态元素
+    card_renderer = CardRenderer(commit_classifier)
+
+    # GitHub 事件类型 -> 处理器，每个处理器声明关心的 action 和负载字段
+    event_registry = create_default_registry(card_renderer)
+
+    # CI 状态卡片的 message_id 索引：同一次运行的后续状态原地更新卡片
+    message_index = MessageIndex(MESSAGE_INDEX_OPTIONS)
+
+    # 持久化发件箱，发送失败的消息按退避重试，重启后继续投递
+    outbox = Outbox(send_outbox_entry, OUTBOX_OPTIONS)
+
+    # 后台投递管道，webhook 入队后立即返回 202，在应用启动时开始运行
+    delivery_pipeline = DeliveryPipeline(process_delivery_job, DELIVERY_OPTIONS)
+
+    # 按仓库和分支聚合频繁推送，窗口结束后合并为一个投递任务
+    push_coalescer = PushCoalescer(submit_delivery)
+
+def create_app(config=None):
+    """创建 FastAPI 应用：config 为配置字典或配置文件路径，默认读取 feishu_config.json。
+
+    这里只导入 FastAPI、加载配置并创建内存中的组件；日志、状态后端、后台任务与连接池在应用启动时打开，
+    预热钩子在开始接收请求之前执行。
+    """
+    global CONFIG_SUCCESSFULLY_LOADED
+    started = time.perf_counter()
+    from fastapi import FastAPI
+
+    CONFIG_SUCCESSFULLY_LOADED = load_app_config(config)
+    init_components()
+    application = FastAPI(lifespan=lifespan)
+    application.add_middleware(InFlightMiddleware, gauge=http_in_flight)
+    for path, endpoint, methods in ROUTES:
+        application.add_api_route(path, endpoint, methods=methods)
+    STARTUP_TIMINGS["create_app"] = round(time.perf_counter() - started, 4)
+    return application
+
+def __getattr__(name):
+    """兼容 `uvicorn main:app`：第一次访问 main.app 时才按默认配置文件创建应用"""
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == "__main__":
+    import uvicorn
+
+    # 作为脚本运行时先按默认设置配置日志，读取配置文件时的日志同样写入 logs/
+    logging_setup.setup_logging()
+    app = create_app()
     if not CONFIG_SUCCESSFULLY_LOADED:
         logger.error("Application configuration failed to load. Please check feishu_config.json. Service will not start.")
     else:
-        uvicorn.run(app, host="0.0.0.0", port=8002, log_level="info") 
\ No newline at end of file
+        host = SERVER_OPTIONS.get("host", "0.0.0.0")
+        port = SERVER_OPTIONS.get("port", 8002)
+        workers = SERVER_OPTIONS.get("workers", 1)
+        if workers > 1:
+            if dict(DEFAULT_STATE_BACKEND_OPTIONS, **STATE_BACKEND_OPTIONS)["type"] == "memory":
+                logger.warning("多个 worker 进程使用内存状态后端时，各进程会分别获取 token、维护各自的当前群组，建议将 state_backend.type 设为 sqlite")
+            if MESSAGE_INDEX_OPTIONS.get("enabled", True) and not MESSAGE_INDEX_OPTIONS.get("persistent"):
+                logger.warning("多个 worker 进程各自在内存中记录 CI 卡片索引时，同一次运行的状态可能发送多张卡片，建议开启 message_index.persistent")
+            # 多进程模式下 uvicorn 需要以导入字符串的方式加载应用，每个 worker 进程各自调用 create_app()
+            uvicorn.run("main:create_app", factory=True, host=host, port=port, workers=workers, log_level="info", log_config=None)
+        else:
+            # log_config=None：uvicorn 的日志同样经由根日志器的队列写出
+            uvicorn.run(app, host=host, port=port, log_level="info", log_config=None) 
\ No newline at end of file
@@ -0,0 +1,273 @@
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from state_backend import check_local_sqlite_path
+
+logger = logging.getLogger(__name__)
+
+# 可更新卡片索引默认配置，可通过 feishu_config.json 的 "message_index" 覆盖
+DEFAULT_MESSAGE_INDEX_OPTIONS = {
+    "enabled": True,        # 为 False 时 CI 状态每次都发送新卡片
+    "max_entries": 10000,   # 最多记录的卡片数量，超出后淘汰最久未使用的
+    "ttl": 86400,           # 卡片发出后可被更新的秒数，超过后同一个 key 会发送新卡片
+    "persistent": False,    # 是否同时记录到 SQLite，重启后或多个 worker 进程之间也能更新同一张卡片
+    "path": "message_index.db",
+    "send_lease": 30,       # 持久化时，一个进程发送某个 key 的卡片期间其他进程等待的最长秒数
+}
+
+
+class _Record:
+    __slots__ = ("message_id", "rank", "entry_id", "expires_at")
+
+    def __init__(self, expires_at):
+        self.message_id = None
+        self.rank = None
+        self.entry_id = None
+        self.expires_at = expires_at
+
+
+class MessageIndex:
+    """更新 key（例如 群组 + 仓库 + 工作流运行ID）-> 已发送卡片的 message_id，按 LRU 与 TTL 淘汰。
+
+    每个 key 记录最新一次渲染的发件箱条目和它的进度 (rank)：进度更早的事件晚到时不会覆盖卡片，
+    被更新的内容取代的发件箱条目在发送时直接跳过。
+    persistent 为 true 时记录保存在 SQLite 中（多个 worker 共用同一个文件），内存中只是缓存，
+    同一个 key 的发送通过表中的租期在进程之间串行。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_MESSAGE_INDEX_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._records = collections.OrderedDict()
+        self._locks = {}
+        self._conn = None
+        self._db_lock = None
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._claims_since_purge = 0
+        self.updates = 0
+        self.stale_skips = 0
+        self.lease_waits = 0
+
+    async def start(self):
+        if self.enabled and self.options["persistent"] and self._conn is None:
+            self._db_lock = asyncio.Lock()
+            self._conn = await asyncio.to_thread(self._connect)
+            logger.info(f"卡片索引持久层已打开: {self.options['path']}")
+
+    def _connect(self):
+        check_local_sqlite_path(self.options["path"], "卡片索引")
+        conn = sqlite3.connect(self.options["path"], check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS message_index (key TEXT PRIMARY KEY, message_id TEXT, rank TEXT, entry_id TEXT, "
+            "expires_at REAL NOT NULL, used_at REAL NOT NULL, lease_owner TEXT, lease_until REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS message_index_used_at ON message_index (used_at)")
+        self._purge(conn, time.time())
+        return conn
+
+    async def stop(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.to_thread(conn.close)
+
+    def _purge(self, conn, now):
+        """删除过期的记录，并按最近使用时间把记录数限制在 max_entries 以内"""
+        conn.execute("DELETE FROM message_index WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM message_index WHERE key IN (SELECT key FROM message_index ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.options["max_entries"],),
+        )
+
+    async def _db(self, func, *args):
+        """在线程中执行一次数据库操作；失败时记录错误并返回 None，退回只使用内存索引"""
+        try:
+            async with self._db_lock:
+                return await asyncio.to_thread(func, *args)
+        except sqlite3.Error as e:
+            logger.error(f"访问卡片索引持久层失败，使用内存索引: {e}")
+            return None
+
+    def _load_row(self, key, now):
+        return self._conn.execute(
+            "SELECT message_id, rank, entry_id, expires_at FROM message_index WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+
+    async def _fetch(self, key):
+        """读取 key 的记录：持久化时以数据库为准并刷新内存缓存"""
+        now = time.time()
+        if self._conn is None:
+            return self._get(key, now)
+        row = await self._db(self._load_row, key, now)
+        if row is None:
+            # 数据库中没有记录（或读取失败）时沿用内存缓存
+            return self._get(key, now)
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = _Record(row[3])
+            self._trim()
+        self._records.move_to_end(key)
+        record.message_id, record.entry_id, record.expires_at = row[0], row[2], row[3]
+        record.rank = _decode_rank(row[1])
+        return record
+
+    def _trim(self):
+        while len(self._records) > self.options["max_entries"]:
+            self._records.popitem(last=False)
+
+    @property
+    def enabled(self):
+        return bool(self.options["enabled"])
+
+    def _get(self, key, now):
+        record = self._records.get(key)
+        if record is None:
+            return None
+        if record.expires_at <= now:
+            del self._records[key]
+            return None
+        self._records.move_to_end(key)
+        return record
+
+    async def is_stale(self, key, rank):
+        """rank 是否早于 key 已记录的进度（晚到的过期状态）"""
+        record = await self._fetch(key)
+        if record is not None and record.rank is not None and rank < record.rank:
+            self.stale_skips += 1
+            return True
+        return False
+
+    async def claim(self, key, rank, entry_id):
+        """登记 key 的最新内容对应的发件箱条目与进度"""
+        now = time.time()
+        record = self._get(key, now)
+        if record is None:
+            record = _Record(now + self.options["ttl"])
+            self._records[key] = record
+            self._trim()
+        record.rank = rank
+        record.entry_id = entry_id
+        if self._conn is not None:
+            await self._db(self._store_claim, key, rank, entry_id, now)
+
+    def _store_claim(self, key, rank, entry_id, now):
+        # 已过期的记录视为新卡片，清空旧的 message_id
+        self._conn.execute(
+            "INSERT INTO message_index (key, rank, entry_id, expires_at, used_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET rank = excluded.rank, entry_id = excluded.entry_id, used_at = excluded.used_at, "
+            "message_id = CASE WHEN message_index.expires_at > ? THEN message_index.message_id END, "
+            "expires_at = CASE WHEN message_index.expires_at > ? THEN message_index.expires_at ELSE excluded.expires_at END",
+            (key, json.dumps(rank), entry_id, now + self.options["ttl"], now, now, now),
+        )
+        self._claims_since_purge += 1
+        if self._claims_since_purge >= 1000:
+            self._claims_since_purge = 0
+            self._purge(self._conn, now)
+
+    async def is_current(self, key, entry_id):
+        """entry_id 是否仍是 key 的最新内容（记录已被淘汰时视为最新）"""
+        record = await self._fetch(key)
+        return record is None or record.entry_id in (None, entry_id)
+
+    async def message_id(self, key):
+        record = await self._fetch(key)
+        return record.message_id if record is not None else None
+
+    async def set_message_id(self, key, message_id):
+        record = self._get(key, time.time())
+        if record is not None:
+            record.message_id = message_id
+        if self._conn is not None:
+            await self._db(self._store_message_id, key, message_id)
+
+    def _store_message_id(self, key, message_id):
+        self._conn.execute(
+            "UPDATE message_index SET message_id = ?, used_at = ? WHERE key = ?", (message_id, time.time(), key)
+        )
+
+    def record_update(self):
+        self.updates += 1
+
+    @contextlib.asynccontextmanager
+    async def lock(self, key):
+        """同一个 key 的发送串行进行，第一张卡片发出并记下 message_id 之后，后续事件才会去更新它"""
+        holder = self._locks.get(key)
+        if holder is None:
+            holder = self._locks[key] = [asyncio.Lock(), 0]  # [锁, 使用者数量]
+        holder[1] += 1
+        try:
+            async with holder[0]:
+                if self._conn is None:
+                    yield
+                else:
+                    await self._acquire_lease(key)
+                    try:
+                        yield
+                    finally:
+                        await self._db(self._release_lease, key)
+        finally:
+            holder[1] -= 1
+            if holder[1] == 0:
+                self._locks.pop(key, None)
+
+    async def _acquire_lease(self, key):
+        """在表中登记发送租期；其他进程正在发送同一个 key 时等待，最多等待 send_lease 秒"""
+        deadline = time.monotonic() + self.options["send_lease"]
+        waited = False
+        while True:
+            if await self._db(self._try_lease, key, time.time()) is not False:
+                return
+            if time.monotonic() >= deadline:
+                logger.warning(f"等待其他进程发送卡片 {key} 超时，直接发送")
+                return
+            if not waited:
+                waited = True
+                self.lease_waits += 1
+            await asyncio.sleep(0.05)
+
+    def _try_lease(self, key, now):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO message_index (key, expires_at, used_at) VALUES (?, ?, ?)",
+            (key, now + self.options["ttl"], now),
+        )
+        cursor = self._conn.execute(
+            "UPDATE message_index SET lease_owner = ?, lease_until = ? "
+            "WHERE key = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_until <= ?)",
+            (self._owner, now + self.options["send_lease"], key, self._owner, now),
+        )
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key):
+        self._conn.execute(
+            "UPDATE message_index SET lease_owner = NULL, lease_until = NULL WHERE key = ? AND lease_owner = ?",
+            (key, self._owner),
+        )
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._records),
+            "max_entries": self.options["max_entries"],
+            "persistent": self._conn is not None,
+            "updates": self.updates,
+            "stale_skips": self.stale_skips,
+            "lease_waits": self.lease_waits,
+        }
+
+
+def _decode_rank(value):
+    """rank 以 JSON 保存，元组会变成列表，转换回来才能与新事件的 rank 比较"""
+    if value is None:
+        return None
+    rank = json.loads(value)
+    return tuple(rank) if isinstance(rank, list) else rank
@@ -0,0 +1,190 @@
+import bisect
+import math
+import os
+
+# 指标默认配置，可通过 feishu_config.json 的 "metrics" 覆盖
+DEFAULT_METRICS_OPTIONS = {
+    "enabled": True,
+    # 各阶段耗时直方图的桶上界（秒）
+    "buckets": [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    # 每个指标最多记录的标签组合数，超出后新的组合计入 "other"，避免仓库/群组过多时内存无限增长
+    "max_series": 2000,
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_OTHER = "other"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """指标基类；提供 func 时在抓取时调用 func() 取值（返回数字，或 {标签值元组: 数字}），
+    用于输出各组件已有的统计，不在请求路径上额外计数"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels, max_series, func=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.max_series = max_series
+        self.func = func
+        self._series = {}
+        self._overflow = (_OTHER,) * len(self.labels)
+
+    def _key(self, values):
+        # 只在事件循环线程中更新，字典与整数的读写不需要加锁
+        if values in self._series or len(self._series) < self.max_series:
+            return values
+        return self._overflow
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        series = self._series
+        if self.func is not None:
+            value = self.func()
+            if value is None:
+                return []
+            series = value if isinstance(value, dict) else {(): value}
+        lines = self.header()
+        for values, value in series.items():
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount=1):
+        key = self._key(values)
+        self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, *values, value):
+        self._series[self._key(values)] = value
+
+    def inc(self, *values, amount=1):
+        key = self._key(values)
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, *values, amount=1):
+        self.inc(*values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels, max_series, buckets):
+        super().__init__(name, help_text, labels, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *values, value):
+        key = self._key(values)
+        series = self._series.get(key)
+        if series is None:
+            # [各桶计数（最后一个为 +Inf）, 总和, 次数]
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = self.header()
+        bounds = [_format_value(float(b)) for b in self.buckets] + ["+Inf"]
+        for values, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, values, le)} {cumulative}")
+            labels = _label_text(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标集合，以 Prometheus 文本格式输出。
+
+    计数只在事件循环线程中进行，没有锁；多 worker 部署时每个进程各自统计，
+    process_worker_info 标明输出这些指标的进程号。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_METRICS_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._metrics = []
+        self.worker = str(os.getpid())
+
+    @property
+    def enabled(self):
+        return bool(self.options["enabled"])
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=(), func=None):
+        return self._register(Counter(name, help_text, labels, self.options["max_series"], func=func))
+
+    def gauge(self, name, help_text, labels=(), func=None):
+        return self._register(Gauge(name, help_text, labels, self.options["max_series"], func=func))
+
+    def histogram(self, name, help_text, labels=(), buckets=None):
+        return self._register(
+            Histogram(name, help_text, labels, self.options["max_series"], buckets or self.options["buckets"])
+        )
+
+    def render(self):
+        lines = [
+            "# HELP process_worker_info 输出这些指标的 worker 进程",
+            "# TYPE process_worker_info gauge",
+            f'process_worker_info{{worker="{self.worker}"}} 1',
+        ]
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+
+class InFlightMiddleware:
+    """ASGI 中间件：统计正在处理的 HTTP 请求数（按路径）"""
+
+    def __init__(self, app, gauge):
+        self.app = app
+        self.gauge = gauge
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        self.gauge.inc(path)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gauge.dec(path)
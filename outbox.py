@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+import uuid
+
+from state_backend import check_local_sqlite_path
+
+logger = logging.getLogger(__name__)
+
+# 持久化发件箱默认配置，可通过 feishu_config.json 的 "outbox" 覆盖
+DEFAULT_OUTBOX_OPTIONS = {
+    "path": "outbox.db",        # SQLite 文件路径（WAL 模式）
+    "flush_interval": 0.2,      # 批量提交的间隔秒数
+    "batch_size": 200,          # 缓冲的写操作达到该数量时立即提交
+    "poll_interval": 1,         # 扫描到期重试任务的间隔秒数
+    "retry_concurrency": 4,     # 同时进行的重试数量
+    "max_attempts": 8,          # 超过后标记为 dead，不再重试
+    "base_delay": 2,            # 指数退避的基础秒数
+    "max_delay": 600,           # 单次退避的上限秒数
+    "claim_lease": 60,          # 条目被某个进程取走发送后的租期秒数，排队与发送期间每过半个租期续期一次，进程崩溃时租期过后由其他进程接管
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    msg_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    repo_name TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT,
+    message_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+_COLUMNS = ("id", "chat_id", "msg_type", "content", "repo_name", "attempts",
+            "status", "next_attempt_at", "created_at", "last_error", "message_key")
+
+_UPSERT_SQL = f"INSERT OR REPLACE INTO outbox ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+class Outbox:
+    """基于 SQLite 的持久化发件箱：记录待发送的卡片，失败后按指数退避加抖动重试，重启后继续投递。
+
+    写操作先进入内存缓冲，由后台任务按 flush_interval / batch_size 合并成一个事务提交，
+    WAL + synchronous=NORMAL 下不会为每条 webhook 单独 fsync。在同一批次内就已发送成功的
+    条目不会落盘。多个 worker 进程共用同一个文件时，条目以租期方式被认领，不会被重复发送。
+    """
+
+    def __init__(self, sender, options=None):
+        self.options = dict(DEFAULT_OUTBOX_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._sender = sender
+        self._conn = None
+        self._db_lock = asyncio.Lock()
+        self._buffer = {}        # id -> 待写入的行 (tuple)，None 表示删除
+        self._unflushed = set()  # 新增后尚未落盘的 id
+        self._inflight = set()
+        self._leased = {}        # id -> 本进程持有租期、正在排队或发送的条目
+        self._tasks = set()
+        self._flush_wakeup = None
+        self._flusher = None
+        self._poller = None
+        self._retry_semaphore = None
+        self._status_counts = {}  # 各状态的条目数，每次提交后重新统计
+        self._writing = 0         # 正在提交的写操作数
+        self._added = 0
+        self._sent = 0
+        self._retried = 0
+        self._dead = 0
+        self._parked = 0
+        self._renewed = 0
+
+    def _connect(self):
+        check_local_sqlite_path(self.options["path"], "发件箱")
+        conn = sqlite3.connect(self.options["path"], check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        # 旧版本创建的 outbox 表没有 message_key 列
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+        if "message_key" not in columns:
+            conn.execute("ALTER TABLE outbox ADD COLUMN message_key TEXT")
+        return conn
+
+    async def start(self):
+        if self._conn is not None:
+            return
+        self._conn = await asyncio.to_thread(self._connect)
+        self._flush_wakeup = asyncio.Event()
+        self._retry_semaphore = asyncio.Semaphore(self.options["retry_concurrency"])
+        self._flusher = asyncio.create_task(self._flush_loop(), name="outbox-flusher")
+        self._poller = asyncio.create_task(self._poll_loop(), name="outbox-poller")
+        await self._refresh_status_counts()
+        pending = self._status_counts.get("pending", 0)
+        logger.info(f"发件箱已打开: {self.options['path']}，待投递 {pending} 条")
+
+    async def stop(self):
+        if self._conn is None:
+            return
+        for task in (self._poller, self._flusher):
+            task.cancel()
+        await asyncio.gather(self._poller, self._flusher, return_exceptions=True)
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=10)
+        await self.flush()
+        conn, self._conn = self._conn, None
+        await asyncio.to_thread(conn.close)
+        logger.info("发件箱已关闭")
+
+    def add(self, chat_id, msg_type, content, repo_name=None, message_key=None):
+        """记录一条待发送的消息并返回条目，落盘由后台批量提交完成。
+
+        新条目由当前进程立即发送，next_attempt_at 设为租期到期时间；进程在发送前崩溃时，
+        条目会在租期过后被重新投递。message_key 不为空时表示这是一张可更新的卡片。
+        """
+        now = time.time()
+        entry = {
+            "id": uuid.uuid4().hex,
+            "chat_id": chat_id,
+            "msg_type": msg_type,
+            "content": content,
+            "repo_name": repo_name,
+            "attempts": 0,
+            "status": "pending",
+            "next_attempt_at": now + self.options["claim_lease"],
+            "created_at": now,
+            "last_error": None,
+            "message_key": message_key,
+        }
+        self._buffer_put(entry)
+        self._unflushed.add(entry["id"])
+        self._leased[entry["id"]] = entry
+        self._added += 1
+        return entry
+
+    async def deliver(self, entry):
+        """尝试发送一次，根据结果删除条目或安排下一次重试；成功时返回 True"""
+        if entry["id"] in self._inflight:
+            return False
+        self._inflight.add(entry["id"])
+        try:
+            await self._sender(entry)
+        except Exception as e:
+            retryable = getattr(e, "retryable", True)
+            self._mark_failed(entry, e, retryable)
+            return False
+        else:
+            self._mark_sent(entry)
+            return True
+        finally:
+            self._inflight.discard(entry["id"])
+            self._leased.pop(entry["id"], None)
+
+    def _buffer_put(self, entry):
+        self._buffer[entry["id"]] = tuple(entry[c] for c in _COLUMNS)
+        self._maybe_wake_flusher()
+
+    def _maybe_wake_flusher(self):
+        if self._flush_wakeup is not None and len(self._buffer) >= self.options["batch_size"]:
+            self._flush_wakeup.set()
+
+    def _mark_sent(self, entry):
+        self._sent += 1
+        if entry["id"] in self._unflushed:
+            # 还没落盘就已发送成功，直接丢弃缓冲中的写入
+            self._unflushed.discard(entry["id"])
+            self._buffer.pop(entry["id"], None)
+        else:
+            self._buffer[entry["id"]] = None
+            self._maybe_wake_flusher()
+
+    def _mark_failed(self, entry, error, retryable):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            # 飞书熔断中，消息没有发出：搁置到可以试探之后，加上抖动避免同时涌出
+            entry["next_attempt_at"] = time.time() + retry_after + random.uniform(0, self.options["base_delay"])
+            self._parked += 1
+            logger.debug(f"发件箱条目 {entry['id']} 搁置 {retry_after:.1f} 秒: {error}")
+            self._buffer_put(entry)
+            return
+        entry["attempts"] += 1
+        entry["last_error"] = str(error)[:500]
+        if not retryable or entry["attempts"] >= self.options["max_attempts"]:
+            entry["status"] = "dead"
+            self._dead += 1
+            logger.error(
+                f"发件箱条目 {entry['id']} (项目 {entry['repo_name']}, 群组 {entry['chat_id']}) "
+                f"在第 {entry['attempts']} 次尝试后放弃: {error}"
+            )
+        else:
+            delay = self.backoff_delay(entry["attempts"])
+            entry["next_attempt_at"] = time.time() + delay
+            self._retried += 1
+            logger.warning(
+                f"发件箱条目 {entry['id']} (项目 {entry['repo_name']}, 群组 {entry['chat_id']}) "
+                f"第 {entry['attempts']} 次发送失败，{delay:.1f} 秒后重试: {error}"
+            )
+        self._buffer_put(entry)
+
+    def backoff_delay(self, attempts):
+        """指数退避加抖动：取上限的一半作为固定部分，另一半随机"""
+        delay = min(self.options["max_delay"], self.options["base_delay"] * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def flush(self):
+        """把缓冲中的写操作合并成一个事务提交，并重新统计各状态的条目数"""
+        if not self._buffer or self._conn is None:
+            return
+        async with self._db_lock:
+            ops, self._buffer = self._buffer, {}
+            self._unflushed.clear()
+            self._writing = len(ops)
+            puts = [row for row in ops.values() if row is not None]
+            deletes = [(entry_id,) for entry_id, row in ops.items() if row is None]
+            try:
+                self._status_counts = await asyncio.to_thread(self._write_batch, puts, deletes)
+            except sqlite3.Error as e:
+                logger.error(f"发件箱批量提交失败，{len(ops)} 个写操作将在下次重试: {e}")
+                for entry_id, row in ops.items():
+                    self._buffer.setdefault(entry_id, row)
+            finally:
+                self._writing = 0
+
+    def _write_batch(self, puts, deletes):
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            if puts:
+                conn.executemany(_UPSERT_SQL, puts)
+            if deletes:
+                conn.executemany("DELETE FROM outbox WHERE id = ?", deletes)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self._count_by_status()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.options["flush_interval"])
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+
+    def _claim_due(self, now, limit):
+        """在一个写事务中取出到期条目并顺延其租期，其他进程不会再取到同一批条目"""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(now + self.options["claim_lease"], row[0]) for row in rows],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def _renew_leases(self, now):
+        """仍在本进程排队（等待限流配额、重试名额）或发送中的条目，租期过半时续期，
+        避免共用发件箱的其他进程在租期到期后取走并重复发送"""
+        lease = self.options["claim_lease"]
+        for entry in self._leased.values():
+            if entry["status"] == "pending" and entry["next_attempt_at"] - now < lease / 2:
+                entry["next_attempt_at"] = now + lease
+                self._buffer_put(entry)
+                self._renewed += 1
+
+    def _count_by_status(self):
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    async def _refresh_status_counts(self):
+        async with self._db_lock:
+            self._status_counts = await asyncio.to_thread(self._count_by_status)
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.options["poll_interval"])
+            self._renew_leases(time.time())
+            try:
+                await self.flush()
+                async with self._db_lock:
+                    due = await asyncio.to_thread(
+                        self._claim_due, time.time(), self.options["batch_size"]
+                    )
+                    self._status_counts = await asyncio.to_thread(self._count_by_status)
+            except sqlite3.Error as e:
+                logger.error(f"扫描发件箱重试任务失败: {e}")
+                continue
+            for entry in due:
+                # 缓冲中有更新的状态（例如刚刚发送成功）时以内存为准
+                if entry["id"] in self._inflight or entry["id"] in self._buffer:
+                    continue
+                self._leased[entry["id"]] = entry
+                task = asyncio.create_task(self._retry(entry))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _retry(self, entry):
+        async with self._retry_semaphore:
+            if await self.deliver(entry):
+                logger.info(
+                    f"发件箱条目 {entry['id']} (项目 {entry['repo_name']}) 在第 {entry['attempts'] + 1} 次尝试时发送成功"
+                )
+
+    def stats(self):
+        return {
+            "path": self.options["path"],
+            "pending": self._status_counts.get("pending", 0),
+            "dead": self._status_counts.get("dead", 0),
+            "buffered_writes": len(self._buffer) + self._writing,
+            "inflight": len(self._inflight),
+            "leased": len(self._leased),
+            "lease_renewals": self._renewed,
+            "added": self._added,
+            "sent": self._sent,
+            "retried": self._retried,
+            "given_up": self._dead,
+            "parked": self._parked,
+        }
@@ -0,0 +1,157 @@
+import json
+import logging
+import typing
+
+from event_handlers import extract_fields
+
+try:
+    import msgspec
+except ImportError:  # msgspec 为可选依赖，未安装时退回 orjson / 标准库
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 请求体解析默认配置，可通过 feishu_config.json 的 "payload" 覆盖
+DEFAULT_PAYLOAD_OPTIONS = {
+    "max_body_bytes": 25 * 1024 * 1024,  # 请求体上限，超出时返回 413；默认与 GitHub 的负载上限 (25 MB) 相同，GitHub 发出的投递都能接收
+    "parser": "auto",                   # auto / msgspec / orjson / json；auto 按可用性依次选择
+}
+
+
+class PayloadTooLarge(Exception):
+    def __init__(self, size, limit):
+        super().__init__(f"请求体 {size} 字节超过上限 {limit} 字节")
+        self.size = size
+        self.limit = limit
+
+
+class PayloadError(ValueError):
+    """请求体不是有效的 JSON 对象"""
+
+
+async def read_body(request, max_bytes):
+    """读取请求体，超过 max_bytes 时抛出 PayloadTooLarge。
+
+    有 Content-Length 时在读取之前就拒绝；没有时（分块传输）边读边计数，超出后立即停止读取。
+    """
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+        raise PayloadTooLarge(int(declared), max_bytes)
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise PayloadTooLarge(size, max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _field_type(name, spec):
+    """把处理器的字段声明转换为 msgspec 的类型：未声明的字段解码时直接跳过，不构建对象"""
+    if spec is None:
+        return typing.Any
+    struct = _struct_type(name, spec)
+    # 字段可能是对象、对象列表或 null
+    return typing.Union[struct, typing.List[struct], None, msgspec.UnsetType]
+
+
+def _struct_type(name, spec):
+    if not isinstance(spec, dict):
+        spec = dict.fromkeys(spec)
+    return msgspec.defstruct(
+        name,
+        [(key, _field_type(f"{name}_{key}", sub), msgspec.UNSET) for key, sub in spec.items()],
+        gc=False,
+    )
+
+
+class PayloadParser:
+    """按处理器声明的字段解析 GitHub 负载，返回与 EventHandler.extract 相同的精简字典。
+
+    安装了 msgspec 时为每个处理器生成 __slots__ 结构体并做类型化解码，未声明的字段
+    （例如每个提交的 added/modified/removed 文件列表）在解码时被跳过，内存与耗时基本不随负载大小增长；
+    否则用 orjson（或标准库）完整解析后再裁剪。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_PAYLOAD_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.backend = self._choose_backend(self.options["parser"])
+        self._decoders = {}
+        self.fallbacks = 0
+        self.too_large = 0
+
+    @staticmethod
+    def _choose_backend(preferred):
+        available = {"msgspec": msgspec is not None, "orjson": orjson is not None, "json": True}
+        if preferred != "auto":
+            if available.get(preferred):
+                return preferred
+            logger.warning(f"请求体解析器 {preferred} 不可用，改为自动选择")
+        return next(name for name in ("msgspec", "orjson", "json") if available[name])
+
+    @property
+    def max_body_bytes(self):
+        return self.options["max_body_bytes"]
+
+    async def read_body(self, request):
+        try:
+            return await read_body(request, self.max_body_bytes)
+        except PayloadTooLarge:
+            self.too_large += 1
+            raise
+
+    def _loads(self, raw_body):
+        try:
+            if orjson is not None and self.backend != "json":
+                payload = orjson.loads(raw_body)
+            else:
+                payload = json.loads(raw_body)
+        except ValueError as e:
+            raise PayloadError(str(e)) from e
+        if not isinstance(payload, dict):
+            raise PayloadError("负载不是 JSON 对象")
+        return payload
+
+    def _decoder(self, handler):
+        decoder = self._decoders.get(handler.event)
+        if decoder is None:
+            # action 总是解码，用于判断处理器是否处理该 action
+            spec = {"action": None, **handler.fields}
+            decoder = self._decoders[handler.event] = msgspec.json.Decoder(_struct_type(f"{handler.event}_payload", spec))
+        return decoder
+
+    def parse(self, raw_body, handler=None):
+        """解析请求体；给出处理器时只返回其声明的字段（外加 action）"""
+        if handler is None:
+            return self._loads(raw_body)
+        if self.backend == "msgspec":
+            try:
+                decoded = self._decoder(handler).decode(raw_body)
+            except msgspec.ValidationError:
+                # 字段类型与声明不符（例如本应是对象的字段是字符串），退回完整解析
+                self.fallbacks += 1
+            except msgspec.DecodeError as e:
+                raise PayloadError(str(e)) from e
+            else:
+                return {key: value for key, value in msgspec.to_builtins(decoded).items() if value is not None}
+        payload = self._loads(raw_body)
+        slim = extract_fields(payload, handler.fields)
+        if payload.get("action") is not None:
+            slim["action"] = payload["action"]
+        return slim
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "max_body_bytes": self.max_body_bytes,
+            "too_large": self.too_large,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,203 @@
+import asyncio
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 发送限流默认配置，可通过 feishu_config.json 的 "rate_limit" 覆盖。
+# 飞书对同一群组的机器人消息限制为 5 QPS，发送消息接口应用级别约为 50 QPS
+DEFAULT_RATE_LIMIT_OPTIONS = {
+    "per_chat_rate": 5,             # 每个群组每秒可发送的消息数
+    "per_chat_burst": 5,            # 每个群组允许的突发数量
+    "per_app_rate": 50,             # 整个应用每秒可发送的消息数
+    "per_app_burst": 50,
+    "backoff_factor": 0.5,          # 被飞书限流后速率乘以该系数
+    "min_rate_ratio": 0.1,          # 自适应降速的下限（相对配置速率）
+    "recovery_step": 0.05,          # 每次发送成功后恢复的速率（相对配置速率）
+    "default_retry_after": 1,       # 飞书未给出重置时间时的暂停秒数
+    "max_rate_limit_retries": 5,    # 单条消息被限流后在本地重试的次数，超过后交给发件箱退避
+    "idle_bucket_ttl": 600,         # 空闲群组的限流状态保留秒数
+}
+
+
+class TokenBucket:
+    """令牌桶：按 rate 匀速补充，最多积攒 burst 个；被限流后暂停并自适应降速"""
+
+    def __init__(self, rate, burst):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0
+
+    def _refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now):
+        """距离可以取出一个令牌还需等待的秒数"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def penalize(self, now, retry_after, factor, min_ratio):
+        self.rate = max(self.base_rate * min_ratio, self.rate * factor)
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.tokens = 0
+        self.updated_at = max(now, self.blocked_until)
+
+    def reward(self, step):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * step)
+
+    def idle(self, now):
+        return self.rate >= self.base_rate and now >= self.blocked_until and self.wait_time(now) == 0 \
+            and self.tokens >= self.burst
+
+
+class SendScheduler:
+    """发送调度器：每个群组和整个应用各有一个令牌桶，超出配额的发送排队等待而不是丢弃。
+
+    等待中的群组按轮转顺序获得发送机会，一个刷屏的仓库只会占满自己群组的配额，不会饿死其他群组。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_RATE_LIMIT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._app_bucket = TokenBucket(self.options["per_app_rate"], self.options["per_app_burst"])
+        self._chat_buckets = {}
+        self._last_used = {}
+        self._waiting = collections.OrderedDict()  # chat_id -> deque[Future]，按轮转顺序排列
+        self._wakeup = None
+        self._dispatcher = None
+        self._granted = 0
+        self._rate_limited = 0
+        self._last_prune = time.monotonic()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.options["per_chat_rate"], self.options["per_chat_burst"])
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def acquire(self, chat_id):
+        """等待直到可以向 chat_id 发送一条消息"""
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop(), name="send-scheduler")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(chat_id, collections.deque()).append(future)
+        self._wakeup.set()
+        await future
+
+    def _grant_next(self, now):
+        """按轮转顺序放行一个请求；没有可放行的请求时返回需要等待的秒数"""
+        app_wait = self._app_bucket.wait_time(now)
+        if app_wait > 0:
+            return app_wait
+        next_wait = None
+        for chat_id in list(self._waiting):
+            queue = self._waiting[chat_id]
+            while queue and queue[0].done():
+                queue.popleft()  # 调用者已取消
+            if not queue:
+                del self._waiting[chat_id]
+                continue
+            bucket = self._chat_bucket(chat_id)
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                continue
+            bucket.take(now)
+            self._app_bucket.take(now)
+            self._last_used[chat_id] = now
+            queue.popleft().set_result(None)
+            self._granted += 1
+            # 放行后移到队尾，让其他群组先发
+            if queue:
+                self._waiting.move_to_end(chat_id)
+            else:
+                del self._waiting[chat_id]
+            return 0
+        return next_wait
+
+    async def _dispatch_loop(self):
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                self._prune(time.monotonic())
+                await self._wakeup.wait()
+                continue
+            wait = self._grant_next(time.monotonic())
+            if wait is None:
+                continue
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    # 有新的群组加入时提前醒来，它可能不受当前等待的桶限制
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # 让出事件循环，避免长时间连续放行时阻塞其他任务
+                await asyncio.sleep(0)
+
+    def _prune(self, now):
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        ttl = self.options["idle_bucket_ttl"]
+        for chat_id in [c for c, t in self._last_used.items() if now - t > ttl]:
+            bucket = self._chat_buckets.get(chat_id)
+            if chat_id not in self._waiting and (bucket is None or bucket.idle(now)):
+                self._chat_buckets.pop(chat_id, None)
+                self._last_used.pop(chat_id, None)
+
+    def report_rate_limited(self, chat_id, app_level=False, retry_after=None):
+        """飞书返回限流时调用：暂停该群组（应用级限流时暂停整个应用）并降低其发送速率"""
+        self._rate_limited += 1
+        now = time.monotonic()
+        retry_after = retry_after or self.options["default_retry_after"]
+        factor = self.options["backoff_factor"]
+        min_ratio = self.options["min_rate_ratio"]
+        bucket = self._app_bucket if app_level else self._chat_bucket(chat_id)
+        bucket.penalize(now, retry_after, factor, min_ratio)
+        scope = "整个应用" if app_level else f"群组 {chat_id}"
+        logger.warning(f"飞书返回限流 ({scope})，暂停 {retry_after} 秒，发送速率降至 {bucket.rate:.2f}/秒")
+
+    def report_success(self, chat_id):
+        """发送成功时调用，逐步恢复被降低的速率"""
+        step = self.options["recovery_step"]
+        self._app_bucket.reward(step)
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is not None:
+            bucket.reward(step)
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    def stats(self):
+        return {
+            "waiting": sum(len(q) for q in self._waiting.values()),
+            "waiting_chats": len(self._waiting),
+            "tracked_chats": len(self._chat_buckets),
+            "app_rate": round(self._app_bucket.rate, 2),
+            "throttled_chats": sum(1 for b in self._chat_buckets.values() if b.rate < b.base_rate),
+            "granted": self._granted,
+            "rate_limited": self._rate_limited,
+        }
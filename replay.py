@@ -0,0 +1,293 @@
+"""从本地存档重放 GitHub webhook 投递，用于服务故障后补发错过的通知。
+
+    python replay.py deliveries.jsonl [--parallelism 8] [--rate 20] [--dry-run --output cards.jsonl]
+
+存档每行一条投递，可以是 {"headers": {...}, "body": {...} 或 "原始请求体"}，也可以是 GitHub
+"Get a delivery for a repository webhook" 接口返回的 {"guid", "event", "request": {"headers", "payload"}}。
+事件经过与 /webhook/github 相同的解析、路由、渲染与发件箱发送流程；已经处理过的投递（去重索引中的
+X-GitHub-Delivery）会被跳过。进度定期写入检查点文件，中断后再次运行同一命令会从检查点继续。
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+
+import main
+from payload_parser import PayloadError
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger("replay")
+
+
+def _header(headers, name):
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+
+def parse_record(line):
+    """解析存档中的一行，返回 (事件类型, 投递ID, 原始请求体)，格式不对时抛出 ValueError"""
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("存档记录不是 JSON 对象")
+    request = record.get("request") or record
+    headers = request.get("headers") or {}
+    body = request["body"] if "body" in request else request.get("payload")
+    if body is None:
+        raise ValueError("存档记录缺少请求体")
+    if isinstance(body, str):
+        raw_body = body.encode("utf-8")
+    else:
+        raw_body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    event_type = _header(headers, "X-GitHub-Event") or record.get("event")
+    delivery_id = _header(headers, "X-GitHub-Delivery") or record.get("guid")
+    return event_type, delivery_id, raw_body
+
+
+class Checkpoint:
+    """重放进度：next_line 之前的行都已处理完，done 为 next_line 之后已处理完的行（并行时会乱序完成）"""
+
+    def __init__(self, path, archive):
+        self.path = path
+        self.archive = os.path.abspath(archive)
+        self.next_line = 0
+        self.done = set()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("archive") != self.archive:
+            raise ValueError(f"检查点 {self.path} 属于另一个存档: {data.get('archive')}")
+        self.next_line = data.get("next_line", 0)
+        self.done = set(data.get("done", []))
+        return True
+
+    def is_done(self, index):
+        return index < self.next_line or index in self.done
+
+    def mark(self, index):
+        self.done.add(index)
+        while self.next_line in self.done:
+            self.done.remove(self.next_line)
+            self.next_line += 1
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"archive": self.archive, "next_line": self.next_line, "done": sorted(self.done),
+                       "saved_at": time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class Replayer:
+    """读取存档并按仓库分派给并行的 worker：同一仓库的事件由同一个 worker 按存档顺序发送"""
+
+    def __init__(self, archive, parallelism=8, rate=0, dry_run=False, checkpoint=None, output=None):
+        self.archive = archive
+        self.parallelism = max(1, parallelism)
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.output = output
+        self.bucket = TokenBucket(rate, max(1, rate)) if rate else None
+        self.counts = collections.Counter()
+        self.started_at = None
+        self._queued_ids = set()
+
+    async def _pace(self):
+        """按 --rate 限制每秒发送的事件数（飞书的群组与应用限流另由发送调度器保证）"""
+        if self.bucket is None:
+            return
+        while True:
+            wait = self.bucket.wait_time(time.monotonic())
+            if wait <= 0:
+                self.bucket.take(time.monotonic())
+                return
+            await asyncio.sleep(wait)
+
+    def _finish(self, index, outcome):
+        self.counts[outcome] += 1
+        if self.checkpoint is not None:
+            self.checkpoint.mark(index)
+
+    async def _prepare(self, event_type, delivery_id, raw_body):
+        """去重、解析与路由，返回 (结果, 投递任务)；不需要发送时任务为 None"""
+        if event_type == "ping" or not main.event_registry.handles_event(event_type):
+            return "ignored", None
+        # 只查询不记录：投递在真正发出之后才记入去重索引，中断后从检查点继续时不会漏发
+        if delivery_id:
+            if delivery_id in self._queued_ids or await main.dedup_index.seen(f"github:{delivery_id}"):
+                return "duplicate", None
+            self._queued_ids.add(delivery_id)
+        try:
+            payload = main.payload_parser.parse(raw_body, main.event_registry.get(event_type))
+        except PayloadError as e:
+            logger.error(f"无法解析投递 {delivery_id} 的负载: {e}")
+            return "invalid", None
+        handler = main.event_registry.handler_for(event_type, payload.get("action"))
+        if handler is None:
+            return "ignored", None
+        repo_name = payload.get("repository", {}).get("full_name", "未知仓库")
+        _, chat_ids = main.route_event(repo_name, event_type, handler.branch(payload))
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id]
+        if not chat_ids:
+            return "filtered", None
+        return None, {
+            "delivery_id": delivery_id,
+            "event_type": event_type,
+            "repo_name": repo_name,
+            "chat_ids": chat_ids,
+            "payload": payload,
+        }
+
+    async def _send(self, index, job):
+        if self.dry_run:
+            handler = main.event_registry.get(job["event_type"])
+            content = handler.render(job["payload"], job["repo_name"])
+            if self.output is not None:
+                self.output.write(json.dumps({
+                    "line": index + 1, "delivery_id": job["delivery_id"], "event": job["event_type"],
+                    "repo": job["repo_name"], "chat_ids": job["chat_ids"], "card": json.loads(content),
+                }, ensure_ascii=False) + "\n")
+            return "rendered"
+        await self._pace()
+        # 发送失败的群组留在发件箱中，由本进程或正在运行的服务按退避继续重试
+        sent = await main.deliver_github_event(job)
+        if job["delivery_id"]:
+            await main.dedup_index.check_and_mark(f"github:{job['delivery_id']}")
+        return "sent" if sent else "retrying"
+
+    async def _worker(self, queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, job = item
+            try:
+                outcome = await self._send(index, job)
+            except Exception as e:
+                logger.error(f"重放第 {index + 1} 行 ({job['delivery_id']}) 失败: {e}", exc_info=True)
+                outcome = "error"
+            self._finish(index, outcome)
+
+    async def _report_progress(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            if self.checkpoint is not None and not self.dry_run:
+                self.checkpoint.save()
+            logger.info(f"重放进度: {self.summary()}")
+
+    async def run(self, progress_interval=5):
+        self.started_at = time.monotonic()
+        queues = [asyncio.Queue(maxsize=2 * self.parallelism) for _ in range(self.parallelism)]
+        workers = [asyncio.create_task(self._worker(queue)) for queue in queues]
+        reporter = asyncio.create_task(self._report_progress(progress_interval))
+        try:
+            with open(self.archive, encoding="utf-8") as f:
+                for index, line in enumerate(f):
+                    if not line.strip():
+                        continue
+                    if self.checkpoint is not None and self.checkpoint.is_done(index):
+                        self.counts["resumed"] += 1
+                        continue
+                    try:
+                        event_type, delivery_id, raw_body = parse_record(line)
+                    except (ValueError, KeyError) as e:
+                        logger.error(f"存档第 {index + 1} 行格式无效: {e}")
+                        self._finish(index, "invalid")
+                        continue
+                    try:
+                        outcome, job = await self._prepare(event_type, delivery_id, raw_body)
+                    except Exception as e:
+                        logger.error(f"处理存档第 {index + 1} 行 ({delivery_id}) 失败: {e}", exc_info=True)
+                        outcome, job = "error", None
+                    if job is None:
+                        self._finish(index, outcome)
+                        continue
+                    # 按仓库分派，同一仓库的卡片保持存档中的先后顺序
+                    worker = zlib.crc32(job["repo_name"].encode("utf-8")) % self.parallelism
+                    await queues[worker].put((index, job))
+            for queue in queues:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+            if self.checkpoint is not None and not self.dry_run:
+                self.checkpoint.save()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        processed = sum(count for outcome, count in self.counts.items() if outcome != "resumed")
+        return {
+            **self.counts,
+            "processed": processed,
+            "elapsed": round(elapsed, 1),
+            "per_second": round(processed / elapsed, 1) if elapsed else None,
+        }
+
+
+async def replay(args, checkpoint):
+    sending = not args.dry_run
+    await main.start_components(sending=sending)
+    if not main.dedup_index.stats()["persistent"]:
+        logger.warning("去重索引未开启持久化 (dedup.persistent)，无法跳过正在运行的服务已经处理过的投递")
+    if checkpoint is not None and checkpoint.next_line:
+        logger.info(f"从检查点 {checkpoint.path} 继续：第 {checkpoint.next_line + 1} 行起")
+    output = None
+    if args.output == "-":
+        output = sys.stdout
+    elif args.output:
+        output = open(args.output, "w", encoding="utf-8")
+    replayer = Replayer(args.archive, args.parallelism, args.rate, args.dry_run, checkpoint, output)
+    try:
+        await replayer.run(args.progress_interval)
+    finally:
+        if output is not None and output is not sys.stdout:
+            output.close()
+        await main.stop_components(sending=sending)
+    return replayer.summary()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("archive", help="投递存档（JSONL）")
+    parser.add_argument("--config", default=main.APP_CONFIG_FILE, help="配置文件路径")
+    parser.add_argument("--parallelism", type=int, default=8, help="并行发送的 worker 数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒最多重放的事件数，0 表示只受飞书限流配置约束")
+    parser.add_argument("--dry-run", action="store_true", help="只解析、路由并渲染卡片，不发送也不记录去重与检查点")
+    parser.add_argument("--output", default=None, help="试运行时把渲染的卡片写入该 JSONL 文件，- 表示标准输出")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件路径，默认为 <存档>.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="忽略已有检查点，从头重放")
+    parser.add_argument("--progress-interval", type=float, default=5, help="输出进度并保存检查点的间隔秒数")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.archive):
+        sys.exit(f"存档 {args.archive} 不存在")
+    checkpoint = None
+    if not args.dry_run:
+        checkpoint = Checkpoint(args.checkpoint or f"{args.archive}.checkpoint", args.archive)
+        try:
+            if not args.restart:
+                checkpoint.load()
+        except ValueError as e:
+            sys.exit(str(e))
+    main.create_app(args.config)
+    if not main.CONFIG_SUCCESSFULLY_LOADED:
+        sys.exit(f"无法加载配置文件 {args.config}")
+    try:
+        summary = asyncio.run(replay(args, checkpoint))
+    except KeyboardInterrupt:
+        sys.exit("重放已中断，再次运行相同的命令会从检查点继续")
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr if args.output == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,182 @@
+import fnmatch
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_GLOB_CHARS = frozenset("*?[")
+_REGEX_PREFIX = "re:"
+
+
+def parse_chat_ids(entry, app=None):
+    """规则的值可以是群组ID字符串、带 chat_id 的配置字典，或由它们组成的列表（同时发送到多个群组）。
+
+    配置字典中的 app 指定用哪个飞书应用发送，群组ID会写成 "应用名:群组ID"；也可以直接这样书写群组ID。
+    """
+    if not entry:
+        return []
+    if isinstance(entry, list):
+        chat_ids = []
+        for target in entry:
+            for chat_id in parse_chat_ids(target, app):
+                if chat_id not in chat_ids:
+                    chat_ids.append(chat_id)
+        return chat_ids
+    if isinstance(entry, dict):
+        return parse_chat_ids(entry.get("chat_id"), entry.get("app") or app)
+    if app and app != "default" and ":" not in entry:
+        return [f"{app}:{entry}"]
+    return [entry]
+
+
+def _has_glob(text):
+    return any(c in _GLOB_CHARS for c in text)
+
+
+class _GlobSet:
+    """分支名的匹配集合：不含通配符的项走哈希，其余合并成一个正则"""
+
+    __slots__ = ("exact", "regex")
+
+    def __init__(self, patterns):
+        self.exact = frozenset(p for p in patterns if not _has_glob(p))
+        globs = [fnmatch.translate(p) for p in patterns if _has_glob(p)]
+        self.regex = re.compile("|".join(globs)) if globs else None
+
+    def match(self, value):
+        return value in self.exact or (self.regex is not None and self.regex.match(value) is not None)
+
+
+class RouteRule:
+    """project_chat_mapping 中的一条规则。
+
+    值为字典时可以带 branches（分支名或通配符列表）与 events（事件类型列表）过滤条件，
+    fallthrough 为 true 时被过滤掉的事件仍可以落到 default，
+    其余字段（例如 coalesce_window）作为该规则的附加配置。
+    """
+
+    __slots__ = ("pattern", "kind", "chat_ids", "settings", "branches", "events", "fallthrough")
+
+    def __init__(self, pattern, kind, entry):
+        self.pattern = pattern
+        self.kind = kind
+        self.chat_ids = parse_chat_ids(entry)
+        self.settings = entry if isinstance(entry, dict) else {}
+        branches = self.settings.get("branches")
+        events = self.settings.get("events")
+        self.branches = _GlobSet(branches) if branches else None
+        self.events = frozenset(events) if events else None
+        self.fallthrough = bool(self.settings.get("fallthrough"))
+
+    def accepts(self, event_type, branch):
+        """事件是否满足过滤条件；没有分支概念的事件（branch 为 None，例如 release、issues）不受分支过滤，
+        有 ref 但不是分支的事件（branch 为空字符串，例如推送标签）不满足分支过滤"""
+        if self.events is not None and event_type not in self.events:
+            return False
+        if self.branches is not None and branch is not None and not (branch and self.branches.match(branch)):
+            return False
+        return True
+
+    def describe(self):
+        return {
+            "pattern": self.pattern,
+            "kind": self.kind,
+            "chat_ids": self.chat_ids,
+            "branches": self.settings.get("branches"),
+            "events": self.settings.get("events"),
+            "fallthrough": self.fallthrough,
+        }
+
+
+class RouteResult:
+    __slots__ = ("rule", "skipped")
+
+    def __init__(self, rule, skipped):
+        self.rule = rule          # 命中的规则，None 表示没有规则命中
+        self.skipped = skipped    # 仓库名匹配但被分支/事件过滤掉的规则
+
+
+class ProjectRouter:
+    """把 project_chat_mapping 在加载时编译成路由索引。
+
+    键的写法：
+      "owner/repo"         精确匹配，哈希查找
+      "owner/*"、"owner/svc-*"   只在末尾有 * 的前缀匹配，按前缀长度从长到短查找
+      "*/docs"、"owner/*-api"    其他通配符，转换为正则后按配置顺序匹配
+      "re:^owner/(a|b)$"   正则，按配置顺序匹配
+      "default"            以上都不匹配时使用
+    仓库名不区分大小写。按以上顺序取第一条满足分支/事件过滤条件的规则；
+    仓库名匹配了某条规则但都被过滤掉时不再使用 default（除非这些规则都设置了 fallthrough），
+    避免按分支/事件收窄的仓库的其他事件被发到默认群组。
+    """
+
+    def __init__(self, mapping=None):
+        self._exact = {}
+        self._prefixes = {}
+        self._prefix_lengths = ()
+        self._patterns = []
+        self.default = None
+        self.rule_count = 0
+        if isinstance(mapping, (str, list)):
+            # 只配置了一个（或一组）群组时所有仓库都发送到这里
+            mapping = {"default": mapping}
+        for key, entry in (mapping or {}).items():
+            try:
+                self._add(key, entry)
+            except re.error as e:
+                logger.error(f"路由规则 {key} 不是有效的正则表达式，已忽略: {e}")
+        self._prefix_lengths = tuple(sorted({len(p) for p in self._prefixes}, reverse=True))
+
+    def _add(self, key, entry):
+        if key == "default":
+            self.default = RouteRule(key, "default", entry)
+        elif key.startswith(_REGEX_PREFIX):
+            regex = re.compile(key[len(_REGEX_PREFIX):], re.IGNORECASE)
+            self._patterns.append((regex, RouteRule(key, "regex", entry)))
+        elif not _has_glob(key):
+            self._exact[key.lower()] = RouteRule(key, "exact", entry)
+        elif key.endswith("*") and not _has_glob(key[:-1]):
+            self._prefixes.setdefault(key[:-1].lower(), []).append(RouteRule(key, "prefix", entry))
+        else:
+            regex = re.compile(fnmatch.translate(key.lower()))
+            self._patterns.append((regex, RouteRule(key, "glob", entry)))
+        self.rule_count += 1
+
+    @property
+    def empty(self):
+        return self.rule_count == 0
+
+    def candidates(self, repo_name):
+        """按优先级依次给出仓库名匹配的规则，不含 default"""
+        name = repo_name.lower()
+        rule = self._exact.get(name)
+        if rule is not None:
+            yield rule
+        for length in self._prefix_lengths:
+            if length <= len(name):
+                yield from self._prefixes.get(name[:length], ())
+        for regex, rule in self._patterns:
+            if (regex.fullmatch(repo_name) if rule.kind == "regex" else regex.match(name)):
+                yield rule
+
+    def route(self, repo_name, event_type=None, branch=None):
+        skipped = []
+        for rule in self.candidates(repo_name):
+            if rule.accepts(event_type, branch):
+                return RouteResult(rule, skipped)
+            skipped.append(rule)
+        if self.default is None or not all(rule.fallthrough for rule in skipped):
+            return RouteResult(None, skipped)
+        if self.default.accepts(event_type, branch):
+            return RouteResult(self.default, skipped)
+        skipped.append(self.default)
+        return RouteResult(None, skipped)
+
+    def stats(self):
+        return {
+            "rules": self.rule_count,
+            "exact": len(self._exact),
+            "prefix": sum(len(rules) for rules in self._prefixes.values()),
+            "patterns": len(self._patterns),
+            "default": self.default is not None,
+        }
@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import hmac
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_GITHUB_SIGNATURE_PREFIX = "sha256="
+_HEX_DIGITS = frozenset("0123456789abcdef")
+_REPOSITORY_PATTERN = re.compile(rb'"repository"\s*:\s*\{')
+_FULL_NAME_PATTERN = re.compile(rb'"full_name"\s*:\s*"([^"\\]{1,200})"')
+# repository 对象中 full_name 位于 id、node_id、name 之后，只在其后这么多字节内查找
+_FULL_NAME_WINDOW = 1024
+
+
+def peek_repository(raw_body):
+    """不解析 JSON，从请求体中读取第一个 repository 对象的 full_name，找不到时返回 None。
+
+    GitHub 负载中第一个 "repository" 对象就是事件所属的仓库（workflow_run 等事件里嵌套的
+    repository 也是同一个仓库，fork 仓库在 head_repository / repo 中）。结果只用于选择校验签名的密钥，
+    解析负载后还会再与 repository.full_name 核对。
+    """
+    match = _REPOSITORY_PATTERN.search(raw_body)
+    if match is None:
+        return None
+    name = _FULL_NAME_PATTERN.search(raw_body, match.end(), match.end() + _FULL_NAME_WINDOW)
+    if name is None:
+        return None
+    try:
+        return name.group(1).decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+class GitHubSignatureVerifier:
+    """校验 GitHub 的 X-Hub-Signature-256。
+
+    secrets 为 {"owner/repo": secret, "default": secret}：仓库有专用密钥时必须用它签名，
+    否则必须用 default 密钥签名。签名在解析 JSON 之前基于原始请求体校验：先从请求体中读出仓库名，
+    只用该仓库应当使用的那一个密钥计算 HMAC，配置再多仓库，伪造的请求也只需一次计算即被拒绝；
+    比较使用常量时间。
+    """
+
+    def __init__(self, secrets=None):
+        self._secrets = {name: secret.encode("utf-8") for name, secret in (secrets or {}).items() if secret}
+
+    @property
+    def enabled(self):
+        return bool(self._secrets)
+
+    def key_name(self, repo_name):
+        """仓库应当使用的密钥名称：有专用密钥时为仓库名，否则为 default"""
+        return repo_name if repo_name in self._secrets else "default"
+
+    def verify(self, body, signature_header):
+        """返回签名所用的密钥名称；签名缺失、格式错误或不匹配时返回 None"""
+        if not signature_header or not signature_header.startswith(_GITHUB_SIGNATURE_PREFIX):
+            return None
+        expected = signature_header[len(_GITHUB_SIGNATURE_PREFIX):].lower()
+        if len(expected) != 64 or not _HEX_DIGITS.issuperset(expected):
+            return None
+        name = self.key_name(peek_repository(body))
+        secret = self._secrets.get(name)
+        if secret is None:
+            return None
+        digest = hmac.new(secret, body, hashlib.sha256).hexdigest()
+        return name if hmac.compare_digest(digest, expected) else None
+
+    def allows(self, signed_by, repo_name):
+        """签名所用的密钥是否属于该仓库（仓库没有专用密钥时为 default）"""
+        return signed_by == self.key_name(repo_name)
+
+
+def verify_feishu_signature(body, timestamp, nonce, signature, encrypt_key):
+    """校验飞书事件回调的 X-Lark-Signature: sha256(timestamp + nonce + encrypt_key + body)"""
+    if not (timestamp and nonce and signature):
+        return False
+    digest = hashlib.sha256()
+    digest.update((timestamp + nonce + encrypt_key).encode("utf-8"))
+    digest.update(body)
+    return hmac.compare_digest(digest.hexdigest(), signature.lower())
+
+
+def verify_feishu_token(payload, verification_token):
+    """校验事件中的 Verification Token（v2 事件在 header.token，v1 事件与 url_verification 在 token）"""
+    token = (payload.get("header") or {}).get("token") or payload.get("token") or ""
+    return hmac.compare_digest(token.encode("utf-8"), verification_token.encode("utf-8"))
+
+
+class FeishuDecryptError(Exception):
+    """飞书加密事件无法解密"""
+
+
+def decrypt_feishu_event(encrypted, encrypt_key):
+    """解密配置了 Encrypt Key 时飞书推送的 {"encrypt": "..."}，返回明文 JSON 字符串。
+
+    需要安装 cryptography；AES-256-CBC，密钥为 sha256(encrypt_key)，前 16 字节为 IV。
+    """
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError:
+        raise FeishuDecryptError("收到加密的飞书事件，但未安装 cryptography，无法解密")
+    try:
+        raw = base64.b64decode(encrypted)
+        key = hashlib.sha256(encrypt_key.encode("utf-8")).digest()
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(raw[:16])).decryptor()
+        plain = decryptor.update(raw[16:]) + decryptor.finalize()
+        padding = plain[-1]
+        if not 1 <= padding <= 16:
+            raise ValueError("invalid padding")
+        return plain[:-padding].decode("utf-8")
+    except (ValueError, IndexError, UnicodeDecodeError) as e:
+        raise FeishuDecryptError(f"解密飞书事件失败: {e}") from e
@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 共享状态后端默认配置，可通过 feishu_config.json 的 "state_backend" 覆盖
+DEFAULT_STATE_BACKEND_OPTIONS = {
+    "type": "memory",     # memory: 单进程内存；sqlite: 同一台机器上多个 worker 进程共享的 SQLite 文件
+    "path": "state.db",   # type 为 sqlite 时使用的文件路径
+    "busy_timeout": 5,    # 等待其他进程释放 SQLite 写锁的秒数
+}
+
+
+# SQLite 的 WAL 模式依赖同一台机器上的共享内存，不能用于这些网络文件系统
+_NETWORK_FILESYSTEMS = frozenset({
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph", "glusterfs", "lustre", "gpfs", "afs",
+    "fuse.sshfs", "fuse.glusterfs", "fuse.cephfs", "fuse.s3fs", "fuse.gcsfuse",
+})
+
+
+def filesystem_type(path):
+    """返回 path 所在文件系统的类型（读取 /proc/self/mounts，其他平台返回 None）"""
+    try:
+        with open("/proc/self/mounts", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+    target = os.path.realpath(os.path.dirname(os.path.abspath(path)))
+    best, fs_type = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = target == mount_point or target.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type
+
+
+def check_local_sqlite_path(path, what):
+    """WAL 模式的 SQLite 文件只能由同一台机器上的进程共享，放在网络文件系统上时记录错误"""
+    fs_type = filesystem_type(path)
+    if fs_type in _NETWORK_FILESYSTEMS:
+        logger.error(
+            f"{what} {path} 位于网络文件系统 ({fs_type}) 上：SQLite 的 WAL 模式不支持网络文件系统，"
+            f"可能损坏数据库。请放在本机磁盘上，多台机器部署时每台机器使用各自的文件"
+        )
+        return False
+    return True
+
+
+class MemoryStateBackend:
+    """进程内存中的状态后端，只适用于单 worker 部署"""
+
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        self._data[key] = value
+
+    def set_nowait(self, key, value):
+        self._data[key] = value
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def acquire(self, name, ttl):
+        """获取带租期的锁，租期过后自动失效；成功时返回 True"""
+        now = time.time()
+        with self._mutex:
+            if self._locks.get(name, 0) > now:
+                return False
+            self._locks[name] = now + ttl
+            return True
+
+    def release(self, name):
+        with self._mutex:
+            self._locks.pop(name, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteStateBackend:
+    """同一台机器上多个 worker 进程共享的 SQLite 状态后端（WAL 模式，不支持网络文件系统）。
+
+    读取走内存缓存，只有在 PRAGMA data_version 显示其他连接提交过数据时才重新加载；
+    连接正被写入占用时直接返回缓存，读取不会等待 SQLite 的写锁，可以在事件循环中调用。
+    set 同步写入，只应在线程中调用；事件循环中用 set_nowait，立即更新缓存，由后台线程写入。
+    锁使用单独的连接，以租期形式记录在表中，持有者进程崩溃后租期到期即可被其他进程接管。
+    """
+
+    shared = True
+
+    # 后台写入失败后重试的间隔（秒）
+    RETRY_INTERVAL = 1.0
+
+    def __init__(self, path, busy_timeout=5):
+        self.path = path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        check_local_sqlite_path(path, "共享状态文件")
+        self._conn = self._connect(busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock_conn = self._connect(busy_timeout)
+        self._mutex = threading.Lock()          # 保护 _conn（读取与 kv 写入）
+        self._lock_mutex = threading.Lock()     # 保护 _lock_conn，等待写锁时不影响读取
+        self._cache = {}
+        self._data_version = None
+        self._pending = {}                      # set_nowait 写入、尚未提交的键
+        self._pending_cond = threading.Condition()
+        self._writer = None
+        self._closing = False
+        self.write_failures = 0
+
+    def _connect(self, busy_timeout):
+        return sqlite3.connect(self.path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+
+    def _sync(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            rows = self._conn.execute("SELECT key, value FROM kv").fetchall()
+            cache = {key: json.loads(value) for key, value in rows}
+            with self._pending_cond:
+                # 还没写入的本地修改比文件中的值更新
+                cache.update(self._pending)
+            self._cache = cache
+            self._data_version = version
+
+    def get(self, key, default=None):
+        # 连接正被其他线程占用（例如等待写锁）时不等待，直接返回缓存
+        if self._mutex.acquire(blocking=False):
+            try:
+                self._sync()
+            except sqlite3.Error as e:
+                logger.error(f"读取共享状态 {self.path} 失败，使用本地缓存: {e}")
+            finally:
+                self._mutex.release()
+        return self._cache.get(key, default)
+
+    def _write(self, items):
+        with self._mutex:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO kv (key, value, updated_at) VALUES (?, ?, ?)",
+                    [(key, json.dumps(value), now) for key, value in items],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def set(self, key, value):
+        """同步写入，可能等待其他进程释放写锁（最多 busy_timeout 秒）；写入失败时只更新本地缓存并返回 False"""
+        with self._pending_cond:
+            self._pending.pop(key, None)
+        self._cache[key] = value
+        try:
+            self._write([(key, value)])
+            # 写入期间缓存可能被重新加载覆盖
+            self._cache[key] = value
+            return True
+        except sqlite3.Error as e:
+            self.write_failures += 1
+            logger.error(f"写入共享状态 {key} 到 {self.path} 失败，仅在本进程生效: {e}")
+            return False
+
+    def set_nowait(self, key, value):
+        """立即更新本地缓存，由后台线程写入；写入失败时按 RETRY_INTERVAL 重试"""
+        self._cache[key] = value
+        with self._pending_cond:
+            self._pending[key] = value
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="state-backend-writer", daemon=True)
+                self._writer.start()
+            self._pending_cond.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending and not self._closing:
+                    self._pending_cond.wait()
+                if not self._pending:
+                    return
+                items = dict(self._pending)
+            try:
+                self._write(items.items())
+            except sqlite3.Error as e:
+                self.write_failures += 1
+                logger.error(f"后台写入共享状态 {self.path} 失败，稍后重试: {e}")
+                with self._pending_cond:
+                    if self._closing:
+                        return
+                    self._pending_cond.wait(self.RETRY_INTERVAL)
+                continue
+            with self._pending_cond:
+                for key, value in items.items():
+                    # 写入期间又被修改的键留到下一轮
+                    if self._pending.get(key, self) is value:
+                        del self._pending[key]
+
+    def delete(self, key):
+        with self._pending_cond:
+            self._pending.pop(key, None)
+        self._cache.pop(key, None)
+        try:
+            with self._mutex:
+                self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"删除共享状态 {key} 失败: {e}")
+
+    def acquire(self, name, ttl):
+        """获取带租期的跨进程锁，租期过后自动失效；成功时返回 True"""
+        now = time.time()
+        with self._lock_mutex:
+            conn = self._lock_conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT owner, expires_at FROM locks WHERE name = ?", (name,)).fetchone()
+                if row is not None and row[0] != self.owner and row[1] > now:
+                    conn.execute("COMMIT")
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO locks (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (name, self.owner, now + ttl),
+                )
+                conn.execute("COMMIT")
+                return True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def release(self, name):
+        with self._lock_mutex:
+            self._lock_conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def close(self):
+        """等待后台线程写完（写入失败时放弃），再关闭连接"""
+        with self._pending_cond:
+            self._closing = True
+            self._pending_cond.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+        if self._pending:
+            logger.warning(f"关闭时仍有 {len(self._pending)} 项共享状态未写入 {self.path}")
+        with self._mutex:
+            self._conn.close()
+        with self._lock_mutex:
+            self._lock_conn.close()
+
+
+def create_state_backend(options=None):
+    """根据配置创建状态后端"""
+    opts = dict(DEFAULT_STATE_BACKEND_OPTIONS)
+    if options:
+        opts.update(options)
+    if opts["type"] == "memory":
+        return MemoryStateBackend()
+    if opts["type"] == "sqlite":
+        logger.info(f"使用共享 SQLite 状态后端: {opts['path']}")
+        return SQLiteStateBackend(opts["path"], busy_timeout=opts["busy_timeout"])
+    raise ValueError(f"未知的状态后端类型: {opts['type']}")
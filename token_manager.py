@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# tenant_access_token 管理默认配置，可通过 feishu_config.json 的 "token" 覆盖
+DEFAULT_TOKEN_OPTIONS = {
+    # 距过期还剩多少秒时后台续期。飞书只有在剩余有效期不足 30 分钟时才会签发新 token，
+    # 所以默认值取 25 分钟
+    "refresh_margin": 1500,
+    "expiry_margin": 60,     # 距过期还剩多少秒时视为已失效，不再使用
+    "retry_interval": 30,    # 后台续期失败后的重试间隔秒数
+    "lock_ttl": 10,          # 多进程部署时刷新锁的租期秒数，也是等待其他进程刷新的最长时间
+}
+
+
+class TenantTokenManager:
+    """tenant_access_token 管理：并发刷新合并为一次请求，在过期前后台续期，刷新失败时继续使用仍有效的旧 token。
+
+    传入共享的状态后端时，token 写入后端供其他 worker 进程直接使用，刷新时持有后端中的锁，
+    多个进程同时到期也只会向飞书请求一次。
+    """
+
+    def __init__(self, fetcher, options=None, backend=None, key="tenant_access_token"):
+        self.options = dict(DEFAULT_TOKEN_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._fetcher = fetcher
+        self._backend = backend
+        self._key = key
+        self.token = None
+        self.expires_at = 0      # 飞书返回的实际过期时间
+        self._inflight = None    # 正在进行的刷新任务，所有并发调用者共享
+        self._renewer = None
+        self._wakeup = None
+        self._last_attempt_at = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.shared_adoptions = 0
+
+    def _usable(self, now):
+        return self.token is not None and now < self.expires_at - self.options["expiry_margin"]
+
+    def _due_for_renewal(self, now):
+        return now >= self.expires_at - self.options["refresh_margin"]
+
+    async def get_token(self):
+        """返回可用的 token；只有在没有任何有效 token 时才会等待刷新"""
+        now = time.time()
+        if self._usable(now) or self._adopt_shared(now):
+            self.hits += 1
+            if self._due_for_renewal(now) and now - self._last_attempt_at >= self.options["retry_interval"]:
+                # 续期任务还没来得及执行（例如刚从休眠恢复），在后台触发，不阻塞调用者
+                self._start_refresh()
+            return self.token
+
+        self.misses += 1
+        await asyncio.shield(self._start_refresh())
+        return self.token if self._usable(time.time()) else None
+
+    def _start_refresh(self):
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+        return self._inflight
+
+    async def refresh(self):
+        """强制刷新一次（与其他并发刷新合并），成功时返回 True"""
+        return await asyncio.shield(self._start_refresh())
+
+    def _adopt_shared(self, now):
+        """采用其他进程写入共享后端的更新的 token，采用后可用时返回 True"""
+        if self._backend is None:
+            return False
+        shared = self._backend.get(self._key)
+        if not shared or shared["expires_at"] <= self.expires_at:
+            return False
+        self.token = shared["token"]
+        self.expires_at = shared["expires_at"]
+        self.shared_adoptions += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self._usable(now)
+
+    async def _refresh(self):
+        now = self._last_attempt_at = time.time()
+        if self._adopt_shared(now) and not self._due_for_renewal(now):
+            return True
+        if self._backend is None:
+            return await self._fetch()
+
+        lock_name = f"{self._key}:refresh"
+        try:
+            acquired = await asyncio.to_thread(self._backend.acquire, lock_name, self.options["lock_ttl"])
+        except Exception as e:
+            logger.error(f"获取共享 token 刷新锁失败，直接刷新: {e}")
+            return await self._fetch()
+        if not acquired:
+            # 其他进程正在刷新，等待它把新 token 写入共享后端
+            deadline = now + self.options["lock_ttl"]
+            while time.time() < deadline:
+                await asyncio.sleep(0.2)
+                if self._adopt_shared(time.time()) and not self._due_for_renewal(time.time()):
+                    return True
+            return False
+        try:
+            # 拿到锁之后再检查一次，其他进程可能刚刚完成刷新
+            if self._adopt_shared(time.time()) and not self._due_for_renewal(time.time()):
+                return True
+            if not await self._fetch():
+                return False
+            try:
+                await asyncio.to_thread(
+                    self._backend.set, self._key, {"token": self.token, "expires_at": self.expires_at}
+                )
+            except Exception as e:
+                logger.error(f"写入共享 tenant_access_token 失败: {e}")
+            return True
+        finally:
+            try:
+                await asyncio.to_thread(self._backend.release, lock_name)
+            except Exception as e:
+                logger.error(f"释放共享 token 刷新锁失败，将在租期到期后自动释放: {e}")
+
+    async def _fetch(self):
+        self.refreshes += 1
+        requested_at = time.time()
+        try:
+            data = await self._fetcher()
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"请求 tenant_access_token 时发生网络错误: {e}")
+            return False
+
+        if data.get("code") != 0:
+            self.refresh_failures += 1
+            logger.error(f"获取 tenant_access_token 失败: {data.get('msg')}")
+            return False
+
+        self.token = data["tenant_access_token"]
+        self.expires_at = requested_at + data.get("expire", 7200)
+        logger.info(f"成功获取 tenant_access_token，{int(self.expires_at - time.time())} 秒后过期")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        """启动后台续期任务，并立即开始预取 token"""
+        if self._renewer is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._renewer = asyncio.create_task(self._renew_loop(), name="token-renewer")
+
+    async def stop(self):
+        if self._renewer is None:
+            return
+        self._renewer.cancel()
+        await asyncio.gather(self._renewer, return_exceptions=True)
+        self._renewer = None
+
+    async def _renew_loop(self):
+        while True:
+            now = time.time()
+            if self._due_for_renewal(now):
+                renewed = await self.refresh()
+                if not renewed and self._usable(time.time()):
+                    logger.warning("后台续期 tenant_access_token 失败，继续使用当前仍有效的 token")
+                if not renewed or self._due_for_renewal(time.time()):
+                    # 失败，或飞书仍返回了旧 token（剩余有效期超过 30 分钟时不会签发新的），稍后再试
+                    await asyncio.sleep(self.options["retry_interval"])
+                continue
+
+            self._wakeup.clear()
+            delay = self.expires_at - self.options["refresh_margin"] - now
+            try:
+                # 其他路径刷新成功时会唤醒，重新计算下一次续期时间
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        now = time.time()
+        lookups = self.hits + self.misses
+        return {
+            "valid": self._usable(now),
+            "expires_in": max(0, int(self.expires_at - now)) if self.token else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "shared_adoptions": self.shared_adoptions,
+        }